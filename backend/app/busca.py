@@ -0,0 +1,43 @@
+# Busca de operadoras para o autocompletar (/api/operadoras/suggest), compartilhada pelas rotas síncronas e assíncronas
+
+# Termos de texto mais curtos que isso não formam trigramas suficientes para usar o índice GIN
+MIN_CARACTERES_TEXTO = 3
+MIN_CARACTERES_NUMERO = 2
+
+def escapar_like(termo):
+    # Curingas digitados pelo usuário são tratados como texto literal no LIKE/ILIKE
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def consulta_sugestoes(q, limit):
+    """
+    Monta a consulta de sugestões para o termo digitado e devolve `(sql, params)`, ou `None` se o termo for curto demais.
+
+    - **Números**: prefixo de CNPJ ou Registro ANS, servido pelos índices `text_pattern_ops`; correspondência exata primeiro.
+    - **Texto**: trecho da razão social (`ILIKE`) ou grafia parecida (operador `%` do pg_trgm), ambos servidos pelo
+      índice de trigramas; ordena por início da razão social, depois por similaridade.
+    """
+    termo = q.strip()
+    colunas = "registro_ans, cnpj, razao_social, uf"
+
+    if termo.isdigit():
+        if len(termo) < MIN_CARACTERES_NUMERO:
+            return None
+        sql = f"""
+            SELECT {colunas} FROM operadoras_ativas
+            WHERE cnpj LIKE %s OR registro_ans LIKE %s
+            ORDER BY (cnpj = %s OR registro_ans = %s) DESC, razao_social
+            LIMIT %s
+        """
+        prefixo = f"{termo}%"
+        return sql, [prefixo, prefixo, termo, termo, limit]
+
+    if len(termo) < MIN_CARACTERES_TEXTO:
+        return None
+    sql = f"""
+        SELECT {colunas} FROM operadoras_ativas
+        WHERE razao_social ILIKE %s OR razao_social %% %s
+        ORDER BY razao_social ILIKE %s DESC, similarity(razao_social, %s) DESC, razao_social
+        LIMIT %s
+    """
+    escapado = escapar_like(termo)
+    return sql, [f"%{escapado}%", termo, f"{escapado}%", termo, limit]
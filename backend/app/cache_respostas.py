@@ -0,0 +1,129 @@
+import os
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from fastapi import Request, Response
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Cache de respostas das rotas somente leitura. Os dados só mudam quando o loader roda, e cada carga
+# incrementa a versão em versao_carga: respostas de versões anteriores são descartadas de uma vez.
+ROTAS_CACHEAVEIS = ('/api/estatisticas', '/api/operadoras')
+
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "300"))
+API_CACHE_MAX_MB = float(os.getenv("API_CACHE_MAX_MB", "50"))
+# Intervalo (s) entre consultas à versão da carga: no máximo uma ida ao banco por intervalo
+API_CACHE_VERSAO_INTERVALO = float(os.getenv("API_CACHE_VERSAO_INTERVALO", "5"))
+# max-age enviado a navegadores e ao nginx; expirado, eles revalidam com If-None-Match e recebem 304
+API_CACHE_MAX_AGE = int(os.getenv("API_CACHE_MAX_AGE", "30"))
+
+_itens = OrderedDict()
+_estado = {'versao': None, 'consultada_em': 0.0, 'bytes': 0, 'acertos': 0, 'faltas': 0, 'revalidacoes': 0}
+
+def rota_cacheavel(request):
+    return request.method == 'GET' and request.url.path.startswith(ROTAS_CACHEAVEIS)
+
+def limpar_cache():
+    _itens.clear()
+    _estado['bytes'] = 0
+
+async def versao_atual(consultar_versao):
+    # consultar_versao: corrotina que lê a versão no banco (síncrona ou assíncrona, conforme a API)
+    agora = time.monotonic()
+    if _estado['versao'] is None or agora - _estado['consultada_em'] >= API_CACHE_VERSAO_INTERVALO:
+        versao = await consultar_versao()
+        if versao != _estado['versao']:
+            if _estado['versao'] is not None:
+                logger.info(f"Nova versão da carga ({versao}): cache de respostas invalidado")
+            limpar_cache()
+        _estado['versao'], _estado['consultada_em'] = versao, agora
+    return _estado['versao']
+
+def versao_conhecida():
+    # Última versão da carga lida por versao_atual, sem ir ao banco (None antes da primeira consulta)
+    return _estado['versao']
+
+def buscar(chave):
+    item = _itens.get(chave)
+    if item is None:
+        return None
+    if time.monotonic() - item['criado_em'] >= API_CACHE_TTL:
+        remover(chave)
+        return None
+    _itens.move_to_end(chave)
+    return item
+
+def remover(chave):
+    item = _itens.pop(chave)
+    _estado['bytes'] -= len(item['corpo'])
+
+def guardar(chave, corpo, media_type, versao):
+    item = {
+        'corpo': corpo,
+        'media_type': media_type,
+        # ETag forte derivado da versão e do conteúdo: vale entre processos e reinícios da API
+        'etag': f'"v{versao}-{hashlib.sha1(corpo).hexdigest()[:16]}"',
+        'criado_em': time.monotonic(),
+    }
+    if chave in _itens:
+        remover(chave)
+    _itens[chave] = item
+    _estado['bytes'] += len(corpo)
+    # Remoção por tamanho: descarta as respostas usadas há mais tempo (LRU)
+    while _estado['bytes'] > API_CACHE_MAX_MB * 1024 * 1024 and len(_itens) > 1:
+        remover(next(iter(_itens)))
+    return item
+
+def cabecalhos(item):
+    return {'ETag': item['etag'], 'Cache-Control': f"public, max-age={API_CACHE_MAX_AGE}"}
+
+def etag_confere(request, item):
+    enviados = request.headers.get('if-none-match', '')
+    return any(e.strip().removeprefix('W/') in (item['etag'], '*') for e in enviados.split(','))
+
+async def responder_com_cache(request: Request, call_next, consultar_versao):
+    """
+    Middleware HTTP: serve GETs das rotas de leitura a partir do cache, com ETag/304.
+
+    - **Chave**: caminho + parâmetros da query (ordenados), dentro da versão atual da carga.
+    - **Invalidação**: versão diferente limpa o cache inteiro; cada item também expira em `API_CACHE_TTL`.
+      Respostas calculadas enquanto a versão mudou são entregues sem ser guardadas.
+    - **Revalidação**: `If-None-Match` igual ao ETag atual responde 304 sem corpo.
+    """
+    if not rota_cacheavel(request):
+        return await call_next(request)
+
+    try:
+        versao = await versao_atual(consultar_versao)
+    except Exception as e:
+        # Sem a versão não há como garantir frescor: a requisição segue direto para a rota
+        logger.warning(f"Versão da carga indisponível, cache ignorado: {e}")
+        return await call_next(request)
+
+    chave = (request.url.path, tuple(sorted(request.query_params.multi_items())))
+    item = buscar(chave)
+    if item is None:
+        _estado['faltas'] += 1
+        resposta = await call_next(request)
+        if resposta.status_code != 200:
+            return resposta
+        corpo = b''.join([parte async for parte in resposta.body_iterator])
+        media_type = resposta.media_type or resposta.headers.get('content-type')
+        if _estado['versao'] != versao:
+            # Uma nova carga foi detectada enquanto a rota respondia: o corpo pode ser da versão anterior
+            # e não entra no cache da nova (nem recebe o ETag dela)
+            return Response(content=corpo, media_type=media_type)
+        item = guardar(chave, corpo, media_type, versao)
+    else:
+        _estado['acertos'] += 1
+
+    if etag_confere(request, item):
+        _estado['revalidacoes'] += 1
+        return Response(status_code=304, headers=cabecalhos(item))
+    return Response(content=item['corpo'], media_type=item['media_type'], headers=cabecalhos(item))
+
+def metricas_cache():
+    return {'itens': len(_itens), 'bytes': _estado['bytes'], 'versao': _estado['versao'],
+            'acertos': _estado['acertos'], 'faltas': _estado['faltas'], 'revalidacoes': _estado['revalidacoes']}
@@ -0,0 +1,55 @@
+import os
+
+# Detalhes de operadoras (cadastro + histórico de despesas) em uma única ida ao banco, para uma ou várias
+# operadoras. Compartilhado pelas rotas síncronas e assíncronas de /api/operadoras/.../detalhes.
+
+# Máximo de operadoras por requisição em GET/POST /api/operadoras/detalhes
+DETALHES_MAX = int(os.getenv("DETALHES_MAX", "100"))
+
+# O histórico de cada operadora é agregado em JSON no próprio banco (LATERAL + json_agg), já na ordem
+# cronológica decrescente: uma linha por operadora, sem uma consulta de despesas por CNPJ.
+CONSULTA_DETALHES = """
+    SELECT o.*, COALESCE(h.historico, '[]'::json) AS historico
+    FROM operadoras_ativas o
+    LEFT JOIN LATERAL (
+        SELECT json_agg(
+                   json_build_object('ano', d.ano, 'trimestre', d.trimestre, 'valor_despesa', d.valor_despesa)
+                   ORDER BY d.ano DESC, d.trimestre DESC
+               ) AS historico
+        FROM despesas_consolidadas d
+        WHERE d.cnpj = o.cnpj
+    ) h ON true
+    WHERE o.cnpj = ANY(%s) OR o.registro_ans = ANY(%s)
+"""
+
+def normalizar_chaves(chaves):
+    # Remove espaços e repetições mantendo a ordem pedida
+    return list(dict.fromkeys(chave.strip() for chave in chaves if chave and chave.strip()))
+
+def consulta_detalhes(chaves):
+    # Cada chave pode ser um CNPJ ou um Registro ANS; os arrays são adaptados para text[] pelo driver
+    return CONSULTA_DETALHES, [chaves, chaves]
+
+def montar_detalhes(linhas, chaves):
+    """
+    Organiza as linhas de `CONSULTA_DETALHES` na ordem das chaves pedidas.
+
+    Devolve `(dados, nao_encontradas)`: `dados` no formato de `/operadoras/{cnpj}/detalhes`
+    (`{"info": ..., "historico": [...]}`) e as chaves sem operadora correspondente.
+    """
+    por_chave = {}
+    for linha in linhas:
+        linha = dict(linha)
+        item = {"info": linha, "historico": linha.pop('historico')}
+        por_chave[linha['cnpj']] = por_chave[linha['registro_ans']] = item
+
+    dados, vistos, nao_encontradas = [], set(), []
+    for chave in chaves:
+        item = por_chave.get(chave)
+        if item is None:
+            nao_encontradas.append(chave)
+        elif id(item) not in vistos:
+            # CNPJ e Registro ANS da mesma operadora na mesma requisição: ela aparece uma vez
+            vistos.add(id(item))
+            dados.append(item)
+    return dados, nao_encontradas
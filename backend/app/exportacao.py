@@ -0,0 +1,97 @@
+import os
+import io
+import csv
+import json
+import zlib
+from fastapi.responses import StreamingResponse
+
+# Exportação de despesas (/api/export/despesas), compartilhada pelas rotas síncronas e assíncronas.
+# As linhas saem do banco por um cursor nomeado (server-side) em lotes e são escritas na resposta à medida
+# que chegam: a memória da API fica limitada a um lote, qualquer que seja o tamanho da exportação.
+
+# Linhas buscadas por ida ao banco (fetchmany)
+EXPORT_LOTE = int(os.getenv("EXPORT_LOTE", "5000"))
+
+COLUNAS_EXPORTACAO = ['registro_ans', 'cnpj', 'razao_social', 'modalidade', 'uf', 'ano', 'trimestre', 'valor_despesa']
+
+TIPOS_MIDIA = {'csv': 'text/csv; charset=utf-8', 'ndjson': 'application/x-ndjson'}
+
+def consulta_exportacao(uf=None, modalidade=None, de=None, ate=None, operadora=None):
+    """
+    Monta a consulta de exportação com os filtros informados e devolve `(sql, params)`.
+
+    - **Período**: `de`/`ate` no formato `AAAA-T` (inclusivos). A condição em `ano` permite ao planejador
+      descartar partições fora do intervalo; a comparação de tuplas refina pelo trimestre.
+    - **Operadora**: CNPJ ou Registro ANS.
+    - Sem ORDER BY: ordenar exigiria ler todo o resultado antes de enviar a primeira linha.
+    """
+    condicoes, params = [], []
+    if uf:
+        condicoes.append("uf = %s")
+        params.append(uf.upper())
+    if modalidade:
+        condicoes.append("modalidade = %s")
+        params.append(modalidade)
+    if de:
+        ano, trimestre = (int(parte) for parte in de.split('-'))
+        condicoes.append("ano >= %s AND (ano, trimestre) >= (%s, %s)")
+        params += [ano, ano, trimestre]
+    if ate:
+        ano, trimestre = (int(parte) for parte in ate.split('-'))
+        condicoes.append("ano <= %s AND (ano, trimestre) <= (%s, %s)")
+        params += [ano, ano, trimestre]
+    if operadora:
+        condicoes.append("(cnpj = %s OR registro_ans = %s)")
+        params += [operadora, operadora]
+
+    where_clause = f"WHERE {' AND '.join(condicoes)}" if condicoes else ""
+    return f"SELECT {', '.join(COLUNAS_EXPORTACAO)} FROM despesas_consolidadas {where_clause}", params
+
+def cabecalho(formato):
+    return ','.join(COLUNAS_EXPORTACAO) + '\r\n' if formato == 'csv' else ''
+
+def formatar_lote(linhas, formato):
+    # Linhas em tuplas, na ordem de COLUNAS_EXPORTACAO
+    if formato == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(linhas)
+        return buffer.getvalue()
+    # DECIMAL vira número no JSON, como nas demais rotas da API
+    return ''.join(json.dumps(dict(zip(COLUNAS_EXPORTACAO, linha)), default=float, ensure_ascii=False) + '\n'
+                   for linha in linhas)
+
+def compactador(compactar):
+    # wbits=31: formato gzip (cabeçalho + CRC), legível por gunzip e pelas bibliotecas usuais
+    return zlib.compressobj(wbits=31) if compactar else None
+
+def codificar(texto, gz):
+    dados = texto.encode('utf-8')
+    # Z_SYNC_FLUSH a cada lote: o cliente recebe os dados compactados sem esperar o buffer interno do zlib encher
+    return gz.compress(dados) + gz.flush(zlib.Z_SYNC_FLUSH) if gz else dados
+
+def transmitir(lotes, formato, compactar):
+    gz = compactador(compactar)
+    yield codificar(cabecalho(formato), gz)
+    for linhas in lotes:
+        yield codificar(formatar_lote(linhas, formato), gz)
+    if gz:
+        yield gz.flush()
+
+async def transmitir_async(lotes, formato, compactar):
+    gz = compactador(compactar)
+    yield codificar(cabecalho(formato), gz)
+    async for linhas in lotes:
+        yield codificar(formatar_lote(linhas, formato), gz)
+    if gz:
+        yield gz.flush()
+
+def resposta_exportacao(corpo, formato, compactar, encerramento=None):
+    # `encerramento` (BackgroundTask) roda quando a resposta termina, inclusive se o cliente desconectar.
+    # Com gzip o download é um arquivo .gz (e não Content-Encoding), preservado como está pelo navegador
+    arquivo = f"despesas.{formato}" + ('.gz' if compactar else '')
+    return StreamingResponse(
+        corpo,
+        media_type='application/gzip' if compactar else TIPOS_MIDIA[formato],
+        headers={'Content-Disposition': f'attachment; filename="{arquivo}"'},
+        background=encerramento,
+    )
@@ -1,8 +1,55 @@
-from fastapi import FastAPI
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from backend.app.routes import operators, statistics
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from backend.app.cache_respostas import responder_com_cache, metricas_cache
+from backend.database.analysis.connection import iniciar_pool, fechar_pool, metricas_pool, consultar_versao_carga
 
-app = FastAPI(title="ANS Data API")
+# API_ASYNC=1 troca as rotas por variantes assíncronas (psycopg 3 + pool assíncrono):
+# um único worker do uvicorn atende muito mais requisições simultâneas que o threadpool das rotas síncronas
+API_ASYNC = os.getenv("API_ASYNC", "0") == "1"
+
+if API_ASYNC:
+    from psycopg_pool import PoolTimeout
+    from backend.app.routes import operators_async as operators, statistics_async as statistics, export_async as export
+    from backend.database.analysis.connection_async import (
+        iniciar_pool_async, fechar_pool_async, metricas_pool_async, consultar_versao_carga_async,
+    )
+else:
+    from backend.app.routes import operators, statistics, export
+
+@asynccontextmanager
+async def lifespan(app):
+    # Pool de conexões aberto uma única vez na inicialização e encerrado no desligamento do servidor
+    if API_ASYNC:
+        await iniciar_pool_async()
+        yield
+        await fechar_pool_async()
+    else:
+        iniciar_pool()
+        yield
+        fechar_pool()
+
+app = FastAPI(title="ANS Data API", lifespan=lifespan)
+
+if API_ASYNC:
+    @app.exception_handler(PoolTimeout)
+    async def pool_esgotado(request: Request, exc: PoolTimeout):
+        # Mesmo comportamento da dependência síncrona: sem conexão livre no prazo, 503
+        return JSONResponse(status_code=503, content={"detail": "Banco de dados indisponível no momento"})
+
+async def versao_carga():
+    if API_ASYNC:
+        return await consultar_versao_carga_async()
+    # Variante síncrona bloqueia enquanto espera o banco: roda no threadpool, fora do event loop
+    return await run_in_threadpool(consultar_versao_carga)
+
+@app.middleware("http")
+async def cache_respostas(request: Request, call_next):
+    # Rotas de leitura servidas do cache enquanto a versão da carga não muda (ETag/304 para navegador e nginx)
+    return await responder_com_cache(request, call_next, versao_carga)
 
 origins = [
     "http://localhost:8080",
@@ -21,7 +68,18 @@ app.add_middleware(
 
 app.include_router(operators.router, prefix="/api")
 app.include_router(statistics.router, prefix="/api")
+app.include_router(export.router, prefix="/api")
 
 @app.get("/")
 def read_root():
-    return {"message": "API ANS operacional. Acesse /docs para a documentação."}
\ No newline at end of file
+    return {"message": "API ANS operacional. Acesse /docs para a documentação."}
+
+@app.get("/api/metricas/banco")
+def metricas_banco():
+    # Conexões abertas/em uso e tempo de espera por conexão do pool
+    return metricas_pool_async() if API_ASYNC else metricas_pool()
+
+@app.get("/api/metricas/cache")
+def metricas_cache_respostas():
+    # Itens/bytes guardados, versão da carga em uso e contadores de acertos, faltas e respostas 304
+    return metricas_cache()
\ No newline at end of file
@@ -0,0 +1,116 @@
+import os
+import json
+import time
+import base64
+import threading
+from fastapi import HTTPException
+from backend.app.cache_respostas import versao_conhecida
+
+# Paginação de /api/operadoras, compartilhada pelas rotas síncronas e assíncronas.
+# - OFFSET (page): mantido por compatibilidade; o custo cresce com a profundidade da página.
+# - Keyset (cursor): continua a partir da última linha vista em (razao_social, registro_ans), custo constante.
+
+# Validade (s) das contagens guardadas no modo contagem=cache
+CONTAGEM_CACHE_TTL = float(os.getenv("CONTAGEM_CACHE_TTL", "60"))
+# Limite de filtros distintos guardados (cada termo digitado na busca gera uma entrada)
+CONTAGEM_CACHE_MAX = int(os.getenv("CONTAGEM_CACHE_MAX", "1000"))
+
+ORDEM = "razao_social, registro_ans"
+
+_contagens = {}
+_lock = threading.Lock()
+
+def codificar_cursor(linha, direcao):
+    # Opaco para o cliente: base64 de um JSON com a chave de ordenação da linha de referência
+    dados = json.dumps({'r': linha['razao_social'], 'id': linha['registro_ans'], 'd': direcao})
+    return base64.urlsafe_b64encode(dados.encode('utf-8')).decode('ascii')
+
+def decodificar_cursor(cursor):
+    try:
+        dados = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if dados['d'] not in ('next', 'prev'):
+            raise ValueError(dados['d'])
+        return dados['r'], dados['id'], dados['d']
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def consulta_pagina(where_clause, params, limit, page, cursor=None):
+    """
+    Monta a consulta da página pedida e devolve `(sql, params, direcao)`.
+
+    - **Keyset**: com `cursor`, filtra pela comparação de tuplas `(razao_social, registro_ans)`, servida pelo índice
+      de mesma ordem; para voltar ('prev') percorre o índice ao contrário e a página é reordenada em `montar_pagina`.
+    - **OFFSET**: sem `cursor`, usa `page`. A ordem inclui `registro_ans` para ser determinística entre páginas.
+    - Uma linha a mais é buscada para saber se existe página seguinte sem precisar de contagem.
+    """
+    if cursor is None:
+        sql = f"SELECT * FROM operadoras_ativas {where_clause} ORDER BY {ORDEM} LIMIT %s OFFSET %s"
+        return sql, params + [limit + 1, (page - 1) * limit], 'next'
+
+    razao_social, registro_ans, direcao = decodificar_cursor(cursor)
+    operador, ordem = ('>', ORDEM) if direcao == 'next' else ('<', "razao_social DESC, registro_ans DESC")
+    condicao = f"(razao_social, registro_ans) {operador} (%s, %s)"
+    # O filtro de busca fica entre parênteses: ele contém OR e não pode se misturar com a condição do cursor
+    where = f"WHERE ({where_clause[len('WHERE '):]}) AND {condicao}" if where_clause else f"WHERE {condicao}"
+    sql = f"SELECT * FROM operadoras_ativas {where} ORDER BY {ordem} LIMIT %s"
+    return sql, params + [razao_social, registro_ans, limit + 1], direcao
+
+def montar_pagina(linhas, limit, direcao, page, cursor=None):
+    # Devolve (dados, next_cursor, prev_cursor) a partir das linhas buscadas por consulta_pagina
+    ha_mais = len(linhas) > limit
+    linhas = linhas[:limit]
+    if direcao == 'prev':
+        linhas = linhas[::-1]
+
+    if direcao == 'next':
+        tem_seguinte, tem_anterior = ha_mais, (cursor is not None or page > 1)
+    else:
+        tem_seguinte, tem_anterior = True, ha_mais
+
+    next_cursor = codificar_cursor(linhas[-1], 'next') if linhas and tem_seguinte else None
+    prev_cursor = codificar_cursor(linhas[0], 'prev') if linhas and tem_anterior else None
+    return linhas, next_cursor, prev_cursor
+
+def consulta_contagem(modo, where_clause, params):
+    # exata/cache: COUNT(*); estimada: estimativa do planejador (EXPLAIN), sem percorrer a tabela
+    if modo == 'estimada':
+        return f"EXPLAIN (FORMAT JSON) SELECT 1 FROM operadoras_ativas {where_clause}", params
+    return f"SELECT COUNT(*) FROM operadoras_ativas {where_clause}", params
+
+def extrair_contagem(modo, linha):
+    if modo == 'estimada':
+        return int(linha['QUERY PLAN'][0]['Plan']['Plan Rows'])
+    return linha['count']
+
+def chave_contagem(where_clause, params):
+    # Filtro + versão da carga: contagens de cargas anteriores nunca são reaproveitadas.
+    # A versão é lida antes do COUNT; sem versão conhecida não há como garantir frescor e nada é guardado
+    versao = versao_conhecida()
+    return None if versao is None else (versao, where_clause, tuple(params))
+
+def contagem_em_cache(chave):
+    # Contagem exata reaproveitada por CONTAGEM_CACHE_TTL segundos para o mesmo filtro e a mesma carga
+    if chave is None:
+        return None
+    with _lock:
+        registro = _contagens.get(chave)
+    if registro and time.monotonic() - registro[1] < CONTAGEM_CACHE_TTL:
+        return registro[0]
+    return None
+
+def guardar_contagem(chave, total):
+    if chave is None or chave[0] != versao_conhecida():
+        # A carga mudou durante o COUNT: o total pode ser da versão anterior
+        return
+    agora = time.monotonic()
+    with _lock:
+        if len(_contagens) >= CONTAGEM_CACHE_MAX:
+            # Descarta as expiradas e as de outras cargas; se ainda estiver cheio, a mais antiga
+            # (dicionário mantém a ordem de inserção)
+            for c in [c for c, (_, momento) in _contagens.items()
+                      if agora - momento >= CONTAGEM_CACHE_TTL or c[0] != chave[0]]:
+                del _contagens[c]
+            if len(_contagens) >= CONTAGEM_CACHE_MAX:
+                del _contagens[next(iter(_contagens))]
+        _contagens.pop(chave, None)
+        _contagens[chave] = (total, agora)
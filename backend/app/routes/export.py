@@ -0,0 +1,53 @@
+import threading
+from fastapi import APIRouter, Query
+from starlette.background import BackgroundTask
+from backend.database.analysis.connection import emprestar_conexao, devolver_ao_pool, ler_em_lotes
+from backend.app.exportacao import consulta_exportacao, transmitir, resposta_exportacao, EXPORT_LOTE
+
+router = APIRouter()
+
+PADRAO_PERIODO = r"^\d{4}-[1-4]$"
+
+@router.get("/export/despesas")
+def exportar_despesas(uf: str = Query(None, pattern="^[A-Za-z]{2}$"), modalidade: str = None,
+                      de: str = Query(None, pattern=PADRAO_PERIODO), ate: str = Query(None, pattern=PADRAO_PERIODO),
+                      operadora: str = Query(None, pattern=r"^\d+$"),
+                      formato: str = Query("csv", pattern="^(csv|ndjson)$"), compactar: bool = False):
+    """
+    Exporta as despesas consolidadas filtradas, em CSV ou NDJSON, transmitidas à medida que são lidas.
+
+    - **Filtros**: `uf`, `modalidade`, período `de`/`ate` (`AAAA-T`) e `operadora` (CNPJ ou Registro ANS).
+    - **Streaming**: cursor nomeado no servidor lido em lotes de `EXPORT_LOTE` linhas; memória constante na API.
+    - **Compactação**: `compactar=true` entrega um arquivo `.gz`.
+    """
+    sql, params = consulta_exportacao(uf, modalidade, de, ate, operadora)
+    # A conexão é emprestada aqui (falha vira 503 antes de a resposta começar) e só volta ao pool
+    # quando a transmissão termina ou é interrompida pelo cliente
+    conn = emprestar_conexao()
+    devolvida = threading.Event()
+
+    def devolver():
+        # Chamada pelo fim do gerador e pela tarefa de encerramento da resposta: a conexão volta uma única vez
+        if not devolvida.is_set():
+            devolvida.set()
+            devolver_ao_pool(conn)
+
+    def corpo():
+        try:
+            yield from transmitir(ler_em_lotes(conn, sql, params, EXPORT_LOTE), formato, compactar)
+        finally:
+            devolver()
+
+    gerador = corpo()
+
+    def encerrar():
+        # Um gerador que nunca começou (cliente desconectado antes do primeiro lote) não executa o finally:
+        # fecha o gerador (encerrando o cursor, se já aberto) e devolve a conexão aqui
+        gerador.close()
+        devolver()
+
+    try:
+        return resposta_exportacao(gerador, formato, compactar, BackgroundTask(encerrar))
+    except Exception:
+        devolver()
+        raise
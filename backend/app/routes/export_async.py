@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Query
+from starlette.background import BackgroundTask
+from backend.database.analysis.connection_async import obter_conexao, devolver_conexao, ler_em_lotes
+from backend.app.exportacao import consulta_exportacao, transmitir_async, resposta_exportacao, EXPORT_LOTE
+from backend.app.routes.export import PADRAO_PERIODO
+
+# Variante assíncrona de routes/export.py (API_ASYNC=1)
+router = APIRouter()
+
+@router.get("/export/despesas")
+async def exportar_despesas(uf: str = Query(None, pattern="^[A-Za-z]{2}$"), modalidade: str = None,
+                            de: str = Query(None, pattern=PADRAO_PERIODO), ate: str = Query(None, pattern=PADRAO_PERIODO),
+                            operadora: str = Query(None, pattern=r"^\d+$"),
+                            formato: str = Query("csv", pattern="^(csv|ndjson)$"), compactar: bool = False):
+    # Mesmos filtros e formatos da rota síncrona; os lotes são lidos sem bloquear o event loop
+    sql, params = consulta_exportacao(uf, modalidade, de, ate, operadora)
+    conn = await obter_conexao()
+    devolvida = False
+
+    async def devolver():
+        # Fim do gerador ou tarefa de encerramento da resposta, o que vier primeiro: a conexão volta uma única vez
+        nonlocal devolvida
+        if not devolvida:
+            devolvida = True
+            await devolver_conexao(conn)
+
+    async def corpo():
+        try:
+            async for parte in transmitir_async(ler_em_lotes(conn, sql, params, EXPORT_LOTE), formato, compactar):
+                yield parte
+        finally:
+            await devolver()
+
+    gerador = corpo()
+
+    async def encerrar():
+        # Gerador que nunca começou não executa o finally (ver routes/export.py)
+        await gerador.aclose()
+        await devolver()
+
+    try:
+        return resposta_exportacao(gerador, formato, compactar, BackgroundTask(encerrar))
+    except Exception:
+        await devolver()
+        raise
@@ -1,18 +1,24 @@
-from fastapi import APIRouter, Query
-from backend.database.analysis.connection import get_db_connection
+from fastapi import APIRouter, Body, Depends, Query
+from backend.database.analysis.connection import get_db
+from backend.app.busca import consulta_sugestoes
+from backend.app.detalhes import DETALHES_MAX, normalizar_chaves, consulta_detalhes, montar_detalhes
+from backend.app.paginacao import (consulta_pagina, montar_pagina, consulta_contagem, extrair_contagem,
+                                   chave_contagem, contagem_em_cache, guardar_contagem)
 
 router = APIRouter()
 
 @router.get("/operadoras")
-def listar_operadoras(page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=100), search: str = None):
+def listar_operadoras(page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=100), search: str = None,
+                      cursor: str = None, contagem: str = Query("exata", pattern="^(exata|estimada|cache|nenhuma)$"),
+                      conn=Depends(get_db)):
     """
     Recupera a lista de operadoras ativas com suporte a paginação e busca textual.
     
     - **Filtro**: O parâmetro `search` busca por correspondência parcial em `razao_social` ou `cnpj`.
-    - **Performance**: Realiza apenas as queries estritamente necessárias.
+    - **Paginação**: `page` (OFFSET, compatibilidade) ou `cursor` (keyset, custo constante em qualquer profundidade).
+      A resposta traz `next_cursor`/`prev_cursor` opacos para navegar a partir da página atual.
+    - **Contagem**: `exata` (COUNT), `estimada` (planejador), `cache` (COUNT reaproveitado por alguns segundos dentro da mesma carga) ou `nenhuma`.
     """
-    offset = (page - 1) * limit
-    conn = get_db_connection()
     cur = conn.cursor()
     
     try:
@@ -26,31 +32,82 @@ def listar_operadoras(page: int = Query(1, ge=1), limit: int = Query(10, ge=1, l
             search_val = f"%{search.strip()}%"
             params = [search_val, search_val]
 
-        # Contagem total com filtro
-        cur.execute(f"SELECT COUNT(*) FROM operadoras_ativas {where_clause}", params)
-        total = cur.fetchone()['count']
+        # Contagem total com filtro, conforme o modo pedido
+        chave = chave_contagem(where_clause, params) if contagem == 'cache' else None
+        total = contagem_em_cache(chave)
+        if total is None and contagem != 'nenhuma':
+            sql, sql_params = consulta_contagem(contagem, where_clause, params)
+            cur.execute(sql, sql_params)
+            total = extrair_contagem(contagem, cur.fetchone())
+            if contagem == 'cache':
+                guardar_contagem(chave, total)
 
-        # Busca paginada com filtro
-        query = f"""
-            SELECT * FROM operadoras_ativas 
-            {where_clause} 
-            ORDER BY razao_social 
-            LIMIT %s OFFSET %s
-        """
-        cur.execute(query, params + [limit, offset])
-        data = cur.fetchall()
+        # Busca paginada com filtro (OFFSET ou keyset)
+        query, sql_params, direcao = consulta_pagina(where_clause, params, limit, page, cursor)
+        cur.execute(query, sql_params)
+        data, next_cursor, prev_cursor = montar_pagina(cur.fetchall(), limit, direcao, page, cursor)
 
         return {
-            "metadata": {"total": total, "page": page, "limit": limit},
+            "metadata": {"total": total, "page": page, "limit": limit, "contagem": contagem,
+                         "next_cursor": next_cursor, "prev_cursor": prev_cursor},
             "data": data
         }
     finally:
         cur.close()
-        conn.close()
+
+# Declarada antes de /operadoras/{cnpj} para que "suggest" não seja interpretado como CNPJ
+@router.get("/operadoras/suggest")
+def sugerir_operadoras(q: str = Query(..., max_length=100), limit: int = Query(8, ge=1, le=20), conn=Depends(get_db)):
+    """
+    Sugestões para o campo de busca (autocompletar), pensado para ser chamado a cada tecla.
+
+    - **Ranking**: correspondências exatas/de início primeiro, depois por similaridade (pg_trgm).
+    - **Performance**: apenas consultas servidas por índice e poucas linhas (`limit` até 20).
+    """
+    consulta = consulta_sugestoes(q, limit)
+    if consulta is None:
+        return []
+    cur = conn.cursor()
+    try:
+        cur.execute(*consulta)
+        return cur.fetchall()
+    finally:
+        cur.close()
+
+def buscar_detalhes(conn, chaves):
+    cur = conn.cursor()
+    try:
+        cur.execute(*consulta_detalhes(chaves))
+        return montar_detalhes(cur.fetchall(), chaves)
+    finally:
+        cur.close()
+
+@router.get("/operadoras/detalhes")
+def detalhes_em_lote_get(chaves: list[str] = Query(..., min_length=1, max_length=DETALHES_MAX), conn=Depends(get_db)):
+    """
+    Mesmo lote do POST, com as chaves na query (`?chaves=...&chaves=...`).
+
+    - **Cache**: por ser GET, passa pelo cache de respostas da API e pelo cache do nginx, com ETag;
+      o frontend pede as chaves ordenadas para que a mesma página gere sempre a mesma URL.
+    """
+    dados, nao_encontradas = buscar_detalhes(conn, normalizar_chaves(chaves))
+    return {"data": dados, "nao_encontradas": nao_encontradas}
+
+@router.post("/operadoras/detalhes")
+def detalhes_em_lote(chaves: list[str] = Body(..., embed=True, min_length=1, max_length=DETALHES_MAX),
+                     conn=Depends(get_db)):
+    """
+    Detalhes (cadastro + histórico de despesas) de várias operadoras em uma requisição.
+
+    - **Entrada**: `{"chaves": [...]}` com CNPJs e/ou Registros ANS, até `DETALHES_MAX` por requisição.
+    - **Performance**: uma única consulta (`= ANY` + `json_agg`), qualquer que seja o número de operadoras.
+    - **Resposta**: `data` na ordem das chaves pedidas e `nao_encontradas` com as chaves sem correspondência.
+    """
+    dados, nao_encontradas = buscar_detalhes(conn, normalizar_chaves(chaves))
+    return {"data": dados, "nao_encontradas": nao_encontradas}
 
 @router.get("/operadoras/{cnpj}")
-def detalhe_operadora(cnpj: str):
-    conn = get_db_connection()
+def detalhe_operadora(cnpj: str, conn=Depends(get_db)):
     cur = conn.cursor()
     try:
         # Busca detalhes cadastrais
@@ -61,11 +118,9 @@ def detalhe_operadora(cnpj: str):
         return operadora
     finally:
         cur.close()
-        conn.close()
 
 @router.get("/operadoras/{cnpj}/despesas")
-def historico_despesas(cnpj: str):
-    conn = get_db_connection()
+def historico_despesas(cnpj: str, conn=Depends(get_db)):
     cur = conn.cursor()
     try:
         # Busca histórico financeiro ordenado por período
@@ -78,33 +133,11 @@ def historico_despesas(cnpj: str):
         return cur.fetchall()
     finally:
         cur.close()
-        conn.close()
 
 @router.get("/operadoras/{cnpj}/detalhes")
-def obter_detalhes_operadora(cnpj: str):
-    conn = get_db_connection()
-    cur = conn.cursor()
-    try:
-        # Busca dados cadastrais básicos
-        cur.execute("SELECT * FROM operadoras_ativas WHERE cnpj = %s", [cnpj])
-        operadora = cur.fetchone()
-
-        if not operadora:
-            return {"error": "Operadora não encontrada"}
-
-        # Busca histórico de despesas (ordem cronológica)
-        cur.execute("""
-            SELECT ano, trimestre, valor_despesa 
-            FROM despesas_consolidadas 
-            WHERE cnpj = %s 
-            ORDER BY ano DESC, trimestre DESC
-        """, [cnpj])
-        despesas = cur.fetchall()
-
-        return {
-            "info": operadora,
-            "historico": despesas
-        }
-    finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+def obter_detalhes_operadora(cnpj: str, conn=Depends(get_db)):
+    # Caso particular do lote: cadastro e histórico vêm da mesma consulta
+    dados, _ = buscar_detalhes(conn, [cnpj])
+    if not dados:
+        return {"error": "Operadora não encontrada"}
+    return dados[0]
@@ -0,0 +1,96 @@
+import asyncio
+from fastapi import APIRouter, Body, Query
+from backend.database.analysis.connection_async import buscar_um, buscar_todos
+from backend.app.busca import consulta_sugestoes
+from backend.app.detalhes import DETALHES_MAX, normalizar_chaves, consulta_detalhes, montar_detalhes
+from backend.app.paginacao import (consulta_pagina, montar_pagina, consulta_contagem, extrair_contagem,
+                                   chave_contagem, contagem_em_cache, guardar_contagem)
+
+# Variante assíncrona de routes/operators.py (API_ASYNC=1): mesmas rotas e respostas,
+# com consultas independentes executadas em paralelo no mesmo handler
+router = APIRouter()
+
+@router.get("/operadoras")
+async def listar_operadoras(page: int = Query(1, ge=1), limit: int = Query(10, ge=1, le=100), search: str = None,
+                            cursor: str = None, contagem: str = Query("exata", pattern="^(exata|estimada|cache|nenhuma)$")):
+    """
+    Recupera a lista de operadoras ativas com suporte a paginação e busca textual.
+    
+    - **Filtro**: O parâmetro `search` busca por correspondência parcial em `razao_social` ou `cnpj`.
+    - **Paginação e contagem**: mesmas opções da rota síncrona (`page`/`cursor`, `contagem`).
+    - **Concorrência**: A contagem total e a página são consultadas em paralelo.
+    """
+    where_clause = ""
+    params = []
+
+    if search:
+        # ILIKE é específico do PostgreSQL para comparações que ignoram maiúsculas/minúsculas
+        where_clause = "WHERE razao_social ILIKE %s OR cnpj LIKE %s"
+        search_val = f"%{search.strip()}%"
+        params = [search_val, search_val]
+
+    async def contar():
+        chave = chave_contagem(where_clause, params) if contagem == 'cache' else None
+        total = contagem_em_cache(chave)
+        if total is None and contagem != 'nenhuma':
+            total = extrair_contagem(contagem, await buscar_um(*consulta_contagem(contagem, where_clause, params)))
+            if contagem == 'cache':
+                guardar_contagem(chave, total)
+        return total
+
+    query, sql_params, direcao = consulta_pagina(where_clause, params, limit, page, cursor)
+    total, linhas = await asyncio.gather(contar(), buscar_todos(query, sql_params))
+    data, next_cursor, prev_cursor = montar_pagina(linhas, limit, direcao, page, cursor)
+
+    return {
+        "metadata": {"total": total, "page": page, "limit": limit, "contagem": contagem,
+                     "next_cursor": next_cursor, "prev_cursor": prev_cursor},
+        "data": data
+    }
+
+@router.get("/operadoras/suggest")
+async def sugerir_operadoras(q: str = Query(..., max_length=100), limit: int = Query(8, ge=1, le=20)):
+    # Autocompletar: mesma consulta indexada da rota síncrona (ver backend/app/busca.py)
+    consulta = consulta_sugestoes(q, limit)
+    if consulta is None:
+        return []
+    return await buscar_todos(*consulta)
+
+async def buscar_detalhes(chaves):
+    return montar_detalhes(await buscar_todos(*consulta_detalhes(chaves)), chaves)
+
+@router.get("/operadoras/detalhes")
+async def detalhes_em_lote_get(chaves: list[str] = Query(..., min_length=1, max_length=DETALHES_MAX)):
+    # Variante cacheável (GET) do lote, usada pelo frontend
+    dados, nao_encontradas = await buscar_detalhes(normalizar_chaves(chaves))
+    return {"data": dados, "nao_encontradas": nao_encontradas}
+
+@router.post("/operadoras/detalhes")
+async def detalhes_em_lote(chaves: list[str] = Body(..., embed=True, min_length=1, max_length=DETALHES_MAX)):
+    # Mesma consulta única da rota síncrona (ver backend/app/detalhes.py)
+    dados, nao_encontradas = await buscar_detalhes(normalizar_chaves(chaves))
+    return {"data": dados, "nao_encontradas": nao_encontradas}
+
+@router.get("/operadoras/{cnpj}")
+async def detalhe_operadora(cnpj: str):
+    operadora = await buscar_um("SELECT * FROM operadoras_ativas WHERE cnpj = %s", (cnpj,))
+    if not operadora:
+        return {"error": "Operadora não encontrada"}, 404
+    return operadora
+
+@router.get("/operadoras/{cnpj}/despesas")
+async def historico_despesas(cnpj: str):
+    return await buscar_todos("""
+        SELECT trimestre, ano, valor_despesa 
+        FROM despesas_consolidadas 
+        WHERE cnpj = %s 
+        ORDER BY ano DESC, trimestre DESC
+    """, (cnpj,))
+
+@router.get("/operadoras/{cnpj}/detalhes")
+async def obter_detalhes_operadora(cnpj: str):
+    # Caso particular do lote: cadastro e histórico vêm da mesma consulta
+    dados, _ = await buscar_detalhes([cnpj])
+    if not dados:
+        return {"error": "Operadora não encontrada"}
+    return dados[0]
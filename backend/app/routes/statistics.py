@@ -1,22 +1,20 @@
-from fastapi import APIRouter
-from backend.database.analysis.connection import get_db_connection
+from fastapi import APIRouter, Depends
+from backend.database.analysis.connection import get_db
 
 router = APIRouter()
 
 @router.get("/estatisticas")
-def obter_estatisticas():
-    conn = get_db_connection()
+def obter_estatisticas(conn=Depends(get_db)):
     cur = conn.cursor()
     try:
-        # Total e Média Geral
-        cur.execute("SELECT SUM(valor_despesa) as total, AVG(valor_despesa) as media FROM despesas_consolidadas")
+        # Total e Média Geral (resumo materializado, atualizado pelo loader a cada carga)
+        cur.execute("SELECT total, media FROM mv_estatisticas_gerais")
         geral = cur.fetchone()
 
-        # Top 5 Operadoras em Despesas
+        # Top 5 Operadoras em Despesas: totais já agregados por operadora, lidos pelo índice de total
         cur.execute("""
-            SELECT razao_social, SUM(valor_despesa) as total 
-            FROM despesas_consolidadas 
-            GROUP BY razao_social 
+            SELECT razao_social, total 
+            FROM mv_despesas_operadora 
             ORDER BY total DESC 
             LIMIT 5
         """)
@@ -34,19 +32,15 @@ def obter_estatisticas():
         }
     finally:
         cur.close()
-        conn.close()
 
 @router.get("/estatisticas/uf")
-def despesas_por_uf():
-    conn = get_db_connection()
+def despesas_por_uf(conn=Depends(get_db)):
     cur = conn.cursor()
     try:
-        # Join: Tabela de Despesas (d) + Tabela de Operadoras (o)
+        # Totais por UF pré-calculados (Join Despesas + Operadoras materializado pelo loader)
         query = """
-            SELECT o.uf, SUM(d.valor_despesa) as total 
-            FROM despesas_consolidadas d
-            JOIN operadoras_ativas o ON d.cnpj = o.cnpj
-            GROUP BY o.uf 
+            SELECT uf, total 
+            FROM mv_despesas_uf 
             ORDER BY total DESC
         """
         cur.execute(query)
@@ -61,5 +55,4 @@ def despesas_por_uf():
         print(f"Erro no banco: {e}") 
         return []
     finally:
-        cur.close()
-        conn.close()
\ No newline at end of file
+        cur.close()
\ No newline at end of file
@@ -0,0 +1,52 @@
+import asyncio
+import logging
+from fastapi import APIRouter
+from backend.database.analysis.connection_async import buscar_um, buscar_todos
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Variante assíncrona de routes/statistics.py (API_ASYNC=1)
+router = APIRouter()
+
+@router.get("/estatisticas")
+async def obter_estatisticas():
+    # Total/Média Geral e Top 5 Operadoras consultados em paralelo, cada um em sua conexão do pool
+    geral, top_5 = await asyncio.gather(
+        buscar_um("SELECT total, media FROM mv_estatisticas_gerais"),
+        buscar_todos("""
+            SELECT razao_social, total 
+            FROM mv_despesas_operadora 
+            ORDER BY total DESC 
+            LIMIT 5
+        """),
+    )
+
+    return {
+        "geral": {
+            "total": float(geral['total'] or 0),
+            "media": float(geral['media'] or 0)
+        },
+        "top_operadoras": [
+            {"razao_social": r['razao_social'], "total": float(r['total'])} 
+            for r in top_5
+        ]
+    }
+
+@router.get("/estatisticas/uf")
+async def despesas_por_uf():
+    try:
+        results = await buscar_todos("""
+            SELECT uf, total 
+            FROM mv_despesas_uf 
+            ORDER BY total DESC
+        """)
+
+        # Garante que 'total' seja convertido de decimal para float
+        return [
+            {"uf": row['uf'], "total": float(row['total'])} 
+            for row in results if row['uf'] is not None
+        ]
+    except Exception as e:
+        logger.error(f"Erro ao consultar despesas por UF: {e}")
+        return []
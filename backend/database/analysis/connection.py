@@ -1,6 +1,11 @@
 import psycopg2
+import psycopg2.extensions
 from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool, PoolError
+from fastapi import HTTPException
 import os
+import time
+import threading
 from dotenv import load_dotenv
 import logging
 
@@ -9,17 +14,167 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "localhost"),
+    "database": os.getenv("DB_NAME", "ans_dashboard"),
+    "user": os.getenv("DB_USER", "postgres"),
+    "password": os.getenv("DB_PASSWORD", "password"),
+    "port": os.getenv("DB_PORT", "5432"),
+}
+
+# Pool de conexões da API: criado na inicialização do app (main.py) e compartilhado entre as requisições
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Tempo máximo (s) que uma requisição espera por uma conexão livre antes de responder 503
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Conexões ociosas há mais que isso (s) são testadas com SELECT 1 antes de voltar ao uso
+DB_POOL_VERIFICAR_APOS = float(os.getenv("DB_POOL_VERIFICAR_APOS", "30"))
+
+_pool = None
+_vagas = None
+_lock = threading.Lock()
+_ultimo_uso = {}
+_metricas = {'checkouts': 0, 'em_uso': 0, 'espera_total_s': 0.0, 'espera_max_s': 0.0, 'timeouts': 0, 'descartadas': 0}
+
 def get_db_connection():
     try:
-        conn = psycopg2.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            database=os.getenv("DB_NAME", "ans_dashboard"),
-            user=os.getenv("DB_USER", "postgres"),
-            password=os.getenv("DB_PASSWORD", "password"),
-            port=os.getenv("DB_PORT", "5432"),
-            cursor_factory=RealDictCursor
-        )
+        conn = psycopg2.connect(**DB_CONFIG, cursor_factory=RealDictCursor)
         return conn
     except Exception as e:
         logging.error(f"Erro ao conectar ao banco de dados: {e}")
-        raise e
\ No newline at end of file
+        raise e
+
+def iniciar_pool(minimo=DB_POOL_MIN, maximo=DB_POOL_MAX):
+    global _pool, _vagas
+    with _lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(minimo, maximo, cursor_factory=RealDictCursor, **DB_CONFIG)
+            # O ThreadedConnectionPool falha imediatamente quando esgotado; o semáforo faz as requisições aguardarem
+            _vagas = threading.BoundedSemaphore(maximo)
+            logger.info(f"Pool de conexões iniciado (min: {minimo}, max: {maximo})")
+    return _pool
+
+def fechar_pool():
+    global _pool
+    with _lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _ultimo_uso.clear()
+            logger.info("Pool de conexões encerrado")
+
+def conexao_saudavel(conn):
+    if conn.closed:
+        return False
+    # Conexões recém-criadas ou usadas há pouco dispensam o teste (evita um round-trip por requisição)
+    ultimo = _ultimo_uso.get(id(conn))
+    if ultimo is None or time.monotonic() - ultimo < DB_POOL_VERIFICAR_APOS:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+def obter_do_pool():
+    pool = _pool or iniciar_pool()
+    inicio = time.monotonic()
+    if not _vagas.acquire(timeout=DB_POOL_TIMEOUT):
+        with _lock:
+            _metricas['timeouts'] += 1
+        raise PoolError("Nenhuma conexão livre no pool dentro do tempo limite")
+    espera = time.monotonic() - inicio
+
+    try:
+        conn = pool.getconn()
+        # Health check: conexões derrubadas pelo servidor (restart, idle timeout) são descartadas e recriadas
+        while not conexao_saudavel(conn):
+            logger.warning("Conexão inválida descartada do pool")
+            _ultimo_uso.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            with _lock:
+                _metricas['descartadas'] += 1
+            conn = pool.getconn()
+    except Exception:
+        _vagas.release()
+        raise
+
+    with _lock:
+        _metricas['checkouts'] += 1
+        _metricas['em_uso'] += 1
+        _metricas['espera_total_s'] += espera
+        _metricas['espera_max_s'] = max(_metricas['espera_max_s'], espera)
+    return conn
+
+def devolver_ao_pool(conn):
+    try:
+        # Encerra a transação aberta pelas consultas para a conexão não ficar 'idle in transaction'
+        if not conn.closed:
+            conn.rollback()
+    except psycopg2.Error:
+        pass
+    _ultimo_uso[id(conn)] = time.monotonic()
+    _pool.putconn(conn, close=bool(conn.closed))
+    _vagas.release()
+    with _lock:
+        _metricas['em_uso'] -= 1
+
+def emprestar_conexao():
+    # Checkout com a falha traduzida em 503; usado pela dependência e pelas respostas em streaming
+    try:
+        return obter_do_pool()
+    except (PoolError, psycopg2.OperationalError) as e:
+        logger.error(f"Erro ao obter conexão do pool: {e}")
+        raise HTTPException(status_code=503, detail="Banco de dados indisponível no momento")
+
+def get_db():
+    """
+    Dependência FastAPI que empresta uma conexão do pool durante a requisição.
+
+    - **Checkout**: aguarda até `DB_POOL_TIMEOUT` segundos por uma conexão livre; esgotado o prazo, responde 503.
+    - **Devolução**: a conexão volta ao pool ao fim da requisição, mesmo em caso de erro na rota.
+    """
+    conn = emprestar_conexao()
+    try:
+        yield conn
+    finally:
+        devolver_ao_pool(conn)
+
+def ler_em_lotes(conn, sql, params, lote):
+    # Cursor nomeado (server-side): o resultado fica no servidor e é lido em lotes de `lote` linhas (tuplas)
+    with conn.cursor(name='exportacao', cursor_factory=psycopg2.extensions.cursor) as cur:
+        cur.execute(sql, params)
+        while True:
+            linhas = cur.fetchmany(lote)
+            if not linhas:
+                break
+            yield linhas
+
+def consultar_versao_carga():
+    # Leitura avulsa (fora de rota), usada pelo cache de respostas para detectar uma nova carga
+    conn = obter_do_pool()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT versao FROM versao_carga WHERE id = 1")
+            linha = cur.fetchone()
+        return linha['versao'] if linha else 0
+    finally:
+        devolver_ao_pool(conn)
+
+def metricas_pool():
+    with _lock:
+        metricas = dict(_metricas)
+        pool = _pool
+        # Conexões abertas = ociosas no pool + emprestadas às requisições
+        ociosas = len(pool._pool) if pool else 0
+        abertas = ociosas + len(pool._used) if pool else 0
+    metricas.update({
+        'minimo': pool.minconn if pool else DB_POOL_MIN,
+        'maximo': pool.maxconn if pool else DB_POOL_MAX,
+        'abertas': abertas,
+        'ociosas': ociosas,
+        'espera_media_s': metricas['espera_total_s'] / metricas['checkouts'] if metricas['checkouts'] else 0.0,
+    })
+    return metricas
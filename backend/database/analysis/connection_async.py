@@ -0,0 +1,72 @@
+import logging
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row, tuple_row
+from psycopg_pool import AsyncConnectionPool
+from backend.database.analysis.connection import DB_CONFIG, DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Variante assíncrona do acesso ao banco (psycopg 3 + pool assíncrono), usada quando API_ASYNC=1.
+# Mantém os mesmos placeholders (%s) e o formato de linha em dicionário das rotas síncronas.
+
+_pool = None
+
+def conninfo():
+    # Mesmas variáveis de ambiente da conexão síncrona ('database' no psycopg2 equivale a 'dbname')
+    config = {('dbname' if chave == 'database' else chave): valor for chave, valor in DB_CONFIG.items()}
+    return make_conninfo(**config)
+
+async def iniciar_pool_async(minimo=DB_POOL_MIN, maximo=DB_POOL_MAX):
+    global _pool
+    if _pool is None:
+        # check_connection: health check no checkout, descartando conexões derrubadas pelo servidor.
+        # autocommit: consultas somente leitura não deixam transações abertas entre os empréstimos
+        _pool = AsyncConnectionPool(
+            conninfo(), min_size=minimo, max_size=maximo, timeout=DB_POOL_TIMEOUT,
+            check=AsyncConnectionPool.check_connection,
+            kwargs={'row_factory': dict_row, 'autocommit': True}, open=False,
+        )
+        await _pool.open()
+        logger.info(f"Pool assíncrono de conexões iniciado (min: {minimo}, max: {maximo})")
+    return _pool
+
+async def fechar_pool_async():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        logger.info("Pool assíncrono de conexões encerrado")
+
+async def buscar_um(sql, params=None):
+    # Cada consulta empresta sua própria conexão: consultas independentes podem rodar em paralelo (asyncio.gather)
+    async with _pool.connection() as conn:
+        cur = await conn.execute(sql, params)
+        return await cur.fetchone()
+
+async def buscar_todos(sql, params=None):
+    async with _pool.connection() as conn:
+        cur = await conn.execute(sql, params)
+        return await cur.fetchall()
+
+async def obter_conexao():
+    # Empréstimo explícito para respostas em streaming, que continuam lendo depois do retorno da rota
+    return await _pool.getconn()
+
+async def devolver_conexao(conn):
+    await _pool.putconn(conn)
+
+async def ler_em_lotes(conn, sql, params, lote):
+    # Cursores nomeados exigem transação; as conexões do pool estão em autocommit
+    async with conn.transaction():
+        async with conn.cursor(name='exportacao', row_factory=tuple_row) as cur:
+            await cur.execute(sql, params)
+            while linhas := await cur.fetchmany(lote):
+                yield linhas
+
+async def consultar_versao_carga_async():
+    linha = await buscar_um("SELECT versao FROM versao_carga WHERE id = 1")
+    return linha['versao'] if linha else 0
+
+def metricas_pool_async():
+    return _pool.get_stats() if _pool else {}
@@ -17,10 +17,12 @@ valores_periodos AS (
         d_ini.valor_despesa as valor_inicial,
         d_fim.valor_despesa as valor_final
     FROM periodos_extremos pe
+    -- Comparação direta com as colunas (e não com ano * 10 + trimestre) para usar o índice
+    -- (registro_ans, ano, trimestre) e a poda de partições
     JOIN despesas_consolidadas d_ini ON pe.registro_ans = d_ini.registro_ans 
-         AND (d_ini.ano * 10 + d_ini.trimestre) = pe.primeiro_periodo
+         AND d_ini.ano = pe.primeiro_periodo / 10 AND d_ini.trimestre = pe.primeiro_periodo % 10
     JOIN despesas_consolidadas d_fim ON pe.registro_ans = d_fim.registro_ans 
-         AND (d_fim.ano * 10 + d_fim.trimestre) = pe.ultimo_periodo
+         AND d_fim.ano = pe.ultimo_periodo / 10 AND d_fim.trimestre = pe.ultimo_periodo % 10
     WHERE d_ini.valor_despesa > 0
 )
 -- Calcula a variação percentual
@@ -10,10 +10,29 @@ CREATE TABLE IF NOT EXISTS operadoras_ativas (
     data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Migração de bancos criados antes do particionamento: o CREATE TABLE IF NOT EXISTS abaixo não altera uma
+-- tabela comum já existente. Ela é renomeada para despesas_consolidadas_legado (com a chave primária, a
+-- sequência e os índices que ocupariam os nomes da nova tabela), e as linhas são movidas para as partições
+-- logo após a criação dos índices. Idempotente: sem tabela comum, nada é feito. Os resumos materializados
+-- dependem da tabela antiga e são recriados mais adiante neste mesmo arquivo.
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('despesas_consolidadas') AND relkind = 'r') THEN
+        RAISE NOTICE 'despesas_consolidadas não particionada: migrando para tabela particionada por trimestre';
+        DROP MATERIALIZED VIEW IF EXISTS mv_estatisticas_gerais, mv_despesas_operadora, mv_despesas_uf;
+        DROP INDEX IF EXISTS idx_dc_cnpj, idx_dc_fatia;
+        ALTER TABLE despesas_consolidadas RENAME TO despesas_consolidadas_legado;
+        ALTER INDEX IF EXISTS despesas_consolidadas_pkey RENAME TO despesas_consolidadas_legado_pkey;
+        ALTER SEQUENCE IF EXISTS despesas_consolidadas_id_seq RENAME TO despesas_consolidadas_legado_id_seq;
+    END IF;
+END $$;
+
 -- Tabela para dados consolidados de despesas
 -- Esta tabela recebe o conteúdo do consolidado_enriquecido.csv
+-- Particionada por período (ano, trimestre): o loader cria, anexa e substitui uma partição por trimestre
+-- (despesas_consolidadas_<ano>_t<trimestre>). Índices criados aqui valem para todas as partições.
 CREATE TABLE IF NOT EXISTS despesas_consolidadas (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     cnpj VARCHAR(14),
     razao_social VARCHAR(255),
     trimestre INTEGER,
@@ -22,8 +41,10 @@ CREATE TABLE IF NOT EXISTS despesas_consolidadas (
     registro_ans VARCHAR(20),
     modalidade VARCHAR(100),
     uf CHAR(2),
-    data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-);
+    data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Em tabelas particionadas a chave primária precisa conter a chave de partição
+    PRIMARY KEY (id, ano, trimestre)
+) PARTITION BY RANGE (ano, trimestre);
 
 -- Tabela para dados agregados
 -- Esta tabela recebe o conteúdo do despesas_agregadas.csv
@@ -37,7 +58,95 @@ CREATE TABLE IF NOT EXISTS despesas_agregadas (
     data_calculo TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Busca textual de operadoras: trigramas (pg_trgm) atendem ILIKE '%termo%' e similaridade na razão social e
+-- trechos de CNPJ; text_pattern_ops atende buscas por prefixo de CNPJ/Registro ANS no autocompletar
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao_trgm ON operadoras_ativas USING gin (razao_social gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_cnpj_trgm ON operadoras_ativas USING gin (cnpj gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_cnpj_prefixo ON operadoras_ativas(cnpj text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_operadoras_registro_prefixo ON operadoras_ativas(registro_ans text_pattern_ops);
 CREATE INDEX IF NOT EXISTS idx_operadoras_uf ON operadoras_ativas(uf);
 CREATE INDEX IF NOT EXISTS idx_agregadas_total ON despesas_agregadas(total_despesas DESC);
 CREATE INDEX IF NOT EXISTS idx_operadoras_modalidade ON operadoras_ativas(modalidade);
-CREATE INDEX IF NOT EXISTS idx_dc_cnpj ON despesas_consolidadas(cnpj);
\ No newline at end of file
+-- Ordem da listagem de operadoras: serve a paginação keyset (razao_social, registro_ans) e o ORDER BY do OFFSET
+CREATE INDEX IF NOT EXISTS idx_operadoras_razao ON operadoras_ativas(razao_social, registro_ans);
+CREATE INDEX IF NOT EXISTS idx_dc_cnpj ON despesas_consolidadas(cnpj, ano, trimestre);
+CREATE INDEX IF NOT EXISTS idx_dc_fatia ON despesas_consolidadas(registro_ans, ano, trimestre);
+
+-- Segunda parte da migração: cria uma partição por trimestre da tabela antiga (com o mesmo nome usado pelo
+-- loader) e move as linhas, preservando os ids. Linhas sem ano/trimestre não cabem em nenhuma partição:
+-- ficam em despesas_consolidadas_sem_periodo para conferência.
+DO $$
+DECLARE
+    periodo RECORD;
+BEGIN
+    IF to_regclass('despesas_consolidadas_legado') IS NULL THEN
+        RETURN;
+    END IF;
+
+    FOR periodo IN SELECT DISTINCT ano, trimestre FROM despesas_consolidadas_legado
+                   WHERE ano IS NOT NULL AND trimestre IS NOT NULL LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF despesas_consolidadas FOR VALUES FROM (%s, %s) TO (%s, %s)',
+                       format('despesas_consolidadas_%s_t%s', periodo.ano, periodo.trimestre),
+                       periodo.ano, periodo.trimestre, periodo.ano, periodo.trimestre + 1);
+    END LOOP;
+
+    INSERT INTO despesas_consolidadas (id, cnpj, razao_social, trimestre, ano, valor_despesa, registro_ans, modalidade, uf, data_carga)
+    SELECT id, cnpj, razao_social, trimestre, ano, valor_despesa, registro_ans, modalidade, uf, data_carga
+    FROM despesas_consolidadas_legado
+    WHERE ano IS NOT NULL AND trimestre IS NOT NULL;
+
+    PERFORM setval(pg_get_serial_sequence('despesas_consolidadas', 'id'),
+                   COALESCE((SELECT max(id) FROM despesas_consolidadas), 0) + 1, false);
+
+    DELETE FROM despesas_consolidadas_legado WHERE ano IS NOT NULL AND trimestre IS NOT NULL;
+    IF EXISTS (SELECT 1 FROM despesas_consolidadas_legado) THEN
+        RAISE WARNING 'Linhas sem ano/trimestre mantidas em despesas_consolidadas_sem_periodo';
+        ALTER TABLE despesas_consolidadas_legado RENAME TO despesas_consolidadas_sem_periodo;
+    ELSE
+        DROP TABLE despesas_consolidadas_legado;
+    END IF;
+END $$;
+
+-- Controle da carga incremental: impressão digital de cada fatia já carregada em despesas_consolidadas
+CREATE TABLE IF NOT EXISTS despesas_fatias (
+    registro_ans VARCHAR(20),
+    ano INTEGER,
+    trimestre INTEGER,
+    hash CHAR(16) NOT NULL,
+    linhas INTEGER NOT NULL,
+    data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (registro_ans, ano, trimestre)
+);
+
+-- Versão dos dados: incrementada pelo loader a cada carga. A API a usa para invalidar o cache de respostas
+-- e compõe com ela o ETag enviado aos clientes (revalidação com 304).
+CREATE TABLE IF NOT EXISTS versao_carga (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    versao BIGINT NOT NULL DEFAULT 0,
+    data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+INSERT INTO versao_carga (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+-- Resumos materializados do dashboard (/api/estatisticas e /api/estatisticas/uf): as rotas leem poucas linhas
+-- prontas em vez de agregar a tabela de despesas a cada requisição. O loader os atualiza ao fim de cada carga
+-- com REFRESH MATERIALIZED VIEW CONCURRENTLY, que exige um índice único em cada um.
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_estatisticas_gerais AS
+SELECT 1 AS id, SUM(valor_despesa) AS total, AVG(valor_despesa) AS media
+FROM despesas_consolidadas;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_despesas_operadora AS
+SELECT razao_social, SUM(valor_despesa) AS total
+FROM despesas_consolidadas
+GROUP BY razao_social;
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_despesas_uf AS
+SELECT o.uf, SUM(d.valor_despesa) AS total
+FROM despesas_consolidadas d
+JOIN operadoras_ativas o ON d.cnpj = o.cnpj
+GROUP BY o.uf;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_estatisticas_gerais ON mv_estatisticas_gerais(id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_operadora ON mv_despesas_operadora(razao_social);
+CREATE INDEX IF NOT EXISTS idx_mv_operadora_total ON mv_despesas_operadora(total DESC);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_uf ON mv_despesas_uf(uf);
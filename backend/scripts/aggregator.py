@@ -1,7 +1,12 @@
 import pandas as pd
+import numpy as np
 import zipfile
 import os
+import json
+import hashlib
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from storage import salvar_intermediario, ler_intermediario, existe_intermediario, escrever_csv_no_zip, MOTOR_EXECUCAO
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -10,37 +15,197 @@ INPUT_FILE = "data/processed/consolidado_enriquecido.csv"
 OUTPUT_FILE = "data/processed/despesas_agregadas.csv"
 ZIP_FINAL = "Teste_Alex_Magalhaes.zip" 
 
-def executar_agregacao():
-    if not os.path.exists(INPUT_FILE):
-        logger.error("Arquivo enriquecido não encontrado!")
-        return
+# Estado da agregação incremental: estatísticas suficientes por (RazaoSocial, UF, Ano, Trimestre)
+ESTADO_FILE = "data/processed/agregacao_estado.parquet"
+ESTADO_META = "data/processed/agregacao_estado.json"
 
-    df = pd.read_csv(INPUT_FILE)
+CHAVES = ['RazaoSocial', 'UF']
+PERIODO = ['Ano', 'Trimestre']
 
-    logger.info("Iniciando cálculos de agregação...")
+# "incremental" (padrão) agrega apenas trimestres novos ou alterados; "completa" recalcula todo o histórico
+AGREGADOR_MODO = os.getenv("AGREGADOR_MODO", "incremental").lower()
+# Partes agregadas em paralelo e depois combinadas (1 = sem paralelismo)
+AGREGADOR_PARTES = int(os.getenv("AGREGADOR_PARTES", "1"))
 
-    # Agregação para análise de performance financeira por UF
-    # Calcula métricas de tendência central (média) e dispersão (desvio padrão)
-    agg_df = df.groupby(['RazaoSocial', 'UF']).agg(
-        TotalDespesas=('ValorDespesas', 'sum'),
-        MediaTrimestral=('ValorDespesas', 'mean'),
-        DesvioPadrao=('ValorDespesas', 'std')
-    ).reset_index()
+def estatisticas_parciais(df, chaves=CHAVES):
+    # Estatísticas suficientes por grupo: N (valores não nulos), Soma e M2 (soma dos quadrados dos desvios
+    # em relação à média do grupo). Ao contrário de média e desvio, elas podem ser combinadas entre partes.
+    grupos = df.groupby(chaves)['ValorDespesas']
+    est = grupos.agg(N='count', Soma='sum')
+    est['M2'] = (grupos.var(ddof=0) * est['N']).fillna(0)
+    return est.reset_index()
+
+def combinar(parciais, chaves=CHAVES):
+    """
+    Combina estatísticas parciais dos mesmos grupos (Chan et al.), sem voltar às linhas originais.
+
+    Para partes i de um grupo: N = ΣNᵢ, Soma = ΣSomaᵢ e M2 = Σ[M2ᵢ + Nᵢ·(médiaᵢ − média)²].
+    Serve tanto para somar trimestres ao estado guardado quanto para juntar partes calculadas em paralelo.
+    """
+    df = pd.concat(parciais, ignore_index=True)
+    grupos = df.groupby(chaves)
+    media = grupos['Soma'].transform('sum') / grupos['N'].transform('sum')
+    desvio = (df['N'] * (df['Soma'] / df['N'] - media) ** 2).fillna(0)
+
+    est = df.assign(M2=df['M2'] + desvio).groupby(chaves)[['N', 'Soma', 'M2']].sum()
+    return est.reset_index()
+
+def derivar_metricas(est):
+    # Mesmas métricas (e convenções) do cálculo direto com sum/mean/std do pandas
+    agg_df = pd.DataFrame({
+        'RazaoSocial': est['RazaoSocial'],
+        'UF': est['UF'],
+        'TotalDespesas': est['Soma'],
+        'MediaTrimestral': est['Soma'] / est['N'].where(est['N'] > 0),
+        # Desvio padrão amostral (ddof=1): grupos com apenas 1 registro ficam sem valor
+        'DesvioPadrao': np.sqrt(est['M2'] / (est['N'] - 1).where(est['N'] > 1)),
+    })
 
     # Tratamento de Desvio Padrão: 
     # Operadoras com apenas 1 registro terão NaN no Desvio Padrão
     agg_df['DesvioPadrao'] = agg_df['DesvioPadrao'].fillna(0)
 
     # Ordenação por TotalDespesas (Maior para Menor)
-    agg_df = agg_df.sort_values(by='TotalDespesas', ascending=False)
+    return agg_df.sort_values(by='TotalDespesas', ascending=False)
+
+def estatisticas_em_paralelo(df, chaves=CHAVES, partes=AGREGADOR_PARTES):
+    # Cada parte calcula suas estatísticas de forma independente; o resultado é o mesmo da parte única
+    if MOTOR_EXECUCAO == 'duckdb':
+        # O DuckDB já paraleliza a agregação internamente
+        import motor_duckdb
+        return motor_duckdb.estatisticas_parciais(df, chaves)
+    if partes <= 1 or len(df) < partes:
+        return estatisticas_parciais(df, chaves)
+    limites = np.linspace(0, len(df), partes + 1, dtype=int)
+    with ThreadPoolExecutor(max_workers=partes) as executor:
+        parciais = list(executor.map(lambda i: estatisticas_parciais(df.iloc[limites[i]:limites[i + 1]], chaves),
+                                     range(partes)))
+    return combinar(parciais, chaves)
+
+def agregar_despesas(df, partes=AGREGADOR_PARTES):
+    logger.info("Iniciando cálculos de agregação...")
+
+    # Agregação para análise de performance financeira por UF
+    # Calcula métricas de tendência central (média) e dispersão (desvio padrão)
+    return derivar_metricas(estatisticas_em_paralelo(df, CHAVES, partes))
+
+def codigo_periodo(df):
+    # Período como inteiro (AAAAT): filtra trimestres sem montar strings linha a linha
+    return df['Ano'].astype('int32') * 10 + df['Trimestre'].astype('int32')
+
+def codigo_de_chave(chave):
+    ano, trimestre = chave.split('-')
+    return int(ano) * 10 + int(trimestre)
+
+def impressoes_trimestres(df):
+    # Impressão digital de cada trimestre: nº de linhas + soma dos hashes das linhas (independe da ordem).
+    # Muda com qualquer valor, razão social ou UF alterados, mesmo sem mudar a quantidade de linhas.
+    hashes = pd.util.hash_pandas_object(df[CHAVES + ['ValorDespesas']], index=False)
+    grupos = hashes.groupby([df['Ano'].astype('int64').to_numpy(), df['Trimestre'].astype('int64').to_numpy()])
+    return {f"{ano}-{trimestre}": f"{n}:{h:016x}"
+            for ((ano, trimestre), h), n in zip(grupos.sum().items(), grupos.size())}
 
-    agg_df.to_csv(OUTPUT_FILE, index=False)
-    logger.info(f"Arquivo agregado salvo em: {OUTPUT_FILE}")
+def impressoes_upstream():
+    """
+    Impressão digital de cada trimestre vinda das etapas anteriores, sem reler as linhas agregadas.
 
+    Combina os metadados das fontes brutas do trimestre (`processor.impressoes_fontes`) com o que vale
+    para todos os trimestres: o cadastro usado no enriquecimento e o código de processor/enricher.
+    Qualquer um deles mudando invalida o trimestre, como aconteceria com as linhas.
+    """
+    # Importados sob demanda: a agregação avulsa (com impressões próprias) não precisa deles
+    import processor
+    import enricher
+    import storage
+    from cache import hash_codigo
+
+    cadastro = os.path.normpath(enricher.CADASTRO_LOCAL)
+    fontes = [(nome, origem) for nome, origem in processor.listar_fontes()
+              if isinstance(origem, tuple) or os.path.normpath(origem) != cadastro]
+    comum = enricher.impressao_cadastro() + hash_codigo([processor, enricher, storage])
+    return {chave: hashlib.sha256((comum + impressao).encode('utf-8')).hexdigest()
+            for chave, impressao in processor.impressoes_fontes(fontes).items()}
+
+def carregar_estado():
+    if os.path.exists(ESTADO_FILE) and os.path.exists(ESTADO_META):
+        with open(ESTADO_META, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        return pd.read_parquet(ESTADO_FILE), meta['trimestres']
+    return None, {}
+
+def salvar_estado(estado, trimestres):
+    os.makedirs(os.path.dirname(ESTADO_FILE), exist_ok=True)
+    estado.to_parquet(ESTADO_FILE, index=False)
+    with open(ESTADO_META, 'w', encoding='utf-8') as f:
+        json.dump({'trimestres': trimestres}, f)
+
+def agregar_incremental(df, modo=AGREGADOR_MODO, partes=AGREGADOR_PARTES, impressoes=None):
+    """
+    Agregação por (RazaoSocial, UF) reaproveitando as estatísticas já calculadas em execuções anteriores.
+
+    - **Estado**: N/Soma/M2 por grupo e trimestre em `ESTADO_FILE`, com a impressão digital de cada trimestre
+      em `ESTADO_META`.
+    - **Impressões**: `impressoes` ({'AAAA-T': impressão}) vem das etapas anteriores (`impressoes_upstream`),
+      sem custo proporcional ao histórico. Sem elas, cada trimestre é impresso a partir das próprias linhas
+      (`impressoes_trimestres`); trimestres da entrada ausentes de `impressoes` são sempre reagregados.
+    - **Incremental**: só as linhas de trimestres novos ou alterados (impressão digital diferente da guardada,
+      inclusive correções de valor ou de cadastro que não mudam o nº de linhas) são agregadas;
+      trimestres que saíram da entrada deixam o estado. As métricas finais vêm da combinação do estado,
+      cujo tamanho é grupos x trimestres, não o número de linhas.
+    - **Completa**: `modo='completa'` descarta o estado e recalcula tudo.
+    """
+    logger.info(f"Iniciando cálculos de agregação (modo: {modo})...")
+
+    estado, guardados = carregar_estado() if modo == 'incremental' else (None, {})
+    periodos = codigo_periodo(df)
+    if impressoes is None:
+        trimestres = impressoes_trimestres(df)
+    else:
+        presentes = [f"{codigo // 10}-{codigo % 10}" for codigo in periodos.unique()]
+        trimestres = {chave: impressoes.get(chave) for chave in presentes}
+    novos = [chave for chave, impressao in trimestres.items()
+             if impressao is None or guardados.get(chave) != impressao]
+
+    if estado is not None:
+        # Mantém apenas os trimestres ainda presentes na entrada e que não serão recalculados
+        manter = [chave for chave in trimestres if chave not in novos]
+        estado = estado[codigo_periodo(estado).isin([codigo_de_chave(chave) for chave in manter])]
+
+    if novos:
+        logger.info(f"Trimestres agregados nesta execução: {', '.join(sorted(novos))}")
+        delta = estatisticas_em_paralelo(df[periodos.isin([codigo_de_chave(c) for c in novos])],
+                                         CHAVES + PERIODO, partes)
+        estado = delta if estado is None else pd.concat([estado, delta], ignore_index=True)
+    else:
+        logger.info("Nenhum trimestre novo ou alterado: métricas derivadas do estado guardado.")
+
+    if estado is None:
+        # Entrada vazia e sem estado anterior
+        estado = estatisticas_parciais(df, CHAVES + PERIODO)
+    salvar_estado(estado, trimestres)
+
+    # Trimestres de um mesmo grupo são partes disjuntas: combinados como qualquer agregação parcial
+    return derivar_metricas(combinar([estado], CHAVES))
+
+def gerar_zip_final(agg_df):
     with zipfile.ZipFile(ZIP_FINAL, 'w', zipfile.ZIP_DEFLATED) as zf:
-        zf.write(OUTPUT_FILE, arcname="despesas_agregadas.csv")
+        escrever_csv_no_zip(zf, agg_df, "despesas_agregadas.csv")
     
     logger.info(f"Desafio concluído! Arquivo final gerado: {ZIP_FINAL}")
 
+def executar_agregacao():
+    if not existe_intermediario(INPUT_FILE):
+        logger.error("Arquivo enriquecido não encontrado!")
+        return
+
+    # Apenas as colunas usadas na agregação são lidas do arquivo enriquecido
+    df = ler_intermediario(INPUT_FILE, colunas=CHAVES + PERIODO + ['ValorDespesas'])
+    agg_df = agregar_incremental(df, impressoes=impressoes_upstream())
+
+    caminho = salvar_intermediario(agg_df, OUTPUT_FILE)
+    logger.info(f"Arquivo agregado salvo em: {caminho}")
+
+    gerar_zip_final(agg_df)
+
 if __name__ == "__main__":
     executar_agregacao()
\ No newline at end of file
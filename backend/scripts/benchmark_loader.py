@@ -0,0 +1,82 @@
+import time
+import logging
+import argparse
+
+import numpy as np
+import pandas as pd
+import psycopg2
+
+import loader
+from storage import ler_intermediario, existe_intermediario
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INPUT_FILE = "data/processed/consolidado_enriquecido.csv"
+
+# Compara a vazão (linhas/s) dos métodos de carga do loader contra um PostgreSQL local.
+# As cargas vão para tabelas temporárias com a mesma estrutura das reais (LIKE ... INCLUDING DEFAULTS)
+# e a transação é desfeita ao final: as tabelas do dashboard não são alteradas.
+
+def gerar_despesas(linhas, seed=42):
+    # Massa sintética com o layout do consolidado enriquecido, para quando não há arquivo processado
+    rng = np.random.default_rng(seed)
+    registros = rng.integers(300000, 400000, size=linhas).astype(str)
+    return pd.DataFrame({
+        'CNPJ': rng.integers(10**13, 10**14, size=linhas).astype(str),
+        'RazaoSocial': np.char.add('OPERADORA ', registros),
+        'Trimestre': rng.integers(1, 5, size=linhas),
+        'Ano': np.full(linhas, 2025),
+        'ValorDespesas': np.round(rng.uniform(1, 10**8, size=linhas), 2),
+        'RegistroANS': registros,
+        'Modalidade': rng.choice(['Cooperativa Médica', 'Medicina de Grupo', 'Autogestão'], size=linhas),
+        'UF': rng.choice(['SP', 'RJ', 'MG', 'RS', 'BA'], size=linhas),
+    })
+
+def carregar_massa(linhas):
+    if linhas is None and existe_intermediario(INPUT_FILE):
+        return ler_intermediario(INPUT_FILE)
+    return gerar_despesas(linhas or 100000)
+
+def medir(conn, df, tabela, colunas, metodo, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE TEMP TABLE bench_{tabela} (LIKE {tabela} INCLUDING DEFAULTS);")
+            start = time.perf_counter()
+            loader.inserir(cur, df, f"bench_{tabela}", colunas, metodo)
+            tempos.append(time.perf_counter() - start)
+        conn.rollback()
+    # Mediana para reduzir a influência de ruído (cache, autovacuum, etc.)
+    return float(np.median(tempos))
+
+def executar_benchmark(linhas=None, repeticoes=3, metodos=('batch', 'copy')):
+    df = carregar_massa(linhas)
+    df = df.assign(ValorDespesas=pd.to_numeric(df['ValorDespesas'], errors='coerce').fillna(0))
+    logger.info(f"Massa de teste: {len(df)} linhas")
+
+    conn = psycopg2.connect(**loader.DB_CONFIG)
+    try:
+        resultados = {}
+        for metodo in metodos:
+            duracao = medir(conn, df, 'despesas_consolidadas', loader.COLUNAS_DESPESAS, metodo, repeticoes)
+            resultados[metodo] = len(df) / duracao
+            logger.info(f"{metodo:<6} {duracao:>8.2f}s  {resultados[metodo]:>12,.0f} linhas/s")
+    finally:
+        conn.close()
+
+    if 'batch' in resultados and 'copy' in resultados:
+        logger.info(f"COPY foi {resultados['copy'] / resultados['batch']:.1f}x mais rápido que execute_batch")
+    return resultados
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de carga: COPY vs execute_batch")
+    parser.add_argument("--linhas", type=int, default=None,
+                        help="Usa N linhas sintéticas em vez do consolidado enriquecido")
+    parser.add_argument("--repeticoes", type=int, default=3,
+                        help="Execuções por método (é reportada a mediana)")
+    args = parser.parse_args()
+    executar_benchmark(args.linhas, args.repeticoes)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import shutil
+import tempfile
+import logging
+import argparse
+import platform
+import subprocess
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import processor
+import validator
+import enricher
+import aggregator
+import storage
+from storage import aplicar_esquema
+from gerar_dados_sinteticos import gerar_dados
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Mede vazão (linhas/s), tempo e pico de memória (RSS) de cada etapa de transformação do pipeline e do
+# pipeline completo, sobre dados sintéticos determinísticos. Cada medição roda em um processo novo:
+# o pico de RSS de um processo só cresce, então medir etapas no mesmo processo misturaria os picos.
+# Crawler e loader ficam de fora (rede e banco); os resultados são gravados em JSON para comparar commits.
+
+RESULTADOS_DIR = "data/benchmarks"
+# Entradas/saídas de cada etapa entre os processos de medição (dentro da pasta de trabalho)
+BENCH_DIR = "data/bench"
+
+def etapa_processor(entradas):
+    return aplicar_esquema(processor.consolidar_despesas())
+
+def etapa_cadastro(entradas):
+    # Sem snapshot: mede o parsing e a indexação do CSV de cadastro
+    for caminho in (enricher.SNAPSHOT_CADASTRO, enricher.SNAPSHOT_META):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+    return enricher.preparar_cadastro()
+
+def etapa_validator(entradas):
+    return validator.validar_despesas(entradas['processor'])
+
+def etapa_enricher(entradas):
+    return aplicar_esquema(enricher.enriquecer(entradas['processor'], entradas['cadastro']))
+
+def etapa_aggregator(entradas):
+    # Agregação completa (sem o estado incremental): mede o cálculo, não o reaproveitamento
+    return aggregator.agregar_despesas(entradas['enricher'])
+
+# Mesmas dependências do run_pipeline: o enricher consome a saída do processor; o validator é um ramo lateral
+ETAPAS = {
+    'processor':  {'fn': etapa_processor,  'deps': []},
+    'cadastro':   {'fn': etapa_cadastro,   'deps': []},
+    'validator':  {'fn': etapa_validator,  'deps': ['processor']},
+    'enricher':   {'fn': etapa_enricher,   'deps': ['processor', 'cadastro']},
+    'aggregator': {'fn': etapa_aggregator, 'deps': ['enricher']},
+}
+
+def pico_rss_mb():
+    # VmHWM (Linux) recomeça no exec do processo novo; o ru_maxrss herdaria o pico do processo que o criou
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    pico = processor.pico_memoria_mb()
+    return pico['processo'] if pico else None
+
+def pico_workers_mb():
+    # Maior worker do modo paralelo do processor (PROCESSOR_WORKERS > 1)
+    pico = processor.pico_memoria_mb()
+    return pico['workers'] if pico and processor.PROCESSOR_WORKERS > 1 else None
+
+def caminho_bench(nome):
+    return os.path.join(BENCH_DIR, f"{nome}.parquet")
+
+def linhas_entrada(nome, entradas, manifesto):
+    if nome == 'processor':
+        return sum(manifesto['arquivos'].values())
+    if nome == 'cadastro':
+        return manifesto['cadastro']
+    return len(entradas[ETAPAS[nome]['deps'][0]])
+
+def medir_etapa(pasta, nome, manifesto):
+    # Executado em um processo novo: carrega as entradas, mede apenas a etapa e grava a saída para as seguintes
+    os.chdir(pasta)
+    entradas = {dep: pd.read_parquet(caminho_bench(dep)) for dep in ETAPAS[nome]['deps']}
+    rss_base = pico_rss_mb()
+
+    inicio = time.perf_counter()
+    saida = ETAPAS[nome]['fn'](entradas)
+    duracao = time.perf_counter() - inicio
+
+    saida.to_parquet(caminho_bench(nome))
+    return {'linhas': linhas_entrada(nome, entradas, manifesto), 'linhas_saida': len(saida), 'segundos': duracao,
+            'rss_base_mb': rss_base, 'rss_pico_mb': pico_rss_mb(), 'rss_workers_mb': pico_workers_mb()}
+
+def medir_pipeline(pasta, manifesto):
+    # Todas as etapas em sequência no mesmo processo, com os DataFrames passados em memória
+    os.chdir(pasta)
+    resultados = {}
+    inicio = time.perf_counter()
+    for nome, etapa in ETAPAS.items():
+        resultados[nome] = etapa['fn']({dep: resultados[dep] for dep in etapa['deps']})
+    duracao = time.perf_counter() - inicio
+    return {'linhas': sum(manifesto['arquivos'].values()), 'linhas_saida': len(resultados['aggregator']),
+            'segundos': duracao, 'rss_pico_mb': pico_rss_mb()}
+
+def em_processo_novo(funcao, *args):
+    # spawn (e não fork): o processo filho não herda a memória já ocupada pelo benchmark
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(funcao, *args).result()
+
+def resumir(medicoes):
+    # Mediana do tempo entre as repetições (reduz ruído); pico de memória é o maior observado
+    resultado = dict(medicoes[0])
+    resultado['segundos'] = float(np.median([m['segundos'] for m in medicoes]))
+    resultado['rss_pico_mb'] = max((m['rss_pico_mb'] or 0) for m in medicoes) or None
+    resultado['linhas_por_s'] = resultado['linhas'] / resultado['segundos'] if resultado['segundos'] else None
+    return resultado
+
+def versao_codigo():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True)
+        alterado = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                  capture_output=True, text=True, check=True)
+        return {'commit': commit.stdout.strip(), 'alteracoes_locais': bool(alterado.stdout.strip())}
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': None, 'alteracoes_locais': None}
+
+def executar_benchmark(linhas=100_000, repeticoes=1, pasta=None, seed=42, proporcao_eventos=0.3, operadoras=1000,
+                       trimestres=3):
+    """
+    Gera os dados sintéticos e mede cada etapa e o pipeline completo. Devolve o relatório (dicionário).
+
+    - **Etapas**: processor, cadastro, validator, enricher e aggregator, cada uma isolada em um processo novo.
+    - **Métricas**: linhas de entrada, segundos (mediana de `repeticoes`), linhas/s e pico de RSS (MB).
+    - **Configuração**: as variáveis do pipeline (PIPELINE_MOTOR, PIPELINE_FORMATO, PROCESSOR_WORKERS...)
+      valem também aqui e são registradas no relatório.
+    """
+    temporaria = pasta is None
+    pasta = os.path.abspath(pasta or tempfile.mkdtemp(prefix="bench_ans_"))
+    try:
+        logger.info(f"Gerando {linhas} linhas sintéticas em {pasta}...")
+        inicio = time.perf_counter()
+        # Também em processo separado: a geração não infla a memória do processo que dispara as medições
+        manifesto = em_processo_novo(gerar_dados, pasta, linhas, trimestres, 2025, operadoras, proporcao_eventos,
+                                     seed)
+        logger.info(f"Dados gerados em {time.perf_counter() - inicio:.2f}s")
+        os.makedirs(os.path.join(pasta, BENCH_DIR), exist_ok=True)
+
+        etapas = {}
+        for nome in ETAPAS:
+            etapas[nome] = resumir([em_processo_novo(medir_etapa, pasta, nome, manifesto) for _ in range(repeticoes)])
+            logger.info(f"{nome:<11} {etapas[nome]['segundos']:>8.2f}s {etapas[nome]['linhas_por_s']:>14,.0f} linhas/s"
+                        f"  pico {etapas[nome]['rss_pico_mb'] or 0:>8.1f} MB")
+
+        pipeline = resumir([em_processo_novo(medir_pipeline, pasta, manifesto) for _ in range(repeticoes)])
+        logger.info(f"{'pipeline':<11} {pipeline['segundos']:>8.2f}s {pipeline['linhas_por_s']:>14,.0f} linhas/s"
+                    f"  pico {pipeline['rss_pico_mb'] or 0:>8.1f} MB")
+    finally:
+        if temporaria:
+            shutil.rmtree(pasta, ignore_errors=True)
+
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'codigo': versao_codigo(),
+        'ambiente': {'python': platform.python_version(), 'pandas': pd.__version__, 'numpy': np.__version__,
+                     'sistema': platform.platform(), 'cpus': os.cpu_count()},
+        'configuracao': {'motor': storage.MOTOR_EXECUCAO, 'formato': storage.FORMATO_INTERMEDIARIO,
+                         'processor_workers': processor.PROCESSOR_WORKERS},
+        'dados': manifesto['parametros'],
+        'repeticoes': repeticoes,
+        'etapas': etapas,
+        'pipeline': pipeline,
+    }
+
+def salvar_relatorio(relatorio, caminho=None):
+    if caminho is None:
+        commit = relatorio['codigo']['commit'] or 'sem_git'
+        carimbo = relatorio['data'].replace(':', '').replace('-', '')
+        caminho = os.path.join(RESULTADOS_DIR, f"pipeline_{carimbo}_{commit}.json")
+    os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, indent=2)
+    logger.info(f"Relatório gravado em {caminho}")
+    return caminho
+
+def comparar(relatorio, anterior):
+    # Variação de vazão e memória por etapa em relação a um relatório anterior (ex: outro commit)
+    logger.info(f"Comparação com {anterior['codigo']['commit']} ({anterior['data']}):")
+    if anterior['dados'] != relatorio['dados']:
+        logger.warning("Os relatórios usam dados sintéticos diferentes; a comparação é apenas indicativa.")
+    atuais = dict(relatorio['etapas'], pipeline=relatorio['pipeline'])
+    antigos = dict(anterior['etapas'], pipeline=anterior['pipeline'])
+    for nome, atual in atuais.items():
+        antigo = antigos.get(nome)
+        if not antigo or not antigo.get('linhas_por_s') or not atual.get('linhas_por_s'):
+            continue
+        vazao = atual['linhas_por_s'] / antigo['linhas_por_s'] - 1
+        memoria = (atual['rss_pico_mb'] or 0) - (antigo['rss_pico_mb'] or 0)
+        logger.info(f"{nome:<11} vazão {vazao:>+8.1%}  pico de memória {memoria:>+8.1f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das etapas do pipeline sobre dados sintéticos")
+    parser.add_argument("--linhas", type=int, default=100_000, help="Linhas das demonstrações sintéticas")
+    parser.add_argument("--repeticoes", type=int, default=1, help="Execuções por medição (é reportada a mediana)")
+    parser.add_argument("--trimestres", type=int, default=3, choices=[1, 2, 3, 4])
+    parser.add_argument("--operadoras", type=int, default=1000)
+    parser.add_argument("--proporcao-eventos", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--pasta", default=None,
+                        help="Pasta de trabalho mantida após a execução (padrão: temporária, removida ao final)")
+    parser.add_argument("--saida", default=None, help=f"Arquivo JSON do relatório (padrão: {RESULTADOS_DIR}/...)")
+    parser.add_argument("--comparar", default=None, metavar="JSON", help="Relatório anterior para comparação")
+    args = parser.parse_args()
+
+    relatorio = executar_benchmark(args.linhas, args.repeticoes, args.pasta, args.seed, args.proporcao_eventos,
+                                   args.operadoras, args.trimestres)
+    salvar_relatorio(relatorio, args.saida)
+    if args.comparar:
+        with open(args.comparar, 'r', encoding='utf-8') as f:
+            comparar(relatorio, json.load(f))
+
+if __name__ == "__main__":
+    main()
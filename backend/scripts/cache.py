@@ -0,0 +1,94 @@
+import os
+import json
+import hashlib
+import logging
+
+import pandas as pd
+
+from manifest import calcular_hash
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "data/cache"
+ESTADO_FILE = os.path.join(CACHE_DIR, "estado.json")
+
+def carregar_estado(caminho=ESTADO_FILE):
+    if not os.path.exists(caminho):
+        return {'etapas': {}, 'arquivos': {}}
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            estado = json.load(f)
+    except Exception as e:
+        # Cache corrompido equivale a cache vazio: todas as etapas são reexecutadas
+        logger.warning(f"Estado do cache ilegível ({e}). Todas as etapas serão executadas.")
+        return {'etapas': {}, 'arquivos': {}}
+    estado.setdefault('etapas', {})
+    estado.setdefault('arquivos', {})
+    return estado
+
+def salvar_estado(estado, caminho=ESTADO_FILE):
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    tmp = caminho + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, indent=2, sort_keys=True)
+    os.replace(tmp, caminho)
+
+def hash_codigo(modulos):
+    # Versão do código: conteúdo dos arquivos-fonte dos módulos envolvidos na etapa
+    sha = hashlib.sha256()
+    for modulo in modulos:
+        with open(modulo.__file__, 'rb') as f:
+            sha.update(f.read())
+    return sha.hexdigest()
+
+def hash_arquivos(caminhos, estado):
+    # Impressão digital do conteúdo dos arquivos. O SHA-256 de cada arquivo é memorizado por
+    # (tamanho, mtime): arquivos não tocados desde a última execução não são relidos
+    memo = estado['arquivos']
+    sha = hashlib.sha256()
+    for caminho in sorted(set(caminhos)):
+        stat = os.stat(caminho)
+        assinatura = [stat.st_size, stat.st_mtime_ns]
+        registro = memo.get(caminho)
+        if not registro or registro[:2] != assinatura:
+            registro = assinatura + [calcular_hash(caminho)]
+            memo[caminho] = registro
+        sha.update(caminho.encode('utf-8'))
+        sha.update(registro[2].encode('ascii'))
+    return sha.hexdigest()
+
+def calcular_chave(nome, modulos, impressoes_deps):
+    # Chave da etapa: código + impressões das entradas. Se nada disso mudou, a saída também não muda
+    sha = hashlib.sha256()
+    sha.update(nome.encode('utf-8'))
+    sha.update(hash_codigo(modulos).encode('ascii'))
+    for dep, impressao in sorted(impressoes_deps.items()):
+        sha.update(f"{dep}={impressao}".encode('utf-8'))
+    return sha.hexdigest()
+
+def caminho_resultado(nome):
+    return os.path.join(CACHE_DIR, f"{nome}.parquet")
+
+def salvar_resultado(nome, df):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    df.to_parquet(caminho_resultado(nome), index=False)
+
+def carregar_resultado(nome):
+    caminho = caminho_resultado(nome)
+    return pd.read_parquet(caminho) if os.path.exists(caminho) else None
+
+def cache_valido(estado, nome, chave, artefatos=()):
+    registro = estado['etapas'].get(nome)
+    if not registro or registro.get('chave') != chave:
+        return False
+    # A etapa só é pulada se tudo o que ela produziu ainda existe em disco
+    if registro.get('tem_resultado') and not os.path.exists(caminho_resultado(nome)):
+        return False
+    return all(os.path.exists(a) for a in artefatos)
+
+def registrar_execucao(estado, nome, chave, resultado):
+    tem_resultado = isinstance(resultado, pd.DataFrame)
+    if tem_resultado:
+        salvar_resultado(nome, resultado)
+    estado['etapas'][nome] = {'chave': chave, 'tem_resultado': tem_resultado}
@@ -1,16 +1,19 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 import zipfile
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urljoin
+from manifest import MANIFEST_FILE, carregar_manifesto, baixar_condicional
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
         logging.FileHandler("execucao.log"),
-        logging.StreamHandler()              
+        logging.StreamHandler()
     ]
 )
 logger = logging.getLogger(__name__)
@@ -18,83 +21,122 @@ logger = logging.getLogger(__name__)
 BASE_URL = "https://dadosabertos.ans.gov.br/FTP/PDA/demonstracoes_contabeis/"
 DOWNLOAD_DIR = "data/raw"
 
-def download_and_extract():
-    if not os.path.exists(DOWNLOAD_DIR):
-        os.makedirs(DOWNLOAD_DIR)
-        logger.info(f"Diretório criado: {DOWNLOAD_DIR}")
+# Limite de downloads/listagens simultâneos. CRAWLER_WORKERS=1 reproduz o modo sequencial.
+CRAWLER_WORKERS = int(os.getenv("CRAWLER_WORKERS", "4"))
 
-    logger.info(f"Buscando anos em: {BASE_URL}")
+# Extração opcional: por padrão os ZIPs são mantidos compactados e o processor lê os CSVs
+# diretamente de dentro deles. CRAWLER_EXTRAIR=1 restaura a extração para data/raw/<nome>/.
+CRAWLER_EXTRAIR = os.getenv("CRAWLER_EXTRAIR", "0") == "1"
+
+def criar_sessao(workers=CRAWLER_WORKERS):
+    # Sessão compartilhada entre as threads: reaproveita conexões keep-alive
+    # em vez de abrir um novo handshake TCP/TLS a cada requisição.
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def listar_links(session, url):
+    res = session.get(url, timeout=15)
+    soup = BeautifulSoup(res.text, 'html.parser')
+    return [a['href'] for a in soup.find_all('a', href=True)]
+
+def baixar_e_extrair(session, zip_url, manifesto, download_dir=DOWNLOAD_DIR, caminho_manifesto=MANIFEST_FILE, extrair=CRAWLER_EXTRAIR):
+    clean_zip_name = zip_url.strip('/').split('/')[-1]
+    path = os.path.join(download_dir, clean_zip_name)
+    folder_name = clean_zip_name.replace('.zip', '').replace('.ZIP', '')
+    extract_folder = os.path.join(download_dir, folder_name)
+
+    # Download via Stream para otimizar consumo de memória com arquivos grandes.
+    # O download é condicional ao manifesto: ZIPs inalterados desde a última execução não são baixados nem extraídos.
+    logger.info(f"Baixando: {clean_zip_name}...")
+    alterado = baixar_condicional(session, zip_url, path, manifesto,
+                                  tem_copia_local=os.path.isdir(extract_folder) if extrair else os.path.exists(path),
+                                  caminho_manifesto=caminho_manifesto)
+
+    if not extrair:
+        return alterado
+
+    # Extração e limpeza imediata do arquivo ZIP para economizar espaço em disco.
+    # Roda na própria thread do download, em paralelo aos demais arquivos ainda em trânsito.
+    if alterado:
+        try:
+            with zipfile.ZipFile(path, 'r') as zip_ref:
+                zip_ref.extractall(extract_folder)
+                logger.info(f"Extraído em: {extract_folder}")
+        except Exception as e:
+            logger.error(f"ERRO ao extrair {clean_zip_name}: {e}")
+
+    if os.path.exists(path):
+        os.remove(path)
+    return alterado
+
+def download_and_extract(base_url=BASE_URL, download_dir=DOWNLOAD_DIR, workers=CRAWLER_WORKERS, extrair=CRAWLER_EXTRAIR):
+    if not os.path.exists(download_dir):
+        os.makedirs(download_dir)
+        logger.info(f"Diretório criado: {download_dir}")
+
+    if not base_url.endswith('/'):
+        base_url += '/'
+
+    logger.info(f"Buscando anos em: {base_url} (workers: {workers})")
+    session = criar_sessao(workers)
+    # O manifesto acompanha o diretório de download para que ambientes de teste não compartilhem estado
+    caminho_manifesto = os.path.join(download_dir, os.path.basename(MANIFEST_FILE))
+    manifesto = carregar_manifesto(caminho_manifesto)
     try:
-        response = requests.get(BASE_URL, timeout=15)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
         # Filtra links que representam anos e ordena de forma decrescente para priorizar dados recentes
-        links = [a['href'] for a in soup.find_all('a', href=True)]
+        links = listar_links(session, base_url)
         years = sorted([l for l in links if l.strip('/').isdigit()], reverse=True)
-        
+
         logger.info(f"Anos encontrados: {years}")
 
         found_quarters = []
         for year in years:
             # Estratégia de parada: busca apenas os trimestres mais recentes conforme limite definido
             if len(found_quarters) >= 1: break
-            year_url = BASE_URL + year if BASE_URL.endswith('/') else BASE_URL + '/' + year
+            year_url = urljoin(base_url, year)
             logger.info(f"Acessando ano: {year_url}")
-            
+
             # Acessa a pasta do ano para buscar subpastas de trimestres
-            res_year = requests.get(year_url, timeout=15)
-            soup_year = BeautifulSoup(res_year.text, 'html.parser')
-            
-            q_links = [a['href'] for a in soup_year.find_all('a', href=True) if a['href'] not in ['../', './', '/']]
+            q_links = [l for l in listar_links(session, year_url) if l not in ['../', './', '/']]
             q_links = sorted([q for q in q_links if q.endswith('/')], reverse=True)
-            
+
             # Coleta as URLs finais onde os arquivos ZIP residem
             for q in q_links:
                 if len(found_quarters) >= 3: break
                 q_full_url = year_url
                 found_quarters.append(q_full_url)
 
-        for q_url in found_quarters:
-            logger.info(f"Verificando arquivos em: {q_url}")
-            res_q = requests.get(q_url, timeout=15)
-            soup_q = BeautifulSoup(res_q.text, 'html.parser')
-            
-            zips = [a['href'] for a in soup_q.find_all('a', href=True) if a['href'].lower().endswith('.zip')]
-            
-            if not zips:
-                logger.warning(f"Nenhum ZIP encontrado nesta pasta específica.")
-                continue
-
-            for zip_name in zips:
-                zip_url = q_url + zip_name if q_url.endswith('/') else q_url + '/' + zip_name
-                clean_zip_name = zip_name.strip('/').split('/')[-1]
-                path = os.path.join(DOWNLOAD_DIR, clean_zip_name)
-                
-                # Download via Stream para otimizar consumo de memória com arquivos grandes
-                logger.info(f"Baixando: {clean_zip_name}...")
-                r = requests.get(zip_url, stream=True)
-                if r.status_code == 200:
-                    with open(path, 'wb') as f:
-                        for chunk in r.iter_content(chunk_size=8192):
-                            f.write(chunk)
-                    
-                    # Extração e limpeza imediata do arquivo ZIP para economizar espaço em disco
-                    try:
-                        with zipfile.ZipFile(path, 'r') as zip_ref:
-                            folder_name = clean_zip_name.replace('.zip', '').replace('.ZIP', '')
-                            extract_folder = os.path.join(DOWNLOAD_DIR, folder_name)
-                            zip_ref.extractall(extract_folder)
-                            logger.info(f"Extraído em: {extract_folder}")
-                    except Exception as e:
-                        logger.error(f"ERRO ao extrair {clean_zip_name}: {e}")
-                    
-                    if os.path.exists(path):
-                        os.remove(path)
-                else:
-                    logger.error(f"Falha no download. Status: {r.status_code}")
+        # Remove URLs repetidas: em modo concorrente, duas threads gravando o mesmo ZIP corromperiam o arquivo
+        found_quarters = list(dict.fromkeys(found_quarters))
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Listagens das pastas de trimestre em paralelo (executor.map preserva a ordem)
+            listagens = executor.map(lambda u: listar_links(session, u), found_quarters)
+
+            zip_urls = []
+            for q_url, hrefs in zip(found_quarters, listagens):
+                logger.info(f"Verificando arquivos em: {q_url}")
+                zips = [h for h in hrefs if h.lower().endswith('.zip')]
+                if not zips:
+                    logger.warning(f"Nenhum ZIP encontrado nesta pasta específica.")
+                    continue
+                zip_urls.extend(urljoin(q_url if q_url.endswith('/') else q_url + '/', z) for z in zips)
+
+            # Downloads simultâneos, limitados pelo número de workers
+            futures = {executor.submit(baixar_e_extrair, session, u, manifesto, download_dir, caminho_manifesto, extrair): u for u in dict.fromkeys(zip_urls)}
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    logger.error(f"Erro ao baixar {futures[future]}: {e}")
 
     except Exception as e:
         logger.error(f"Erro geral no crawler: {e}")
+    finally:
+        session.close()
 
 if __name__ == "__main__":
-    download_and_extract()
\ No newline at end of file
+    download_and_extract()
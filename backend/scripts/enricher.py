@@ -2,7 +2,10 @@ import pandas as pd
 import requests
 from bs4 import BeautifulSoup
 import os
+import json
 import logging
+from manifest import carregar_manifesto, baixar_condicional, calcular_hash
+from storage import salvar_intermediario, ler_intermediario, MOTOR_EXECUCAO
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -10,6 +13,10 @@ logger = logging.getLogger(__name__)
 URL_DIRETORIO = "https://dadosabertos.ans.gov.br/FTP/PDA/operadoras_de_plano_de_saude_ativas/"
 CADASTRO_LOCAL = "data/raw/cadastro_operadoras.csv"
 
+# Snapshot do cadastro já normalizado e indexado por RegistroANS (Parquet + metadados da fonte)
+SNAPSHOT_CADASTRO = "data/processed/cadastro_snapshot.parquet"
+SNAPSHOT_META = "data/processed/cadastro_snapshot.json"
+
 def buscar_e_baixar_csv():
     if not os.path.exists("data/raw"): os.makedirs("data/raw")
     
@@ -33,22 +40,23 @@ def buscar_e_baixar_csv():
         url_download = URL_DIRETORIO + link_csv
         logger.info(f"Arquivo encontrado: {link_csv}. Iniciando download...")
         
-        res_file = requests.get(url_download)
-        with open(CADASTRO_LOCAL, 'wb') as f:
-            f.write(res_file.content)
-            
+        # Download condicional via manifesto: se o cadastro não mudou na ANS, o servidor responde 304
+        # e o arquivo local é mantido; downloads interrompidos são retomados via HTTP Range
+        with requests.Session() as session:
+            manifesto = carregar_manifesto()
+            alterado = baixar_condicional(session, url_download, CADASTRO_LOCAL, manifesto,
+                                          tem_copia_local=os.path.exists(CADASTRO_LOCAL))
+
+        if not alterado and not os.path.exists(CADASTRO_LOCAL):
+            raise Exception("Download do cadastro não concluído.")
+
         logger.info("Download do cadastro concluído com sucesso.")
         return True
     except Exception as e:
         logger.error(f"Erro ao buscar/baixar o cadastro: {e}")
         return False
     
-def enrich_data():
-    if not os.path.exists(CADASTRO_LOCAL):
-        if not buscar_e_baixar_csv(): return
-
-    df_fin = pd.read_csv("data/processed/consolidado_despesas.csv", dtype={'CNPJ': str})
-    
+def carregar_cadastro():
     # Tenta carregar os dados cadastrais tratando variações de encoding e delimitadores
     try:
         df_cad = pd.read_csv(CADASTRO_LOCAL, sep=';', encoding='latin-1', dtype={'CNPJ': str})
@@ -56,7 +64,7 @@ def enrich_data():
             df_cad = pd.read_csv(CADASTRO_LOCAL, sep=',', encoding='latin-1', dtype={'CNPJ': str})
     except Exception as e:
         logger.error(f"Erro ao ler CSV de cadastro: {e}")
-        return
+        return None
 
     logger.info(f"Colunas encontradas no cadastro: {df_cad.columns.tolist()}")
 
@@ -79,25 +87,89 @@ def enrich_data():
 
     if len(mapeamento) < 4:
         logger.error(f"Colunas faltantes. Encontradas: {list(mapeamento.keys())}")
-        return
+        return None
 
     df_cad = df_cad[list(mapeamento.keys())].rename(columns=mapeamento)
     df_cad = df_cad.drop_duplicates(subset=['RegistroANS'], keep='first')
-    
+    return indexar_cadastro(df_cad)
+
+def indexar_cadastro(df_cad):
+    # Normaliza a chave uma única vez e a transforma em índice: o join vira um lookup (reindex)
+    df_cad = df_cad.assign(RegistroANS=df_cad['RegistroANS'].astype(str).str.strip())
+    # Chaves que só diferiam por espaços colidem após o strip; manter a primeira evita duplicar despesas no join
+    df_cad = df_cad.drop_duplicates(subset=['RegistroANS'], keep='first')
+    return df_cad.set_index('RegistroANS')[['CNPJ_CADASTRO', 'Modalidade', 'UF']]
+
+def assinatura_fonte(caminho):
+    stat = os.stat(caminho)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def impressao_cadastro():
+    # SHA-256 do cadastro baixado, reaproveitando o do snapshot quando tamanho/mtime ainda conferem
+    if not os.path.exists(CADASTRO_LOCAL):
+        return ''
+    if os.path.exists(SNAPSHOT_META):
+        with open(SNAPSHOT_META, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('fonte') == assinatura_fonte(CADASTRO_LOCAL) and meta.get('sha256'):
+            return meta['sha256']
+    return calcular_hash(CADASTRO_LOCAL)
+
+def preparar_cadastro():
+    """
+    Devolve o cadastro pronto para o join, reaproveitando o snapshot em disco quando possível.
+
+    - **Snapshot**: cadastro já parseado, com aliases resolvidos, deduplicado e indexado por RegistroANS, em Parquet.
+    - **Invalidação**: reconstruído apenas se o CSV de origem mudar (tamanho/mtime e, na dúvida, SHA-256).
+    """
+    if not os.path.exists(CADASTRO_LOCAL):
+        return None
+
+    assinatura = assinatura_fonte(CADASTRO_LOCAL)
+    if os.path.exists(SNAPSHOT_CADASTRO) and os.path.exists(SNAPSHOT_META):
+        with open(SNAPSHOT_META, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        # Mesmo tamanho/mtime dispensa o hash; mtime diferente (ex: novo download idêntico) confere o conteúdo
+        if meta.get('fonte') != assinatura and \
+                meta.get('fonte', {}).get('size') == assinatura['size'] and meta.get('sha256') == calcular_hash(CADASTRO_LOCAL):
+            # Conteúdo confirmado: atualiza o mtime registrado para não recalcular o hash nas próximas execuções
+            meta['fonte'] = assinatura
+            with open(SNAPSHOT_META, 'w', encoding='utf-8') as f:
+                json.dump(meta, f)
+        if meta.get('fonte') == assinatura:
+            logger.info("Cadastro inalterado: usando snapshot preparado.")
+            return pd.read_parquet(SNAPSHOT_CADASTRO)
+
+    logger.info("Preparando snapshot do cadastro...")
+    df_cad = carregar_cadastro()
+    if df_cad is None:
+        return None
+
+    os.makedirs(os.path.dirname(SNAPSHOT_CADASTRO), exist_ok=True)
+    df_cad.to_parquet(SNAPSHOT_CADASTRO)
+    with open(SNAPSHOT_META, 'w', encoding='utf-8') as f:
+        json.dump({'fonte': assinatura, 'sha256': calcular_hash(CADASTRO_LOCAL)}, f)
+    return df_cad
+
+def enriquecer(df_fin, df_cad):
     logger.info("Padronizando tipos e realizando Join...")
-    df_fin['CNPJ'] = df_fin['CNPJ'].astype(str).str.strip()
-    df_cad['RegistroANS'] = df_cad['RegistroANS'].astype(str).str.strip()
+    if MOTOR_EXECUCAO == 'duckdb':
+        import motor_duckdb
+        return motor_duckdb.enriquecer(df_fin, df_cad)
+
+    # assign em vez de atribuição in-place: as entradas podem estar compartilhadas com outras etapas em memória
+    df_fin = df_fin.assign(CNPJ=df_fin['CNPJ'].astype(str).str.strip())
 
     # Enriquecimento:
-    # Realiza o 'Left Join' para agregar informações geográficas e de modalidade 
-    # às despesas financeiras, utilizando o Registro ANS como chave primária de ligação.
-    df_final = pd.merge(
-        df_fin, 
-        df_cad, 
-        left_on='CNPJ',      
-        right_on='RegistroANS', 
-        how='left'
-    )
+    # 'Left Join' via lookup indexado: o cadastro já está indexado por Registro ANS (chave única),
+    # então um reindex pelas chaves das despesas equivale ao merge, preservando ordem e quantidade de linhas.
+    # Como não depende do DataFrame completo, também funciona aplicado chunk a chunk.
+    encontrados = df_cad.reindex(df_fin['CNPJ'].to_numpy())
+    df_final = df_fin.reset_index(drop=True)
+    df_final['CNPJ_CADASTRO'] = encontrados['CNPJ_CADASTRO'].to_numpy()
+    df_final['Modalidade'] = encontrados['Modalidade'].to_numpy()
+    df_final['UF'] = encontrados['UF'].to_numpy()
+    df_final['RegistroANS'] = df_final['CNPJ'].where(encontrados.index.isin(df_cad.index))
 
     # Reconciliação de Identificadores: Preenche CNPJs ausentes no cadastro com dados da origem
     df_final['CNPJ_Final'] = df_final['CNPJ_CADASTRO'].fillna(df_final['CNPJ'])
@@ -119,9 +191,23 @@ def enrich_data():
 
     # Se não achou RegistroANS no merge, usa o ID que veio no arquivo de despesas
     df_saida['RegistroANS'] = df_saida['RegistroANS'].fillna(df_saida['CNPJ']) 
+    return df_saida
+
+def enrich_data():
+    # Consulta a ANS em toda execução: o download condicional custa um 304 quando o cadastro não mudou,
+    # e uma cópia local antiga não impede a atualização. Sem acesso à ANS, segue com a cópia local
+    if not buscar_e_baixar_csv() and not os.path.exists(CADASTRO_LOCAL):
+        return
+
+    df_fin = ler_intermediario("data/processed/consolidado_despesas.csv")
+
+    df_cad = preparar_cadastro()
+    if df_cad is None:
+        return
 
-    df_saida.to_csv("data/processed/consolidado_enriquecido.csv", index=False)
-    logger.info("Sucesso! Arquivo 'consolidado_enriquecido.csv' gerado.")
+    df_saida = enriquecer(df_fin, df_cad)
+    caminho = salvar_intermediario(df_saida, "data/processed/consolidado_enriquecido.csv")
+    logger.info(f"Sucesso! Arquivo '{caminho}' gerado.")
 
 if __name__ == "__main__":
     enrich_data()
\ No newline at end of file
@@ -0,0 +1,187 @@
+import io
+import os
+import csv
+import json
+import logging
+import zipfile
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from validator import PESOS_DV1, PESOS_DV2
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Gera demonstrações contábeis e cadastro de operadoras sintéticos, no layout dos arquivos da ANS
+# (separador ';', latin-1, campos entre aspas), para benchmarks e testes de carga do pipeline.
+# Determinístico: mesma semente e mesmos parâmetros produzem os mesmos arquivos, byte a byte.
+
+# Linhas geradas por vez: a memória fica limitada a um bloco, de 10 mil a dezenas de milhões de linhas
+BLOCO_LINHAS = 500_000
+
+# Descrições que passam no filtro do processor (EVENTOS + SINISTROS, em qualquer caixa)
+DESCRICOES_EVENTOS = [
+    "EVENTOS/ SINISTROS CONHECIDOS OU AVISADOS",
+    "Eventos/Sinistros conhecidos ou avisados de assistência a saúde médico hospitalar",
+    "EVENTOS INDENIZÁVEIS LÍQUIDOS / SINISTROS RETIDOS",
+]
+# Demais contas, incluindo as que têm só uma das palavras do filtro
+DESCRICOES_OUTRAS = [
+    "RECEITAS",
+    "OUTRAS DESPESAS OPERACIONAIS",
+    "DESPESAS ADMINISTRATIVAS",
+    "EVENTOS A LIQUIDAR",
+    "PROVISÃO PARA SINISTROS A LIQUIDAR",
+]
+MODALIDADES = ['Cooperativa Médica', 'Medicina de Grupo', 'Autogestão', 'Seguradora Especializada em Saúde',
+               'Filantropia', 'Cooperativa Odontológica']
+UFS = ['SP', 'RJ', 'MG', 'RS', 'PR', 'BA', 'SC', 'PE', 'GO', 'CE', 'DF', 'ES', 'PA', 'AM', 'MT']
+
+# Formatos de VL_SALDO_FINAL e sua participação: '1234,56', '1.234,56', '1234.56', vazio, '0', negativo, inválido
+FORMATOS_VALOR = ['br', 'br_milhar', 'en', 'vazio', 'zero', 'negativo', 'invalido']
+PESOS_FORMATOS = [0.50, 0.30, 0.10, 0.03, 0.03, 0.02, 0.02]
+
+# Parte dos registros das demonstrações sem correspondência no cadastro (exercita o fallback do enricher)
+PROPORCAO_SEM_CADASTRO = 0.05
+
+def gerar_cnpjs(rng, quantidade):
+    # CNPJs com dígitos verificadores válidos, calculados com os mesmos pesos do validator
+    base = rng.integers(0, 10, size=(quantidade, 12))
+    base[:, 0] = rng.integers(1, 10, size=quantidade)
+
+    def digito(matriz, pesos):
+        resto = (matriz @ pesos) % 11
+        return np.where(resto < 2, 0, 11 - resto)
+
+    dv1 = digito(base, PESOS_DV1)
+    dv2 = digito(np.column_stack([base, dv1]), PESOS_DV2)
+    digitos = np.column_stack([base, dv1, dv2]).astype(np.uint8) + 48
+    return digitos.view(f'S14').ravel().astype(str)
+
+def formatar_valores(rng, quantidade):
+    centavos = np.round(rng.lognormal(mean=13, sigma=2, size=quantidade)).astype(np.int64) + 1
+    formatos = rng.choice(len(FORMATOS_VALOR), size=quantidade, p=PESOS_FORMATOS)
+    reais = pd.Series(centavos // 100).astype(str)
+    fracao = pd.Series(centavos % 100).astype(str).str.zfill(2)
+
+    valores = reais + ',' + fracao
+    milhar = formatos == FORMATOS_VALOR.index('br_milhar')
+    valores[milhar] = [f"{r:,}".replace(',', '.') for r in (centavos[milhar] // 100)] + (',' + fracao[milhar])
+    en = formatos == FORMATOS_VALOR.index('en')
+    valores[en] = reais[en] + '.' + fracao[en]
+    negativo = formatos == FORMATOS_VALOR.index('negativo')
+    valores[negativo] = '-' + valores[negativo]
+    valores[formatos == FORMATOS_VALOR.index('vazio')] = ''
+    valores[formatos == FORMATOS_VALOR.index('zero')] = '0'
+    valores[formatos == FORMATOS_VALOR.index('invalido')] = 'N/D'
+    return valores
+
+def gerar_bloco(rng, linhas, registros, ano, trimestre, proporcao_eventos):
+    eventos = rng.random(linhas) < proporcao_eventos
+    descricao = np.where(eventos,
+                         rng.choice(DESCRICOES_EVENTOS, size=linhas),
+                         rng.choice(DESCRICOES_OUTRAS, size=linhas))
+    conta = np.where(eventos, '41', rng.choice(['31', '32', '46', '47'], size=linhas))
+    return pd.DataFrame({
+        'DATA': f"{ano}-{(trimestre - 1) * 3 + 1:02d}-01",
+        'REG_ANS': rng.choice(registros, size=linhas),
+        'CD_CONTA_CONTABIL': conta,
+        'DESCRICAO': descricao,
+        'VL_SALDO_INICIAL': '0',
+        'VL_SALDO_FINAL': formatar_valores(rng, linhas),
+    })
+
+def escrever_csv(handle, blocos):
+    # Layout da ANS: todos os campos entre aspas, ';' como separador, latin-1
+    texto = io.TextIOWrapper(handle, encoding='latin-1', newline='')
+    for i, bloco in enumerate(blocos):
+        bloco.to_csv(texto, sep=';', index=False, header=(i == 0), quoting=csv.QUOTE_ALL, lineterminator='\n')
+    texto.flush()
+    texto.detach()
+
+def gerar_trimestre(rng, raw_dir, linhas, registros, ano, trimestre, proporcao_eventos, compactar):
+    nome = f"{trimestre}T{ano}"
+    blocos = (gerar_bloco(rng, min(BLOCO_LINHAS, linhas - inicio), registros, ano, trimestre, proporcao_eventos)
+              for inicio in range(0, linhas, BLOCO_LINHAS))
+
+    if compactar:
+        caminho = os.path.join(raw_dir, f"{nome}.zip")
+        # date_time fixo: o ZIP também sai idêntico entre execuções
+        info = zipfile.ZipInfo(f"{nome}.csv", date_time=(ano, (trimestre - 1) * 3 + 1, 1, 0, 0, 0))
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with zipfile.ZipFile(caminho, 'w') as zf, zf.open(info, 'w', force_zip64=True) as membro:
+            escrever_csv(membro, blocos)
+    else:
+        caminho = os.path.join(raw_dir, f"{nome}.csv")
+        with open(caminho, 'wb') as f:
+            escrever_csv(f, blocos)
+    return caminho
+
+def gerar_cadastro(rng, raw_dir, registros):
+    cadastro = pd.DataFrame({
+        'REGISTRO_OPERADORA': registros,
+        'CNPJ': gerar_cnpjs(rng, len(registros)),
+        'Razao_Social': [f"OPERADORA {r} SAÚDE" for r in registros],
+        'Modalidade': rng.choice(MODALIDADES, size=len(registros)),
+        'UF': rng.choice(UFS, size=len(registros)),
+        'Data_Registro_ANS': '2000-01-01',
+    })
+    caminho = os.path.join(raw_dir, "cadastro_operadoras.csv")
+    cadastro.to_csv(caminho, sep=';', index=False, encoding='latin-1', lineterminator='\n')
+    return caminho
+
+def gerar_dados(pasta, linhas=100_000, trimestres=3, ano=2025, operadoras=1000, proporcao_eventos=0.3,
+                seed=42, compactar=True):
+    """
+    Gera `linhas` linhas de demonstrações contábeis, divididas entre `trimestres` arquivos, e o cadastro.
+
+    - **Destino**: `<pasta>/data/raw`, o mesmo layout lido pelo pipeline (executado com `<pasta>` como diretório).
+    - **Conteúdo**: `proporcao_eventos` das linhas são contas EVENTOS/SINISTROS; valores em formatos decimais mistos.
+    - **Manifesto**: `<pasta>/data/sintetico.json` com os parâmetros e as linhas por arquivo.
+    """
+    raw_dir = os.path.join(pasta, "data", "raw")
+    os.makedirs(raw_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    registros = (300000 + np.arange(operadoras)).astype(str)
+    # Registros que aparecem nas demonstrações mas não no cadastro
+    extras = (900000 + np.arange(max(1, int(operadoras * PROPORCAO_SEM_CADASTRO)))).astype(str)
+    gerar_cadastro(rng, raw_dir, registros)
+
+    arquivos = {}
+    por_trimestre = np.diff(np.linspace(0, linhas, trimestres + 1).astype(int))
+    for trimestre, quantidade in enumerate(por_trimestre, start=1):
+        caminho = gerar_trimestre(rng, raw_dir, int(quantidade), np.concatenate([registros, extras]), ano,
+                                  trimestre, proporcao_eventos, compactar)
+        arquivos[os.path.basename(caminho)] = int(quantidade)
+        logger.info(f"Gerado: {caminho} ({quantidade} linhas)")
+
+    manifesto = {
+        'parametros': {'linhas': linhas, 'trimestres': trimestres, 'ano': ano, 'operadoras': operadoras,
+                       'proporcao_eventos': proporcao_eventos, 'seed': seed, 'compactar': compactar},
+        'arquivos': arquivos,
+        'cadastro': operadoras,
+    }
+    with open(os.path.join(pasta, "data", "sintetico.json"), 'w', encoding='utf-8') as f:
+        json.dump(manifesto, f, indent=2)
+    return manifesto
+
+def main():
+    parser = argparse.ArgumentParser(description="Gerador de dados sintéticos da ANS (demonstrações + cadastro)")
+    parser.add_argument("pasta", help="Diretório de trabalho; os arquivos vão para <pasta>/data/raw")
+    parser.add_argument("--linhas", type=int, default=100_000, help="Total de linhas das demonstrações")
+    parser.add_argument("--trimestres", type=int, default=3, choices=[1, 2, 3, 4])
+    parser.add_argument("--ano", type=int, default=2025)
+    parser.add_argument("--operadoras", type=int, default=1000, help="Operadoras no cadastro")
+    parser.add_argument("--proporcao-eventos", type=float, default=0.3,
+                        help="Fração das linhas em contas EVENTOS/SINISTROS")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--csv", action="store_true", help="Grava CSVs soltos em vez de ZIPs")
+    args = parser.parse_args()
+    gerar_dados(args.pasta, args.linhas, args.trimestres, args.ano, args.operadoras, args.proporcao_eventos,
+                args.seed, compactar=not args.csv)
+
+if __name__ == "__main__":
+    main()
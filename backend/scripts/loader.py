@@ -1,3 +1,6 @@
+import io
+import re
+import numpy as np
 import pandas as pd
 import psycopg2
 from psycopg2 import extras
@@ -5,6 +8,7 @@ import os
 import logging
 from pathlib import Path
 from dotenv import load_dotenv
+from storage import ler_intermediario, existe_intermediario
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -21,7 +25,293 @@ DB_CONFIG = {
     "port": os.getenv("DB_PORT", "5432"),
 }
 
-def load_data():
+# Método de carga: "copy" (padrão, COPY ... FROM STDIN) ou "batch" (INSERTs via execute_batch)
+LOADER_METODO = os.getenv("LOADER_METODO", "copy").lower()
+
+# Modo de carga: "incremental" (padrão) substitui apenas as fatias (registro_ans, ano, trimestre)
+# novas ou alteradas; "completa" recarrega tudo em uma tabela-sombra trocada atomicamente com a atual
+LOADER_MODO = os.getenv("LOADER_MODO", "incremental").lower()
+
+# Linhas por comando COPY: limita o buffer CSV em memória a um lote por vez
+COPY_LOTE_LINHAS = int(os.getenv("LOADER_COPY_LOTE", "100000"))
+
+# Colunas de cada tabela (banco) e as colunas correspondentes dos DataFrames, na mesma ordem
+COLUNAS_OPERADORAS = {
+    'registro_ans': 'RegistroANS', 'cnpj': 'CNPJ', 'razao_social': 'RazaoSocial',
+    'modalidade': 'Modalidade', 'uf': 'UF',
+}
+COLUNAS_DESPESAS = {
+    'cnpj': 'CNPJ', 'razao_social': 'RazaoSocial', 'trimestre': 'Trimestre', 'ano': 'Ano',
+    'valor_despesa': 'ValorDespesas', 'registro_ans': 'RegistroANS', 'modalidade': 'Modalidade', 'uf': 'UF',
+}
+COLUNAS_AGREGADAS = {
+    'razao_social': 'RazaoSocial', 'uf': 'UF', 'total_despesas': 'TotalDespesas',
+    'media_trimestral': 'MediaTrimestral', 'desvio_padrao': 'DesvioPadrao',
+}
+COLUNAS_FATIAS = {c: c for c in ['registro_ans', 'ano', 'trimestre', 'hash', 'linhas']}
+CHAVE_FATIA = ['registro_ans', 'ano', 'trimestre']
+
+# Resumos materializados lidos pelas rotas de estatísticas, atualizados após cada carga
+RESUMOS = ['mv_estatisticas_gerais', 'mv_despesas_operadora', 'mv_despesas_uf']
+
+# despesas_consolidadas é particionada por período: uma partição por trimestre, com este padrão de nome
+PADRAO_PARTICAO = re.compile(r'despesas_consolidadas_(\d{4})_t(\d)')
+
+def copiar_dataframe(cur, df, tabela, colunas, lote=COPY_LOTE_LINHAS):
+    # COPY em formato CSV: o texto é gerado pelo serializador do pandas direto das colunas,
+    # sem criar uma tupla Python por linha. Valores ausentes viram campo vazio (NULL no COPY).
+    sql = f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN WITH (FORMAT csv)"
+    df = df[list(colunas.values())]
+    for inicio in range(0, len(df), lote):
+        buffer = io.StringIO()
+        df.iloc[inicio:inicio + lote].to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        cur.copy_expert(sql, buffer)
+
+def inserir_em_lote(cur, df, tabela, colunas, sufixo=""):
+    # Caminho anterior: conversão para tuplas para compatibilidade com o adaptador psycopg2.
+    # Mantido como alternativa (LOADER_METODO=batch) e como referência no benchmark.
+    df = df[list(colunas.values())]
+    # Valores ausentes viram None (NULL), como no COPY
+    dados = [tuple(x) for x in df.astype(object).where(df.notna(), None).values]
+    marcadores = ', '.join(['%s'] * len(colunas))
+    sql = f"INSERT INTO {tabela} ({', '.join(colunas)}) VALUES ({marcadores}) {sufixo};"
+    # Uso de execute_batch para reduzir o overhead de rede através de múltiplos INSERTs agrupados
+    extras.execute_batch(cur, sql, dados)
+
+def inserir(cur, df, tabela, colunas, metodo=LOADER_METODO):
+    if metodo == 'copy':
+        copiar_dataframe(cur, df, tabela, colunas)
+    else:
+        inserir_em_lote(cur, df, tabela, colunas)
+
+def carregar_operadoras(cur, operadoras, metodo=LOADER_METODO):
+    # Estratégia de UPSERT (ON CONFLICT): Garante que o script seja idempotente,
+    # atualizando dados existentes em vez de falhar por duplicidade.
+    upsert = "ON CONFLICT (registro_ans) DO UPDATE SET razao_social = EXCLUDED.razao_social"
+    if metodo != 'copy':
+        inserir_em_lote(cur, operadoras, 'operadoras_ativas', COLUNAS_OPERADORAS, sufixo=upsert)
+        return
+
+    # COPY não suporta ON CONFLICT: os dados vão para uma tabela temporária e o UPSERT é feito em um único INSERT ... SELECT
+    cur.execute("CREATE TEMP TABLE stg_operadoras (LIKE operadoras_ativas INCLUDING DEFAULTS) ON COMMIT DROP;")
+    copiar_dataframe(cur, operadoras, 'stg_operadoras', COLUNAS_OPERADORAS)
+    colunas = ', '.join(COLUNAS_OPERADORAS)
+    cur.execute(f"INSERT INTO operadoras_ativas ({colunas}) SELECT {colunas} FROM stg_operadoras {upsert};")
+
+def calcular_fatias(df_fin):
+    # Impressão digital de cada fatia (registro_ans, ano, trimestre): soma dos hashes das linhas,
+    # que não depende da ordem das linhas, mais a quantidade de linhas
+    hashes = pd.util.hash_pandas_object(df_fin[list(COLUNAS_DESPESAS.values())].astype(str), index=False)
+    grupos = hashes.groupby([
+        df_fin['RegistroANS'].astype(str).to_numpy(),
+        df_fin['Ano'].astype('int64').to_numpy(),
+        df_fin['Trimestre'].astype('int64').to_numpy(),
+    ])
+    fatias = pd.DataFrame({'hash': grupos.sum(), 'linhas': grupos.size()})
+    fatias.index.names = CHAVE_FATIA
+    fatias = fatias.reset_index()
+    fatias['hash'] = fatias['hash'].map('{:016x}'.format)
+    return fatias
+
+def criar_staging(cur, nome, tabela, colunas):
+    # Tabela temporária com os mesmos tipos da tabela de destino, descartada no fim da transação
+    cur.execute(f"CREATE TEMP TABLE {nome} ON COMMIT DROP AS SELECT {', '.join(colunas)} FROM {tabela} WITH NO DATA;")
+
+def nome_particao(ano, trimestre):
+    return f"despesas_consolidadas_{ano}_t{trimestre}"
+
+def listar_particoes(cur):
+    # Partições trimestrais já anexadas à tabela de despesas: {(ano, trimestre): nome}
+    # Banco criado antes do particionamento: sem a migração do schema.sql, ATTACH/DETACH falhariam adiante
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('despesas_consolidadas');")
+    tipo = cur.fetchone()
+    if not tipo or tipo[0] != 'p':
+        raise RuntimeError("despesas_consolidadas não é uma tabela particionada. Reaplique backend/database/schema.sql, "
+                           "que migra a tabela antiga para partições trimestrais, antes da carga.")
+    cur.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = 'despesas_consolidadas'::regclass;")
+    particoes = {}
+    for (nome,) in cur.fetchall():
+        encontrado = PADRAO_PARTICAO.fullmatch(nome)
+        if encontrado:
+            particoes[(int(encontrado[1]), int(encontrado[2]))] = nome
+    return particoes
+
+def preparar_particoes(cur, df_fin, metodo=LOADER_METODO):
+    """
+    Monta uma tabela avulsa por trimestre presente em `df_fin`, a ser anexada depois por `publicar_particoes`.
+
+    - **Carga**: COPY em tabela vazia e sem índices; os índices da tabela principal são criados no ATTACH, de uma vez.
+    - **Validação**: um CHECK equivalente ao limite da partição permite ao ATTACH dispensar a varredura da tabela.
+    """
+    preparadas = []
+    for (ano, trimestre), grupo in df_fin.groupby(['Ano', 'Trimestre']):
+        ano, trimestre = int(ano), int(trimestre)
+        nova = f"{nome_particao(ano, trimestre)}_nova"
+        cur.execute(f"DROP TABLE IF EXISTS {nova};")
+        cur.execute(f"CREATE TABLE {nova} (LIKE despesas_consolidadas INCLUDING DEFAULTS);")
+        inserir(cur, grupo, nova, COLUNAS_DESPESAS, metodo)
+        cur.execute(f"ALTER TABLE {nova} ADD CONSTRAINT {nova}_periodo CHECK (ano = {ano} AND trimestre = {trimestre});")
+        preparadas.append((ano, trimestre))
+    return preparadas
+
+def publicar_particoes(cur, preparadas, particoes, remover=()):
+    """
+    Substitui ou cria (ATTACH) uma partição por trimestre, e desanexa os trimestres em `remover`.
+
+    - **Transação**: DETACH, ATTACH, DROP e RENAME rodam na transação da carga, imediatamente antes do commit:
+      os locks exclusivos duram pouco, os leitores veem o trimestre antigo inteiro ou o novo inteiro, e uma falha
+      em qualquer partição desfaz todas (o rollback devolve as partições anteriores).
+    - **Ordem**: a partição antiga só é apagada depois que a nova foi anexada.
+    """
+    if cur.connection.autocommit:
+        raise RuntimeError("publicar_particoes exige uma transação (conexão sem autocommit).")
+
+    for ano, trimestre in remover:
+        cur.execute(f"ALTER TABLE despesas_consolidadas DETACH PARTITION {particoes[(ano, trimestre)]};")
+        cur.execute(f"DROP TABLE {particoes[(ano, trimestre)]};")
+
+    for ano, trimestre in preparadas:
+        nome = nome_particao(ano, trimestre)
+        nova, antiga = f"{nome}_nova", f"{nome}_antiga"
+        if (ano, trimestre) in particoes:
+            cur.execute(f"ALTER TABLE despesas_consolidadas DETACH PARTITION {particoes[(ano, trimestre)]};")
+            cur.execute(f"ALTER TABLE {particoes[(ano, trimestre)]} RENAME TO {antiga};")
+        # O CHECK {nova}_periodo prova o limite da partição: o ATTACH não precisa varrer a tabela
+        cur.execute(f"ALTER TABLE despesas_consolidadas ATTACH PARTITION {nova} "
+                    f"FOR VALUES FROM ({ano}, {trimestre}) TO ({ano}, {trimestre + 1});")
+        cur.execute(f"DROP TABLE IF EXISTS {antiga};")
+        cur.execute(f"ALTER TABLE {nova} DROP CONSTRAINT {nova}_periodo;")
+        cur.execute(f"ALTER TABLE {nova} RENAME TO {nome};")
+        logger.info(f"Partição publicada: {nome}")
+
+def carregar_delta(cur, df_fin, particoes, metodo=LOADER_METODO):
+    """
+    Carga incremental de `despesas_consolidadas`, proporcional ao tamanho do delta.
+
+    - **Detecção**: compara a impressão digital de cada fatia (registro_ans, ano, trimestre) com a registrada em `despesas_fatias`.
+    - **Substituição**: apenas as linhas das fatias novas ou alteradas vão para a staging; as fatias correspondentes
+      são apagadas e reinseridas. Fatias que sumiram de um trimestre presente na entrada são removidas.
+    - **Trimestres novos**: sem partição ainda, são montados à parte e anexados; a função devolve esses trimestres.
+    - **Consistência**: tudo ocorre na transação da carga; leitores continuam vendo a versão anterior até o commit.
+    """
+    fatias = calcular_fatias(df_fin)
+
+    # Apenas as fatias registradas nos trimestres presentes na entrada participam da comparação
+    periodos = fatias[['ano', 'trimestre']].drop_duplicates()
+    cur.execute(
+        "SELECT registro_ans, ano, trimestre, hash, linhas FROM despesas_fatias "
+        "WHERE (ano, trimestre) IN (SELECT * FROM unnest(%s::int[], %s::int[]));",
+        (periodos['ano'].tolist(), periodos['trimestre'].tolist())
+    )
+    existentes = pd.DataFrame(cur.fetchall(), columns=list(COLUNAS_FATIAS))
+    existentes = existentes.astype({'registro_ans': str, 'ano': 'int64', 'trimestre': 'int64'})
+
+    comparacao = fatias.merge(existentes, on=CHAVE_FATIA, how='outer', suffixes=('', '_atual'), indicator=True)
+    alteradas = comparacao[(comparacao['_merge'] == 'left_only') | (
+        (comparacao['_merge'] == 'both') &
+        ((comparacao['hash'] != comparacao['hash_atual']) | (comparacao['linhas'] != comparacao['linhas_atual']))
+    )]
+    removidas = comparacao[comparacao['_merge'] == 'right_only']
+
+    chaves = pd.MultiIndex.from_arrays([
+        df_fin['RegistroANS'].astype(str).to_numpy(),
+        df_fin['Ano'].astype('int64').to_numpy(),
+        df_fin['Trimestre'].astype('int64').to_numpy(),
+    ])
+    delta = df_fin[chaves.isin(pd.MultiIndex.from_frame(alteradas[CHAVE_FATIA]))]
+    logger.info(f"Delta: {len(alteradas)} fatias novas/alteradas ({len(delta)} linhas), {len(removidas)} removidas, "
+                f"{len(fatias) - len(alteradas)} inalteradas.")
+    if alteradas.empty and removidas.empty:
+        return []
+
+    # Linhas de trimestres ainda sem partição seguem pelo caminho de partição nova (carga em massa + ATTACH)
+    periodos_delta = list(zip(delta['Ano'].astype('int64'), delta['Trimestre'].astype('int64')))
+    publicado = np.array([p in particoes for p in periodos_delta], dtype=bool)
+    novas = preparar_particoes(cur, delta[~publicado], metodo)
+    delta = delta[publicado]
+
+    # Fatias a substituir (com hash) e a remover (hash nulo), usadas como chave das operações em massa
+    controle = pd.concat([alteradas[list(COLUNAS_FATIAS)], removidas[CHAVE_FATIA]], ignore_index=True)
+    controle = controle.astype({'linhas': 'Int64'})
+    criar_staging(cur, 'stg_fatias', 'despesas_fatias', COLUNAS_FATIAS)
+    inserir(cur, controle, 'stg_fatias', COLUNAS_FATIAS, metodo)
+    criar_staging(cur, 'stg_despesas', 'despesas_consolidadas', COLUNAS_DESPESAS)
+    inserir(cur, delta, 'stg_despesas', COLUNAS_DESPESAS, metodo)
+
+    colunas = ', '.join(COLUNAS_DESPESAS)
+    cur.execute("""
+        DELETE FROM despesas_consolidadas d USING stg_fatias s
+        WHERE d.registro_ans = s.registro_ans AND d.ano = s.ano AND d.trimestre = s.trimestre;
+    """)
+    cur.execute(f"INSERT INTO despesas_consolidadas ({colunas}) SELECT {colunas} FROM stg_despesas;")
+
+    cur.execute("""
+        DELETE FROM despesas_fatias f USING stg_fatias s
+        WHERE s.hash IS NULL AND f.registro_ans = s.registro_ans AND f.ano = s.ano AND f.trimestre = s.trimestre;
+    """)
+    cur.execute("""
+        INSERT INTO despesas_fatias (registro_ans, ano, trimestre, hash, linhas)
+        SELECT registro_ans, ano, trimestre, hash, linhas FROM stg_fatias WHERE hash IS NOT NULL
+        ON CONFLICT (registro_ans, ano, trimestre)
+        DO UPDATE SET hash = EXCLUDED.hash, linhas = EXCLUDED.linhas, data_carga = CURRENT_TIMESTAMP;
+    """)
+    return novas
+
+def preparar_sombra(cur, tabela, df, colunas, metodo=LOADER_METODO):
+    # Tabela-sombra com a mesma estrutura (colunas, defaults, constraints e índices) da tabela publicada.
+    # A tabela atual continua disponível para leitura durante toda a carga.
+    sombra = f"{tabela}_nova"
+    cur.execute(f"DROP TABLE IF EXISTS {sombra};")
+    cur.execute(f"CREATE TABLE {sombra} (LIKE {tabela} INCLUDING ALL);")
+    inserir(cur, df, sombra, colunas, metodo)
+    cur.execute(f"ANALYZE {sombra};")
+
+def indices_por_definicao(cur, tabela):
+    # Mapeia a definição de cada índice (sem nome e tabela) para o seu nome, para casar os índices da sombra com os originais
+    cur.execute("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = %s;", (tabela,))
+    return {re.sub(r'^(CREATE (?:UNIQUE )?INDEX) \S+ ON \S+', r'\1', definicao): nome for nome, definicao in cur.fetchall()}
+
+def trocar_tabela(cur, tabela):
+    # Troca atômica: os RENAMEs só ficam visíveis no commit, então leitores veem a tabela antiga inteira
+    # ou a nova inteira. O lock exclusivo é mantido apenas entre a troca e o commit.
+    sombra, antiga = f"{tabela}_nova", f"{tabela}_antiga"
+    nomes_originais = indices_por_definicao(cur, tabela)
+    nomes_sombra = indices_por_definicao(cur, sombra)
+    cur.execute("SELECT pg_get_serial_sequence(%s, 'id');", (tabela,))
+    sequencia = cur.fetchone()[0]
+
+    cur.execute(f"DROP TABLE IF EXISTS {antiga};")
+    cur.execute(f"ALTER TABLE {tabela} RENAME TO {antiga};")
+    cur.execute(f"ALTER TABLE {sombra} RENAME TO {tabela};")
+    # A sequência do SERIAL pertence à tabela antiga; sem transferir a posse, o DROP a levaria junto
+    if sequencia:
+        cur.execute(f"ALTER SEQUENCE {sequencia} OWNED BY {tabela}.id;")
+    cur.execute(f"DROP TABLE {antiga};")
+
+    # Restaura os nomes originais dos índices (e das constraints associadas) na nova tabela
+    for definicao, nome in nomes_sombra.items():
+        if definicao in nomes_originais:
+            cur.execute(f"ALTER INDEX {nome} RENAME TO {nomes_originais[definicao]};")
+
+def registrar_versao(cur):
+    # Versão dos dados servidos pela API: o cache de respostas (backend/app/cache_respostas.py) descarta
+    # tudo o que foi calculado em versões anteriores assim que enxerga o novo valor
+    cur.execute("UPDATE versao_carga SET versao = versao + 1, data_carga = CURRENT_TIMESTAMP WHERE id = 1;")
+
+def atualizar_resumos(conn):
+    # Em transação separada, depois do commit da carga: o refresh varre a tabela de despesas e não deve
+    # prolongar os locks das trocas. CONCURRENTLY mantém a versão anterior legível durante o recálculo.
+    with conn.cursor() as cur:
+        for resumo in RESUMOS:
+            cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {resumo};")
+        # Nova versão também aqui: respostas de estatísticas guardadas entre a carga e o refresh ficam obsoletas
+        registrar_versao(cur)
+    conn.commit()
+
+def load_data(df_cad=None, df_agg=None, metodo=LOADER_METODO, modo=LOADER_MODO):
+    # Os DataFrames podem vir em memória do executor do pipeline; sem eles, lê os arquivos processados
     conn = None
     try:
         conn = psycopg2.connect(**DB_CONFIG)
@@ -29,67 +319,65 @@ def load_data():
 
         # Extrai dimensões únicas de operadoras para garantir a normalização no banco        
         file_enriquecido = "data/processed/consolidado_enriquecido.csv"
-        if os.path.exists(file_enriquecido):
-            logger.info("Carregando Operadoras Ativas...")
-            df_cad = pd.read_csv(file_enriquecido)
+        if df_cad is None and existe_intermediario(file_enriquecido):
+            df_cad = ler_intermediario(file_enriquecido)
+
+        if df_cad is not None:
+            logger.info(f"Carregando Operadoras Ativas (método: {metodo})...")
             
             # Remove duplicatas baseadas no Registro ANS para integridade da Chave Primária
             operadoras = df_cad[['RegistroANS', 'CNPJ', 'RazaoSocial', 'Modalidade', 'UF']].drop_duplicates(subset=['RegistroANS'])
-            
-            # Conversão para tuplas para compatibilidade com o adaptador psycopg2
-            data_ops = [tuple(x) for x in operadoras.values]
-            
-            # Estratégia de UPSERT (ON CONFLICT): Garante que o script seja idempotente,
-            # atualizando dados existentes em vez de falhar por duplicidade.
-            sql_ops = """
-                INSERT INTO operadoras_ativas (registro_ans, cnpj, razao_social, modalidade, uf)
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT (registro_ans) DO UPDATE SET razao_social = EXCLUDED.razao_social;
-            """
-            extras.execute_batch(cur, sql_ops, data_ops)
+            carregar_operadoras(cur, operadoras, metodo)
 
-        logger.info("Carregando Despesas Consolidadas...")
+        logger.info(f"Carregando Despesas Consolidadas (método: {metodo}, modo: {modo})...")
 
         # Tratamento de Strings em campos numéricos via Pandas: Força conversão numérica
         # transformando strings inválidas em 0 para evitar erros de cast no PostgreSQL
-        df_cad['ValorDespesas'] = pd.to_numeric(df_cad['ValorDespesas'], errors='coerce').fillna(0)
-        
-        data_fin = [tuple(x) for x in df_cad[['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'ValorDespesas', 'RegistroANS', 'Modalidade', 'UF']].values]
-        
-        sql_fin = """
-            INSERT INTO despesas_consolidadas (cnpj, razao_social, trimestre, ano, valor_despesa, registro_ans, modalidade, uf)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s);
-        """
-
-        # TRUNCATE é utilizado para cargas 'Full', limpando a tabela 
-        # e resetando sequências de ID antes da nova inserção em lote.
-        cur.execute("TRUNCATE TABLE despesas_consolidadas RESTART IDENTITY;")
-
-        # Uso de execute_batch para reduzir o overhead de rede através de múltiplos INSERTs agrupados
-        extras.execute_batch(cur, sql_fin, data_fin)
+        df_fin = df_cad.assign(ValorDespesas=pd.to_numeric(df_cad['ValorDespesas'], errors='coerce').fillna(0))
+
+        # Tabelas e partições carregadas em sombra; as trocas acontecem juntas, imediatamente antes do commit
+        trocas = []
+        particoes = listar_particoes(cur)
+        remover = []
+        if modo == 'completa':
+            # Carga 'Full' sem TRUNCATE: cada trimestre da entrada é montado em uma partição nova,
+            # e trimestres que não estão na entrada são desanexados. A API lê os dados atuais até a troca.
+            preparadas = preparar_particoes(cur, df_fin, metodo)
+            remover = [p for p in particoes if p not in preparadas]
+            # Tabela de controle (não consultada pela API): reconstruída para refletir a nova carga
+            cur.execute("TRUNCATE TABLE despesas_fatias;")
+            inserir(cur, calcular_fatias(df_fin), 'despesas_fatias', COLUNAS_FATIAS, metodo)
+        else:
+            preparadas = carregar_delta(cur, df_fin, particoes, metodo)
 
         # Persistência dos resultados estatísticos agregados por Operadora/UF
         file_agg = "data/processed/despesas_agregadas.csv"
-        if os.path.exists(file_agg):
+        if df_agg is None and existe_intermediario(file_agg):
+            df_agg = ler_intermediario(file_agg)
+
+        if df_agg is not None:
             logger.info("Carregando Dados Agregados...")
-            df_agg = pd.read_csv(file_agg)
-            
-            data_agg = [tuple(x) for x in df_agg.values]
-            sql_agg = """
-                INSERT INTO despesas_agregadas (razao_social, uf, total_despesas, media_trimestral, desvio_padrao)
-                VALUES (%s, %s, %s, %s, %s);
-            """
-            
-            # Substituição total dos dados (Full Refresh) da tabela de análise
-            cur.execute("TRUNCATE TABLE despesas_agregadas RESTART IDENTITY;")
-            extras.execute_batch(cur, sql_agg, data_agg)
+
+            # Substituição total dos dados (Full Refresh) da tabela de análise, via tabela-sombra
+            preparar_sombra(cur, 'despesas_agregadas', df_agg, COLUNAS_AGREGADAS, metodo)
+            trocas.append('despesas_agregadas')
+
+        publicar_particoes(cur, preparadas, particoes, remover)
+        for tabela in trocas:
+            trocar_tabela(cur, tabela)
+        registrar_versao(cur)
 
         conn.commit()
         logger.info("Carga concluída com sucesso!")
 
+        logger.info("Atualizando resumos materializados...")
+        atualizar_resumos(conn)
+
     except Exception as e:
         if conn: conn.rollback()
         logger.error(f"Erro crítico na carga: {e}")
+        # Propaga a falha: o executor do pipeline não pode registrar a carga como concluída no cache
+        raise
     finally:
         if conn:
             cur.close()
@@ -0,0 +1,123 @@
+import os
+import json
+import hashlib
+import threading
+import logging
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "data/raw/manifesto_downloads.json"
+
+_lock = threading.Lock()
+
+def carregar_manifesto(caminho=MANIFEST_FILE):
+    if not os.path.exists(caminho):
+        return {}
+    try:
+        with open(caminho, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        # Manifesto corrompido não deve interromper o pipeline: o custo é apenas um download completo
+        logger.warning(f"Manifesto ilegível ({e}). Todos os arquivos serão baixados novamente.")
+        return {}
+
+def salvar_manifesto(manifesto, caminho=MANIFEST_FILE, urls=None):
+    """
+    Grava no arquivo as entradas `urls` de `manifesto` (todas, se `urls` for None).
+
+    Etapas concorrentes (crawler e cadastro) compartilham o arquivo, cada uma com o seu dicionário carregado
+    no início: a leitura, a mescla e a gravação acontecem sob o lock, e só as entradas informadas são
+    sobrescritas, para que uma etapa não apague nem reverta as entradas gravadas pela outra.
+    """
+    with _lock:
+        atual = carregar_manifesto(caminho)
+        for url in (manifesto if urls is None else urls):
+            atual[url] = manifesto[url]
+        # Escrita atômica (arquivo temporário + rename) para não perder o manifesto em caso de queda no meio da gravação
+        os.makedirs(os.path.dirname(caminho) or '.', exist_ok=True)
+        tmp = caminho + ".tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(atual, f, indent=2, sort_keys=True)
+        os.replace(tmp, caminho)
+
+def calcular_hash(path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloco in iter(lambda: f.read(chunk_size), b''):
+            sha.update(bloco)
+    return sha.hexdigest()
+
+def baixar_condicional(session, url, path, manifesto, tem_copia_local=True, caminho_manifesto=MANIFEST_FILE, timeout=60):
+    """
+    Baixa `url` para `path` apenas se o conteúdo mudou desde o último download registrado.
+
+    - **Condicional**: envia `If-None-Match`/`If-Modified-Since` com os validadores salvos; um 304 encerra sem transferência.
+    - **Retomada**: se existir um `<path>.part` de uma execução interrompida, pede apenas os bytes restantes via `Range`.
+    - **Retorno**: `True` se um conteúdo novo foi gravado em `path`, `False` se nada mudou ou o download falhou.
+    """
+    # Cópia local: o dicionário do manifesto é compartilhado entre as threads do crawler
+    entrada = dict(manifesto.get(url, {}))
+    parcial = path + ".part"
+    headers = {}
+
+    # Só faz sentido pedir 304 se o resultado do último download ainda existe localmente
+    if tem_copia_local and entrada.get('sha256'):
+        if entrada.get('etag'):
+            headers['If-None-Match'] = entrada['etag']
+        if entrada.get('last_modified'):
+            headers['If-Modified-Since'] = entrada['last_modified']
+
+    # Retomada: If-Range garante que os bytes já baixados pertencem à mesma versão do arquivo
+    pendente = entrada.get('pendente', {})
+    offset = os.path.getsize(parcial) if os.path.exists(parcial) else 0
+    validador = pendente.get('etag') or pendente.get('last_modified')
+    if offset and validador:
+        headers['Range'] = f"bytes={offset}-"
+        headers['If-Range'] = validador
+    else:
+        offset = 0
+
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304:
+            logger.info(f"Sem alterações desde o último download: {os.path.basename(path)}")
+            return False
+        if r.status_code not in (200, 206):
+            logger.error(f"Falha no download. Status: {r.status_code}")
+            return False
+
+        # Servidor ignorou o Range (ou a versão mudou): recomeça do zero
+        modo = 'ab' if r.status_code == 206 else 'wb'
+        if r.status_code == 206:
+            logger.info(f"Retomando download de {os.path.basename(path)} a partir do byte {offset}")
+
+        # Registra os validadores antes de transferir para permitir a retomada se o download quebrar
+        if r.status_code == 200:
+            entrada['pendente'] = {
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified'),
+            }
+            manifesto[url] = entrada
+            salvar_manifesto(manifesto, caminho_manifesto, urls=[url])
+
+        with open(parcial, modo) as f:
+            for chunk in r.iter_content(chunk_size=8192):
+                f.write(chunk)
+
+    sha256 = calcular_hash(parcial)
+    inalterado = tem_copia_local and sha256 == entrada.get('sha256')
+    os.replace(parcial, path)
+
+    manifesto[url] = {
+        'size': os.path.getsize(path),
+        'etag': entrada.get('pendente', {}).get('etag'),
+        'last_modified': entrada.get('pendente', {}).get('last_modified'),
+        'sha256': sha256,
+    }
+    salvar_manifesto(manifesto, caminho_manifesto, urls=[url])
+
+    # Servidores sem suporte a requisições condicionais: o hash evita reprocessar conteúdo idêntico
+    if inalterado:
+        logger.info(f"Conteúdo idêntico ao último download: {os.path.basename(path)}")
+        return False
+    return True
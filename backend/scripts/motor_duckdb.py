@@ -0,0 +1,158 @@
+import os
+import shutil
+import logging
+import tempfile
+
+import duckdb
+
+from processor import extrair_data_do_caminho, abrir_fonte
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Motor de execução alternativo (PIPELINE_MOTOR=duckdb): as mesmas regras de processor, enricher e aggregator
+# expressas em SQL sobre um DuckDB embutido. O DuckDB usa todos os núcleos e, acima de DUCKDB_MEMORIA,
+# despeja os dados intermediários em DUCKDB_TEMP em vez de estourar a RAM (backfills de vários anos).
+
+DUCKDB_MEMORIA = os.getenv("DUCKDB_MEMORIA", "2GB")
+DUCKDB_THREADS = int(os.getenv("DUCKDB_THREADS", str(os.cpu_count() or 1)))
+DUCKDB_TEMP = os.getenv("DUCKDB_TEMP", "data/duckdb_tmp")
+
+# Mesmas regras de processor.limpar_valor: remove aspas e espaços, '1.234,56' -> '1234.56', vazio ou inválido -> 0
+MACROS = [
+    r"""CREATE OR REPLACE TEMP MACRO texto_valor(v) AS
+        trim(replace(coalesce(v, 'nan'), '"', ''), ' ' || chr(9) || chr(10) || chr(13))""",
+    r"""CREATE OR REPLACE TEMP MACRO limpar_valor(v) AS CASE
+        WHEN texto_valor(v) IN ('', 'nan') THEN 0.0
+        WHEN contains(texto_valor(v), '.') AND contains(texto_valor(v), ',')
+            THEN coalesce(TRY_CAST(replace(replace(texto_valor(v), '.', ''), ',', '.') AS DOUBLE), 0.0)
+        ELSE coalesce(TRY_CAST(replace(texto_valor(v), ',', '.') AS DOUBLE), 0.0)
+    END""",
+]
+
+def conectar():
+    # Banco em memória, descartado ao fim de cada etapa; o limite de memória faz o excedente ir para disco
+    os.makedirs(DUCKDB_TEMP, exist_ok=True)
+    con = duckdb.connect()
+    con.execute(f"SET memory_limit = '{DUCKDB_MEMORIA}'")
+    con.execute(f"SET threads = {DUCKDB_THREADS}")
+    con.execute(f"SET temp_directory = '{DUCKDB_TEMP}'")
+    for macro in MACROS:
+        con.execute(macro)
+    return con
+
+def caminho_legivel(origem, pasta):
+    # O DuckDB lê arquivos, não streams: membros de ZIP são descompactados em streaming para um arquivo temporário
+    if not isinstance(origem, tuple):
+        return origem
+    destino = os.path.join(pasta, os.path.basename(origem[1]))
+    with abrir_fonte(origem) as stream, open(destino, 'wb') as f:
+        shutil.copyfileobj(stream, f, 1024 * 1024)
+    return destino
+
+def leitura_csv(caminho):
+    # Tudo como texto: a conversão de VL_SALDO_FINAL segue limpar_valor; linhas malformadas são ignoradas
+    caminho = caminho.replace("'", "''")
+    return (f"read_csv('{caminho}', delim=';', header=true, all_varchar=true, encoding='latin-1', "
+            f"ignore_errors=true)")
+
+def consulta_fonte(con, caminho, ano, trimestre):
+    # Cabeçalhos normalizados como em processor.filtrar_chunk (maiúsculas, sem aspas e espaços)
+    colunas = {c.upper().strip().replace('"', ''): c for c in con.sql(f"SELECT * FROM {leitura_csv(caminho)}").columns}
+    if 'DESCRICAO' not in colunas:
+        return None
+
+    col = {nome: '"' + original.replace('"', '""') + '"' for nome, original in colunas.items()}
+    # REG_ANS numérico é lido pelo pandas como inteiro (zeros à esquerda descartados); texto fica como está
+    reg_ans = f"coalesce(CAST(TRY_CAST({col['REG_ANS']} AS BIGINT) AS VARCHAR), {col['REG_ANS']})"
+    razao = col.get('RAZAO_SOCIAL', f"'OPERADORA ' || {reg_ans}")
+    return f"""
+        SELECT {reg_ans} AS CNPJ, {razao} AS RazaoSocial, '{trimestre}' AS Trimestre, '{ano}' AS Ano,
+               limpar_valor({col['VL_SALDO_FINAL']}) AS ValorDespesas
+        FROM {leitura_csv(caminho)}
+        WHERE {col['DESCRICAO']} ILIKE '%EVENTOS%' AND {col['DESCRICAO']} ILIKE '%SINISTROS%'
+    """
+
+def consolidar_despesas(fontes):
+    """
+    Equivalente a `processor.consolidar_despesas`: filtro EVENTOS + SINISTROS, normalização de valores
+    e soma por (CNPJ, RazaoSocial, Trimestre, Ano), com cada fonte lida e agregada pelo DuckDB.
+    """
+    con = conectar()
+    try:
+        con.execute("CREATE TABLE parciais (CNPJ VARCHAR, RazaoSocial VARCHAR, Trimestre VARCHAR, Ano VARCHAR, "
+                    "ValorDespesas DOUBLE)")
+        with tempfile.TemporaryDirectory(dir=DUCKDB_TEMP) as pasta:
+            for nome, origem in fontes:
+                logger.info(f"Iniciando leitura (DuckDB): {nome}")
+                ano, trimestre = extrair_data_do_caminho(nome)
+                try:
+                    caminho = caminho_legivel(origem, pasta)
+                    consulta = consulta_fonte(con, caminho, ano, trimestre)
+                    if consulta is not None:
+                        # Registros sem impacto financeiro são descartados (NaN também: no DuckDB NaN > 0)
+                        con.execute(f"""
+                            INSERT INTO parciais
+                            SELECT CNPJ, RazaoSocial, Trimestre, Ano, fsum(ValorDespesas)
+                            FROM ({consulta})
+                            WHERE ValorDespesas > 0 AND NOT isnan(ValorDespesas)
+                            GROUP BY ALL
+                        """)
+                    if caminho != origem:
+                        os.remove(caminho)
+                except Exception as e:
+                    logger.error(f"Erro ao processar o arquivo {nome}: {e}")
+
+        # Ordem do groupby do pandas: REG_ANS numérico ordena como número
+        final_df = con.sql("""
+            SELECT CNPJ, RazaoSocial, Trimestre, Ano, fsum(ValorDespesas) AS ValorDespesas
+            FROM parciais
+            GROUP BY CNPJ, RazaoSocial, Trimestre, Ano
+            ORDER BY TRY_CAST(CNPJ AS BIGINT), CNPJ, RazaoSocial, Trimestre, Ano
+        """).df()
+    finally:
+        con.close()
+    return final_df if len(final_df) else None
+
+def enriquecer(df_fin, df_cad):
+    # Equivalente a enricher.enriquecer: left join com o cadastro indexado por RegistroANS, na ordem original
+    con = conectar()
+    try:
+        entrada = df_fin.assign(_ordem=range(len(df_fin)))
+        cadastro = df_cad.reset_index()
+        con.register('entrada', entrada)
+        con.register('cadastro', cadastro)
+        df_saida = con.sql("""
+            SELECT coalesce(c.CNPJ_CADASTRO, trim(CAST(e.CNPJ AS VARCHAR))) AS CNPJ,
+                   e.RazaoSocial, e.Trimestre, e.Ano, e.ValorDespesas,
+                   trim(CAST(e.CNPJ AS VARCHAR)) AS RegistroANS,
+                   coalesce(CAST(c.Modalidade AS VARCHAR), 'NÃO ENCONTRADO') AS Modalidade,
+                   coalesce(CAST(c.UF AS VARCHAR), 'NI') AS UF
+            FROM entrada e
+            LEFT JOIN cadastro c ON c.RegistroANS = trim(CAST(e.CNPJ AS VARCHAR))
+            ORDER BY e._ordem
+        """).df()
+    finally:
+        con.close()
+    return df_saida
+
+def estatisticas_parciais(df, chaves):
+    # Equivalente a aggregator.estatisticas_parciais (N, Soma, M2 por grupo); grupos com chave nula são
+    # descartados, como no groupby do pandas
+    con = conectar()
+    try:
+        con.register('entrada', df)
+        grupos = ', '.join(f'"{c}"' for c in chaves)
+        sem_nulos = ' AND '.join(f'"{c}" IS NOT NULL' for c in chaves)
+        est = con.sql(f"""
+            SELECT {grupos}, count(ValorDespesas) AS N, coalesce(fsum(ValorDespesas), 0.0) AS Soma,
+                   coalesce(var_pop(ValorDespesas) * count(ValorDespesas), 0.0) AS M2
+            FROM entrada
+            WHERE {sem_nulos}
+            GROUP BY ALL
+            ORDER BY {grupos}
+        """).df()
+    finally:
+        con.close()
+    # Chaves categóricas voltam do DuckDB como ENUM (categoria ordenada): restaura os tipos da entrada
+    return est.astype({c: df[c].dtype for c in chaves})
@@ -1,9 +1,16 @@
 import pandas as pd
+import io
 import os
+import sys
 import glob
 import re
 import zipfile
+import hashlib
 import logging
+import multiprocessing
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from storage import salvar_intermediario, existe_intermediario, adicionar_ao_zip, MOTOR_EXECUCAO
 
 logging.basicConfig(
     level=logging.INFO,
@@ -19,6 +26,20 @@ RAW_DIR = "data/raw"
 OUTPUT_DIR = "data/processed"
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "consolidado_despesas.csv")
 
+CHAVES_AGREGACAO = ['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano']
+
+# Engine C: parser nativo, muito mais rápido que engine='python' para o mesmo separador simples.
+# VL_SALDO_FINAL é lido como texto para que a conversão numérica siga exatamente limpar_valor
+OPCOES_LEITURA = dict(sep=';', engine='c', encoding='latin-1', on_bad_lines='skip', dtype={'VL_SALDO_FINAL': str})
+
+# Modo map-reduce: PROCESSOR_WORKERS > 1 distribui blocos de BLOCO_BYTES entre processos
+PROCESSOR_WORKERS = int(os.getenv("PROCESSOR_WORKERS", "1"))
+BLOCO_BYTES = int(os.getenv("PROCESSOR_BLOCO_MB", "32")) * 1024 * 1024
+# Início dos workers: 'spawn' (padrão) não herda threads nem locks do pipeline, que roda etapas em threads;
+# com 'fork' um lock herdado em uso (ex: do logging) pode travar o worker. 'forkserver' também é seguro,
+# mas os workers deixam de ser filhos diretos e o pico de memória deles não aparece em pico_memoria_mb
+PROCESSOR_CONTEXTO = os.getenv("PROCESSOR_CONTEXTO", "spawn")
+
 def extrair_data_do_caminho(path):
     nome_arq = os.path.basename(path)
 
@@ -39,100 +60,287 @@ def extrair_data_do_caminho(path):
         
     return ano, trimestre
 
-def process_files():
+# Normalizador financeiro: Trata inconsistências de separadores decimais 
+# (padrão PT-BR vs EN-US). Versão escalar, usada como referência e como fallback de converter_valores
+def limpar_valor(v):
+    v = str(v).replace('"', '').strip()
+    if not v or v == 'nan': return 0.0
+
+    # Lógica para tratar formatos como '1.234,56' transformando em '1234.56'
+    if '.' in v and ',' in v:
+        v = v.replace('.', '')
+    v = v.replace(',', '.')
+    try:
+        return float(v)
+    except:
+        return 0.0
+
+def converter_valores(serie):
+    # Versão vetorizada de limpar_valor: as mesmas regras aplicadas à coluna inteira via operações de string do pandas
+    if not pd.api.types.is_string_dtype(serie):
+        serie = serie.astype(object).where(serie.notna(), 'nan').astype(str)
+    texto = serie.fillna('nan').str.replace('"', '', regex=False).str.strip()
+
+    # '1.234,56' -> '1234,56' apenas quando os dois separadores aparecem; depois ',' vira '.'
+    ambos = texto.str.contains('.', regex=False) & texto.str.contains(',', regex=False)
+    texto = texto.where(~ambos, texto.str.replace('.', '', regex=False))
+    texto = texto.str.replace(',', '.', regex=False)
+
+    vazio = (texto == '') | (texto == 'nan')
+    valores = texto.where(~vazio, '0').to_numpy(dtype=object)
+
+    try:
+        # Caminho rápido: conversão objeto -> float64 usa o mesmo float() do Python, elemento a elemento em C
+        return pd.Series(valores.astype('float64'), index=serie.index)
+    except ValueError:
+        # Há valores não numéricos no lote: to_numeric identifica os válidos e apenas os
+        # rejeitados passam pelo limpar_valor escalar (que também decide casos como '1_000' ou 'inf')
+        numericos = pd.to_numeric(pd.Series(valores, index=serie.index), errors='coerce').notna()
+        resultado = pd.Series(0.0, index=serie.index)
+        resultado[numericos] = valores[numericos.to_numpy()].astype('float64')
+        resultado[~numericos] = [limpar_valor(v) for v in valores[~numericos.to_numpy()]]
+        return resultado
+
+def listar_fontes(raw_dir=RAW_DIR):
+    # Cada fonte é um par (nome, origem): origem é o caminho de um CSV/TXT extraído
+    # ou a tupla (zip, membro) para leitura direta de dentro do arquivo compactado
+    fontes = []
+    zips = glob.glob(f"{raw_dir}/**/*.zip", recursive=True) + glob.glob(f"{raw_dir}/**/*.ZIP", recursive=True)
+    pastas_com_zip = set()
+
+    for zip_path in zips:
+        pastas_com_zip.add(os.path.splitext(zip_path)[0])
+        try:
+            with zipfile.ZipFile(zip_path, 'r') as zf:
+                membros = [m for m in zf.namelist() if m.lower().endswith(('.csv', '.txt'))]
+        except zipfile.BadZipFile as e:
+            logger.error(f"ZIP inválido ignorado {zip_path}: {e}")
+            continue
+        fontes.extend((os.path.basename(m), (zip_path, m)) for m in membros)
+
+    files = glob.glob(f"{raw_dir}/**/*.csv", recursive=True) + glob.glob(f"{raw_dir}/**/*.txt", recursive=True)
+    for file_path in files:
+        # O ZIP tem precedência sobre uma extração antiga da mesma pasta, evitando contar o trimestre duas vezes
+        if any(file_path.startswith(pasta + os.sep) for pasta in pastas_com_zip):
+            continue
+        fontes.append((os.path.basename(file_path), file_path))
+
+    return fontes
+
+def impressoes_fontes(fontes=None):
+    # Impressão digital de cada trimestre a partir dos metadados das fontes, sem ler as linhas:
+    # membros de ZIP pelo CRC-32 e tamanho do diretório central; arquivos soltos por tamanho e mtime
+    fontes = listar_fontes() if fontes is None else fontes
+    por_trimestre = {}
+    for nome, origem in sorted(fontes, key=lambda f: (f[0], str(f[1]))):
+        if isinstance(origem, tuple):
+            zip_path, membro = origem
+            with zipfile.ZipFile(zip_path, 'r') as zf:
+                info = zf.getinfo(membro)
+            assinatura = f"{membro}:{info.file_size}:{info.CRC:08x}"
+        else:
+            stat = os.stat(origem)
+            assinatura = f"{nome}:{stat.st_size}:{stat.st_mtime_ns}"
+        ano, trimestre = extrair_data_do_caminho(nome)
+        por_trimestre.setdefault(f"{int(ano)}-{int(trimestre)}", hashlib.sha256()).update(assinatura.encode('utf-8'))
+    return {chave: sha.hexdigest() for chave, sha in por_trimestre.items()}
+
+@contextmanager
+def abrir_fonte(origem):
+    # Membros de ZIP são lidos como stream descompactado sob demanda:
+    # nenhum byte do trimestre é gravado em disco antes do parsing
+    if isinstance(origem, tuple):
+        zip_path, membro = origem
+        with zipfile.ZipFile(zip_path, 'r') as zf, zf.open(membro) as stream:
+            yield stream
+    else:
+        yield origem
+
+def filtrar_chunk(chunk, ano, trimestre):
+    # Normalização de cabeçalhos: remove caracteres especiais e padroniza para UPPERCASE
+    chunk.columns = [c.upper().strip().replace('"', '') for c in chunk.columns]
+
+    # Filtragem: Isola apenas despesas relacionadas a Sinistros/Eventos Conhecidos
+    if 'DESCRICAO' not in chunk.columns:
+        return None
+
+    chunk['DESCRICAO'] = chunk['DESCRICAO'].astype(str).str.strip()
+
+    mask = (chunk['DESCRICAO'].str.contains("EVENTOS", na=False, case=False)) & \
+           (chunk['DESCRICAO'].str.contains("SINISTROS", na=False, case=False))
+
+    filtered = chunk[mask].copy()
+
+    if filtered.empty:
+        return None
+
+    res = pd.DataFrame()
+    res['CNPJ'] = filtered['REG_ANS']
+    res['RazaoSocial'] = filtered.get('RAZAO_SOCIAL', 'OPERADORA ' + filtered['REG_ANS'].astype(str))
+    res['Trimestre'] = trimestre
+    res['Ano'] = ano
+
+    # Normalização vetorizada de VL_SALDO_FINAL (equivalente a limpar_valor)
+    res['ValorDespesas'] = converter_valores(filtered['VL_SALDO_FINAL'])
+
+    # Remove registros sem impacto financeiro para otimizar o armazenamento
+    return res[res['ValorDespesas'] > 0]
+
+def agregar(df):
+    # Agregação: Consolida valores por operadora e período
+    # Reduz a cardinalidade dos dados antes da inserção no banco de dados
+    return df.groupby(CHAVES_AGREGACAO, as_index=False).agg({
+        'ValorDespesas': 'sum'
+    })
+
+def acumular(acumulado, parcial):
+    # Soma é associativa: combinar parciais já agregados produz o mesmo consolidado que agregar as linhas brutas
+    if acumulado is None:
+        return parcial
+    return agregar(pd.concat([acumulado, parcial], ignore_index=True))
+
+def ler_blocos(origem, tamanho=BLOCO_BYTES):
+    # Divide a fonte em blocos de bytes terminados em fim de linha, repetindo o cabeçalho em cada um.
+    # A leitura/descompactação fica no processo principal; o parsing (parte cara) vai para os workers
+    with abrir_fonte(origem) as handle:
+        stream = open(handle, 'rb') if isinstance(handle, str) else handle
+        try:
+            cabecalho = stream.readline()
+            while True:
+                dados = stream.read(tamanho)
+                if not dados:
+                    break
+                yield cabecalho + dados + stream.readline()
+        finally:
+            if stream is not handle:
+                stream.close()
+
+def processar_bloco(bloco, ano, trimestre):
+    # Executado nos processos do pool: devolve apenas o parcial agregado do bloco, nunca as linhas filtradas
+    df = pd.read_csv(io.BytesIO(bloco), **OPCOES_LEITURA)
+    res = filtrar_chunk(df, ano, trimestre)
+    if res is None or res.empty:
+        return None
+    return agregar(res)
+
+def processar_em_paralelo(fontes, workers):
+    # Map-reduce: os blocos de todas as fontes são distribuídos entre `workers` processos e
+    # os parciais são combinados conforme chegam. O número de blocos em voo é limitado para
+    # que o leitor não carregue o arquivo inteiro na fila de envio.
+    acumulado = None
+    pendentes = set()
+    limite_em_voo = workers * 2
+
+    def coletar(concluidos):
+        nonlocal acumulado
+        for future in concluidos:
+            try:
+                parcial = future.result()
+            except Exception as e:
+                logger.error(f"Erro ao processar bloco: {e}")
+                continue
+            if parcial is not None:
+                acumulado = acumular(acumulado, parcial)
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(PROCESSOR_CONTEXTO)) as executor:
+        for nome, origem in fontes:
+            logger.info(f"Iniciando leitura: {nome}")
+            ano, trimestre = extrair_data_do_caminho(nome)
+            try:
+                for bloco in ler_blocos(origem):
+                    pendentes.add(executor.submit(processar_bloco, bloco, ano, trimestre))
+                    if len(pendentes) >= limite_em_voo:
+                        concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+                        coletar(concluidos)
+            except Exception as e:
+                logger.error(f"Erro ao processar o arquivo {nome}: {e}")
+
+        concluidos, pendentes = wait(pendentes)
+        coletar(concluidos)
+
+    return acumulado
+
+def pico_memoria_mb():
+    # Pico de RSS via getrusage; indisponível no Windows (módulo resource inexistente)
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss é reportado em KB no Linux e em bytes no macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'processo': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / divisor,
+        'workers': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / divisor,
+    }
+
+def consolidar_despesas(workers=PROCESSOR_WORKERS):
+    fontes = listar_fontes()
+
+    if not fontes:
+        logger.warning("Nenhum arquivo encontrado em data/raw")
+        return None
+
+    if MOTOR_EXECUCAO == 'duckdb':
+        # Importado sob demanda: o duckdb só é necessário quando este motor é escolhido
+        import motor_duckdb
+        logger.info(f"Motor DuckDB: {motor_duckdb.DUCKDB_THREADS} threads, memória até {motor_duckdb.DUCKDB_MEMORIA}")
+        final_df = motor_duckdb.consolidar_despesas(fontes)
+    elif workers > 1:
+        logger.info(f"Modo paralelo: {workers} processos")
+        final_df = processar_em_paralelo(fontes, workers)
+    else:
+        final_df = None
+        for nome, origem in fontes:
+            logger.info(f"Iniciando leitura: {nome}")
+            ano, trimestre = extrair_data_do_caminho(nome)
+
+            try:
+                with abrir_fonte(origem) as handle:
+                    # Estrátegia de processamento em lotes (chunking)
+                    # Trade-off: Menor consumo de memória RAM sacrificando levemente o tempo de CPU
+                    chunks = pd.read_csv(handle, chunksize=100000, **OPCOES_LEITURA)
+
+                    # Agregação em streaming: cada chunk filtrado é somado ao consolidado imediatamente,
+                    # então o pico de memória depende do número de pares operadora/período, não do total de linhas
+                    for chunk in chunks:
+                        res = filtrar_chunk(chunk, ano, trimestre)
+                        if res is not None and not res.empty:
+                            final_df = acumular(final_df, agregar(res))
+
+            except Exception as e:
+                logger.error(f"Erro ao processar o arquivo {nome}: {e}")
+
+    pico = pico_memoria_mb()
+    if pico:
+        detalhe = f", {pico['workers']:.1f} MB (maior worker)" if workers > 1 else ""
+        logger.info(f"Pico de memória: {pico['processo']:.1f} MB (processo principal){detalhe}")
+
+    return final_df
+
+def process_files(workers=PROCESSOR_WORKERS):
     # Cria estrutura de diretórios para persistência da camada processada
     if not os.path.exists(OUTPUT_DIR):
         os.makedirs(OUTPUT_DIR)
         logger.info(f"Diretório de saída criado: {OUTPUT_DIR}")
 
-    all_data = []
-    files = glob.glob(f"{RAW_DIR}/**/*.csv", recursive=True) + glob.glob(f"{RAW_DIR}/**/*.txt", recursive=True)
-
-    if not files:
-        logger.warning("Nenhum arquivo encontrado em data/raw")
-        return
+    final_df = consolidar_despesas(workers)
 
-    for file_path in files:
-        logger.info(f"Iniciando leitura: {os.path.basename(file_path)}")
-        ano, trimestre = extrair_data_do_caminho(file_path)
-        
-        try:
-            # Estrátegia de processamento em lotes (chunking)
-            # Trade-off: Menor consumo de memória RAM sacrificando levemente o tempo de CPU
-            chunks = pd.read_csv(file_path, sep=';', engine='python', encoding='latin-1', chunksize=100000, on_bad_lines='skip')
-            
-            for chunk in chunks:
-                # Normalização de cabeçalhos: remove caracteres especiais e padroniza para UPPERCASE
-                chunk.columns = [c.upper().strip().replace('"', '') for c in chunk.columns]
-                
-                # Filtragem: Isola apenas despesas relacionadas a Sinistros/Eventos Conhecidos
-                if 'DESCRICAO' in chunk.columns:
-                    chunk['DESCRICAO'] = chunk['DESCRICAO'].astype(str).str.strip()
-                    
-                    mask = (chunk['DESCRICAO'].str.contains("EVENTOS", na=False, case=False)) & \
-                           (chunk['DESCRICAO'].str.contains("SINISTROS", na=False, case=False))
-                    
-                    filtered = chunk[mask].copy()
-                    
-                    if not filtered.empty:
-                        res = pd.DataFrame()
-                        res['CNPJ'] = filtered['REG_ANS']
-                        res['RazaoSocial'] = filtered.get('RAZAO_SOCIAL', 'OPERADORA ' + filtered['REG_ANS'].astype(str))
-                        res['Trimestre'] = trimestre
-                        res['Ano'] = ano
-                        
-
-                        # Normalizador financeiro: Trata inconsistências de separadores decimais 
-                        # (padrão PT-BR vs EN-US)
-                        def limpar_valor(v):
-                            v = str(v).replace('"', '').strip()
-                            if not v or v == 'nan': return 0.0
-
-                            # Lógica para tratar formatos como '1.234,56' transformando em '1234.56'
-                            if '.' in v and ',' in v:
-                                v = v.replace('.', '')
-                            v = v.replace(',', '.')
-                            try:
-                                return float(v)
-                            except:
-                                return 0.0
-
-                        res['ValorDespesas'] = filtered['VL_SALDO_FINAL'].apply(limpar_valor)
-
-                        # Remove registros sem impacto financeiro para otimizar o armazenamento
-                        res = res[res['ValorDespesas'] > 0]
-                        all_data.append(res)
-                        
-        except Exception as e:
-            logger.error(f"Erro ao processar o arquivo {file_path}: {e}")
-
-    if all_data:
-        logger.info("Consolidando dados filtrados...")
-
-        # Unificação dos dataframes processados individualmente
-        final_df = pd.concat(all_data, ignore_index=True)
-        
-        # Agregação: Consolida valores por operadora e período
-        # Reduz a cardinalidade dos dados antes da inserção no banco de dados
-        final_df = final_df.groupby(['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano'], as_index=False).agg({
-            'ValorDespesas': 'sum'
-        })
-        
-        final_df.to_csv(OUTPUT_FILE, index=False, encoding='utf-8')
-        logger.info(f"Sucesso! {len(final_df)} registros consolidados em {OUTPUT_FILE}")    
+    if final_df is not None:
+        caminho = salvar_intermediario(final_df, OUTPUT_FILE)
+        logger.info(f"Sucesso! {len(final_df)} registros consolidados em {caminho}")    
     else:
         logger.error("O filtro 'EVENTOS/SINISTROS' não encontrou dados válidos nos arquivos.")
         return False
     
 def criar_zip():
-    if not os.path.exists(OUTPUT_FILE):
-        logger.error("Arquivo CSV não encontrado para compactação.")
+    if not existe_intermediario(OUTPUT_FILE):
+        logger.error("Arquivo consolidado não encontrado para compactação.")
         return
 
     zip_path = os.path.join(OUTPUT_DIR, "consolidado_despesas.zip")
     try:
         with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            zipf.write(OUTPUT_FILE, arcname="consolidado_despesas.csv")
+            adicionar_ao_zip(zipf, OUTPUT_FILE, "consolidado_despesas.csv")
         logger.info(f"Arquivo compactado com sucesso em: {zip_path}")
     except Exception as e:
         logger.error(f"Falha ao criar arquivo ZIP: {e}")
@@ -1,8 +1,9 @@
-import subprocess
 import sys
 import time
 import logging
 import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -18,51 +19,213 @@ logging.basicConfig(
     ]
 )
 
-def run_step(script_name):
-    full_script_path = os.path.join(SCRIPT_DIR, script_name)
-    logging.info(f"Iniciando: {script_name}...")
+# Importados após a configuração de logging: cada módulo chama basicConfig ao ser importado,
+# e apenas a primeira configuração (a do pipeline) deve valer quando tudo roda no mesmo processo
+import crawler_ans
+import processor
+import validator
+import enricher
+import etl_register
+import aggregator
+import loader
+import storage
+import cache
+from storage import aplicar_esquema, salvar_intermediario
+
+# Etapas que geram intermediários entregam DataFrames em memória; com --checkpoint
+# eles também são gravados em data/processed (CSV ou Parquet, conforme PIPELINE_FORMATO)
+CHECKPOINTS = {
+    'processor': processor.OUTPUT_FILE,
+    'validator': validator.OUTPUT_FILE,
+    'enricher': "data/processed/consolidado_enriquecido.csv",
+    'aggregator': aggregator.OUTPUT_FILE,
+}
+
+def arquivos_demonstracoes():
+    # Fontes brutas (ZIPs ou CSV/TXT extraídos), exceto o cadastro, que é a entrada da etapa 'cadastro'
+    cadastro = os.path.normpath(enricher.CADASTRO_LOCAL)
+    caminhos = {origem[0] if isinstance(origem, tuple) else origem for _, origem in processor.listar_fontes()}
+    return [c for c in caminhos if os.path.normpath(c) != cadastro]
+
+def arquivos_cadastro():
+    return [enricher.CADASTRO_LOCAL]
+
+def exigir(df, etapa):
+    if df is None:
+        raise RuntimeError(f"A etapa '{etapa}' não produziu dados.")
+    return df
+
+def etapa_crawler(entradas):
+    crawler_ans.download_and_extract()
+
+def etapa_cadastro(entradas):
+    # Download condicional (manifesto): em execuções sem alteração na ANS custa apenas um 304
+    # O cadastro é entregue já indexado por RegistroANS, a partir do snapshot quando a fonte não mudou
+    if not enricher.buscar_e_baixar_csv() and not os.path.exists(enricher.CADASTRO_LOCAL):
+        raise RuntimeError("Cadastro de operadoras indisponível.")
+    return exigir(enricher.preparar_cadastro(), 'cadastro')
+
+def etapa_processor(entradas):
+    if not os.path.exists(processor.OUTPUT_DIR):
+        os.makedirs(processor.OUTPUT_DIR)
+    return aplicar_esquema(exigir(processor.consolidar_despesas(), 'processor'))
+
+def etapa_validator(entradas):
+    validos = validator.validar_despesas(entradas['processor'])
+    validator.gerar_zip(validos)
+    return validos
+
+def etapa_enricher(entradas):
+    return aplicar_esquema(enricher.enriquecer(entradas['processor'], entradas['cadastro']))
+
+def etapa_etl_register(entradas):
+    etl_register.limpar_cadastro()
+
+def etapa_aggregator(entradas):
+    # Impressões por trimestre a partir das fontes e do cadastro: o histórico não é re-hasheado a cada execução
+    agg_df = aggregator.agregar_incremental(entradas['enricher'], impressoes=aggregator.impressoes_upstream())
+    aggregator.gerar_zip_final(agg_df)
+    return agg_df
+
+def etapa_loader(entradas):
+    loader.load_data(entradas['enricher'], entradas['aggregator'])
+
+# Grafo de dependências: cada etapa recebe os resultados das dependências já concluídas.
+# Etapas sem dependência entre si (ex: crawler e cadastro) rodam em paralelo.
+# - 'origem': etapas que consultam a ANS sempre rodam (downloads condicionais); sua impressão digital
+#   é o conteúdo dos arquivos baixados.
+# - demais etapas: são puladas quando a chave (código + impressões das dependências) coincide com a da
+#   última execução e seus 'artefatos' ainda existem.
+ETAPAS = {
+    'crawler':      {'fn': etapa_crawler,      'deps': [],                        # 1. Baixa os ZIPs
+                     'origem': arquivos_demonstracoes},
+    'cadastro':     {'fn': etapa_cadastro,     'deps': [],                        # 2. Baixa e lê o cadastro
+                     'origem': arquivos_cadastro},
+    'processor':    {'fn': etapa_processor,    'deps': ['crawler'],               # 3. Limpa e normaliza os dados
+                     'modulos': [processor, storage]},
+    'validator':    {'fn': etapa_validator,    'deps': ['processor'],             # 4. Verifica se o arquivo é válido
+                     'modulos': [validator, storage], 'artefatos': ["data/processed/consolidado_despesas.zip"]},
+    'enricher':     {'fn': etapa_enricher,     'deps': ['processor', 'cadastro'], # 5. Adiciona dados extras
+                     'modulos': [enricher, storage]},
+    'etl_register': {'fn': etapa_etl_register, 'deps': ['cadastro'],              # 6. Prepara o cadastro
+                     'modulos': [etl_register], 'artefatos': [etl_register.OUTPUT_FILE]},
+    'aggregator':   {'fn': etapa_aggregator,   'deps': ['enricher'],              # 7. Cria resumos/agregados
+                     'modulos': [aggregator, storage], 'artefatos': [aggregator.ZIP_FINAL]},
+    'loader':       {'fn': etapa_loader,       'deps': ['enricher', 'aggregator'],# 8. Salva no Banco de Dados
+                     'modulos': [loader]},
+}
+
+def run_step(nome, etapa, entradas, checkpoint=False):
+    logging.info(f"Iniciando: {nome}...")
     start = time.time()
-    
+
+    resultado = etapa['fn'](entradas)
+
+    if checkpoint and nome in CHECKPOINTS and resultado is not None:
+        caminho = salvar_intermediario(resultado, CHECKPOINTS[nome])
+        logging.info(f"Checkpoint gravado: {caminho}")
+
+    end = time.time()
+    logging.info(f"Sucesso: {nome} (Tempo: {end - start:.2f}s)\n")
+    return resultado, end - start
+
+def executar_dag(etapas, workers, checkpoint=False, forcar=()):
+    estado = cache.carregar_estado()
+    resultados = {}
+    impressoes = {}
+    resumo = {}
+    pendentes = dict(etapas)
+    em_execucao = {}
+
+    def obter_resultado(dep):
+        # Resultado de etapa pulada é lido do cache apenas quando alguém realmente precisa dele
+        if dep not in resultados:
+            resultados[dep] = cache.carregar_resultado(dep)
+        return resultados[dep]
+
+    executor = ThreadPoolExecutor(max_workers=workers)
     try:
-        if not os.path.exists(full_script_path):
-            raise FileNotFoundError(f"Arquivo não encontrado: {full_script_path}")
-        
-        # sys.executable garante o uso do mesmo Python do venv
-        subprocess.run([sys.executable, full_script_path], check=True)
-        
-        end = time.time()
-        logging.info(f"Sucesso: {script_name} (Tempo: {end - start:.2f}s)\n")
-        
-    except FileNotFoundError as e:
-        logging.error(str(e))
-        logging.critical("O pipeline foi interrompido: arquivo faltando.")
-        sys.exit(1)
-    except subprocess.CalledProcessError:
-        logging.error(f"Erro crítico ao executar: {script_name}")
-        logging.critical("O pipeline foi interrompido.")
-        sys.exit(1)
-    except Exception as e:
-        logging.error(f"Erro inesperado: {e}")
-        sys.exit(1)
+        while pendentes or em_execucao:
+            # Dispara (ou pula) todas as etapas cujas dependências já terminaram. Pular uma etapa
+            # pode liberar outras imediatamente, por isso a varredura se repete até estabilizar
+            prontas = True
+            while prontas:
+                prontas = [n for n, e in pendentes.items() if all(d in impressoes for d in e['deps'])]
+                for nome in prontas:
+                    etapa = pendentes.pop(nome)
+                    chave = None
+                    if 'origem' not in etapa:
+                        chave = cache.calcular_chave(nome, etapa['modulos'], {d: impressoes[d] for d in etapa['deps']})
+                        if nome not in forcar and 'all' not in forcar and \
+                                cache.cache_valido(estado, nome, chave, etapa.get('artefatos', [])):
+                            logging.info(f"Ignorada: {nome} (entradas e código inalterados)")
+                            impressoes[nome] = chave
+                            resumo[nome] = ('ignorada', 0.0)
+                            if checkpoint and nome in CHECKPOINTS and obter_resultado(nome) is not None:
+                                salvar_intermediario(obter_resultado(nome), CHECKPOINTS[nome])
+                            continue
+
+                    entradas = {d: obter_resultado(d) for d in etapa['deps']}
+                    future = executor.submit(run_step, nome, etapa, entradas, checkpoint)
+                    em_execucao[future] = (nome, chave)
+                # Etapas submetidas ainda não têm impressão; só as puladas liberam novas na mesma varredura
+                prontas = [n for n in prontas if n in impressoes]
+
+            if not em_execucao:
+                if pendentes:
+                    raise RuntimeError(f"Dependências não satisfeitas: {list(pendentes)}")
+                break
+
+            concluidas, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+            for future in concluidas:
+                nome, chave = em_execucao.pop(future)
+                try:
+                    resultado, duracao = future.result()
+                except Exception as e:
+                    logging.error(f"Erro crítico ao executar: {nome} ({e})")
+                    raise
+
+                resultados[nome] = resultado
+                resumo[nome] = ('executada', duracao)
+                if 'origem' in etapas[nome]:
+                    impressoes[nome] = cache.hash_arquivos(etapas[nome]['origem'](), estado)
+                else:
+                    impressoes[nome] = chave
+                    cache.registrar_execucao(estado, nome, chave, resultado)
+                cache.salvar_estado(estado)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        registrar_resumo(etapas, resumo)
+
+    return resultados
+
+def registrar_resumo(etapas, resumo):
+    logging.info("Resumo das etapas:")
+    for nome in etapas:
+        status, duracao = resumo.get(nome, ('não executada', 0.0))
+        logging.info(f"  {nome:<13} {status:<14} {duracao:>8.2f}s")
 
 def main():
+    parser = argparse.ArgumentParser(description="Pipeline de dados ANS")
+    parser.add_argument("--checkpoint", action="store_true",
+                        help="Grava os intermediários em data/processed além de repassá-los em memória")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Número máximo de etapas executadas simultaneamente")
+    parser.add_argument("--force", action="append", default=[], metavar="ETAPA",
+                        choices=list(ETAPAS) + ['all'],
+                        help="Reexecuta a etapa mesmo com cache válido (pode ser repetido; 'all' para todas)")
+    args = parser.parse_args()
+
     logging.info("INICIANDO O PIPELINE DE DADOS ANS\n")
     logging.info(f"Diretório de execução: {SCRIPT_DIR}")
-    
-    steps = [
-        "crawler_ans.py",  # 1. Baixa o CSV
-        "processor.py",    # 2. Limpa e normaliza os dados
-        "validator.py",    # 3. Verifica se o arquivo é válido
-        "enricher.py",     # 4. Adiciona dados extras
-        "etl_register.py", # 5. Prepara o cadastro
-        "aggregator.py",   # 6. Cria resumos/agregados
-        "loader.py"        # 7. Salva no Banco de Dados
-    ]
 
-    for script in steps:
-        run_step(script)
+    try:
+        executar_dag(ETAPAS, args.workers, checkpoint=args.checkpoint, forcar=args.force)
+    except Exception as e:
+        logging.critical(f"O pipeline foi interrompido: {e}")
+        sys.exit(1)
 
     logging.info("PIPELINE CONCLUÍDO COM SUCESSO! O banco de dados está populado.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
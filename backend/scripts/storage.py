@@ -0,0 +1,73 @@
+import os
+import logging
+
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Formato dos arquivos intermediários entre as etapas do pipeline: "csv" (padrão) ou "parquet".
+# Os entregáveis compactados (ZIPs) continuam sempre em CSV, independentemente desta opção.
+FORMATO_INTERMEDIARIO = os.getenv("PIPELINE_FORMATO", "csv").lower()
+
+# Motor de execução de processor/enricher/aggregator: "pandas" (padrão) ou "duckdb" (SQL em um DuckDB
+# embutido, multi-thread e com spill para disco; ver motor_duckdb.py). Os resultados são equivalentes.
+MOTOR_EXECUCAO = os.getenv("PIPELINE_MOTOR", "pandas").lower()
+
+# Esquema fixo das colunas trocadas entre as etapas: identificadores sempre como texto,
+# colunas de baixa cardinalidade como categoria e período em inteiros pequenos
+ESQUEMA = {
+    'CNPJ': 'str',
+    'RegistroANS': 'str',
+    'RazaoSocial': 'str',
+    'Modalidade': 'category',
+    'UF': 'category',
+    'Ano': 'int16',
+    'Trimestre': 'int8',
+    'ValorDespesas': 'float64',
+    'TotalDespesas': 'float64',
+    'MediaTrimestral': 'float64',
+    'DesvioPadrao': 'float64',
+}
+
+def caminho_intermediario(caminho_csv, formato=None):
+    formato = formato or FORMATO_INTERMEDIARIO
+    if formato == 'parquet':
+        return os.path.splitext(caminho_csv)[0] + '.parquet'
+    return caminho_csv
+
+def existe_intermediario(caminho_csv):
+    return os.path.exists(caminho_intermediario(caminho_csv))
+
+def aplicar_esquema(df):
+    tipos = {c: t for c, t in ESQUEMA.items() if c in df.columns}
+    return df.astype(tipos)
+
+def salvar_intermediario(df, caminho_csv):
+    caminho = caminho_intermediario(caminho_csv)
+    if FORMATO_INTERMEDIARIO == 'parquet':
+        aplicar_esquema(df).to_parquet(caminho, index=False)
+    else:
+        df.to_csv(caminho, index=False, encoding='utf-8')
+    return caminho
+
+def ler_intermediario(caminho_csv, colunas=None):
+    # Leitura com projeção: cada etapa pede apenas as colunas que usa.
+    # No Parquet só essas colunas são decodificadas; no CSV as demais são descartadas durante o parsing.
+    caminho = caminho_intermediario(caminho_csv)
+    if FORMATO_INTERMEDIARIO == 'parquet':
+        return pd.read_parquet(caminho, columns=colunas)
+
+    tipos = {c: t for c, t in ESQUEMA.items() if colunas is None or c in colunas}
+    return pd.read_csv(caminho, usecols=colunas, dtype=tipos)
+
+def escrever_csv_no_zip(zf, df, arcname):
+    # Serializa o DataFrame como CSV direto para dentro do ZIP, sem arquivo temporário em disco
+    zf.writestr(arcname, df.to_csv(index=False))
+
+def adicionar_ao_zip(zf, caminho_csv, arcname):
+    # O entregável é sempre CSV: em modo Parquet o conteúdo é convertido direto para dentro do ZIP
+    if FORMATO_INTERMEDIARIO == 'parquet':
+        escrever_csv_no_zip(zf, ler_intermediario(caminho_csv), arcname)
+    else:
+        zf.write(caminho_csv, arcname=arcname)
@@ -1,8 +1,9 @@
 import pandas as pd
+import numpy as np
 import re
-import os
 import logging
 import zipfile
+from storage import salvar_intermediario, ler_intermediario, existe_intermediario, escrever_csv_no_zip
 
 # Configuração de Logging
 logging.basicConfig(
@@ -58,13 +59,54 @@ def validar_identificador(valor):
     # Caso 3: Formatos desconhecidos
     return False
 
-def executar_validacao():
-    if not os.path.exists(INPUT_FILE):
-        logger.error(f"Arquivo {INPUT_FILE} não encontrado!")
-        return
-
-    logger.info("Iniciando validação de dados (Tópico 2.1)...")
-    df = pd.read_csv(INPUT_FILE)
+# Pesos definidos pela Receita Federal, em formato de vetor para o cálculo em lote
+PESOS_DV1 = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_DV2 = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+def validar_identificadores(serie):
+    """
+    Versão em lote de `validar_identificador`: recebe uma Series e devolve uma Series booleana com o mesmo índice.
+
+    - **Sanitização**: remoção de não-dígitos feita uma única vez com operações vetorizadas de string.
+    - **CNPJ**: os identificadores de 14 dígitos viram uma matriz de inteiros e os dois dígitos
+      verificadores são calculados para a coluna inteira com produto escalar (NumPy).
+    - **Uso em streaming**: não depende do DataFrame completo, podendo ser aplicada a cada chunk.
+    """
+    # Mesma conversão de str(valor) da versão escalar (NaN vira 'nan' e é descartado)
+    texto = serie.astype(object).where(serie.notna(), 'nan').astype(str)
+    resultado = pd.Series(False, index=serie.index)
+
+    # Dígitos não-ASCII (ex: árabe-índicos) são aceitos por \d no re do Python mas não pelos
+    # motores vetorizados; esses casos raros seguem pela função escalar para manter o mesmo resultado
+    ascii_mask = texto.str.isascii().to_numpy(dtype=bool)
+    if not ascii_mask.all():
+        resultado[~ascii_mask] = [validar_identificador(v) for v in serie[~ascii_mask]]
+
+    limpo = texto[ascii_mask].str.replace(r'[^0-9]', '', regex=True)
+    tamanho = limpo.str.len().to_numpy()
+
+    # Caso 1: Registro ANS (1 a 6 dígitos)
+    registro = (tamanho >= 1) & (tamanho <= 6)
+
+    # Caso 2: CNPJ (14 dígitos) validado pelos dígitos verificadores
+    cnpj = np.zeros(len(limpo), dtype=bool)
+    mask14 = tamanho == 14
+    if mask14.any():
+        digitos = np.frombuffer(''.join(limpo[mask14]).encode('ascii'), dtype=np.uint8).reshape(-1, 14).astype(np.int64) - 48
+
+        def calcular_digitos(matriz, pesos):
+            resto = (matriz @ pesos) % 11
+            return np.where(resto < 2, 0, 11 - resto)
+
+        repetido = (digitos == digitos[:, :1]).all(axis=1)
+        dv1_ok = digitos[:, 12] == calcular_digitos(digitos[:, :12], PESOS_DV1)
+        dv2_ok = digitos[:, 13] == calcular_digitos(digitos[:, :13], PESOS_DV2)
+        cnpj[mask14] = ~repetido & dv1_ok & dv2_ok
+
+    resultado[ascii_mask] = registro | cnpj
+    return resultado
+
+def validar_despesas(df):
     total_inicial = len(df)
 
     # 1º Validação: Razão Social não vazia
@@ -73,34 +115,43 @@ def executar_validacao():
     
     # 2º Validação: Valores numéricos positivos
     # Despesas negativas ou zeradas são filtradas para manter apenas fatos financeiros relevantes.
-    df['ValorDespesas'] = pd.to_numeric(df['ValorDespesas'], errors='coerce')
+    df = df.assign(ValorDespesas=pd.to_numeric(df['ValorDespesas'], errors='coerce'))
     df = df[df['ValorDespesas'] > 0]
     
     # 3º Validação: Identificador (Registro ANS ou CNPJ)
     # Separa registros confiáveis de possíveis ruídos ou erros de digitação na fonte.
-    df['id_valido'] = df['CNPJ'].apply(validar_identificador)
+    id_valido = validar_identificadores(df['CNPJ'])
     
-    validos = df[df['id_valido'] == True].copy()
-    invalidos = df[df['id_valido'] == False].copy()
+    validos = df[id_valido].copy()
+    invalidos = df[~id_valido]
 
     if not invalidos.empty:
         logger.warning(f"{len(invalidos)} registros descartados por identificador inválido.")
 
-    validos.drop(columns=['id_valido'], inplace=True)
-    validos.to_csv(OUTPUT_FILE, index=False, encoding='utf-8')
-    
-    logger.info(f"Validação concluída: {len(validos)} registros aprovados de {total_inicial} totais.")
-    logger.info(f"Arquivo validado salvo em: {OUTPUT_FILE}")
-
     validos.columns = ['CNPJ', 'RazaoSocial', 'Trimestre', 'Ano', 'ValorDespesas']
-    validos.to_csv(OUTPUT_FILE, index=False, encoding='utf-8')
+    logger.info(f"Validação concluída: {len(validos)} registros aprovados de {total_inicial} totais.")
+    return validos
 
+def gerar_zip(validos):
     # O arquivo ZIP reduz o overhead de transferência e cumpre requisitos de armazenamento otimizado.
     zip_file = "data/processed/consolidado_despesas.zip"
     with zipfile.ZipFile(zip_file, 'w', zipfile.ZIP_DEFLATED) as zf:
-        zf.write(OUTPUT_FILE, arcname="consolidado_despesas.csv")
+        escrever_csv_no_zip(zf, validos, "consolidado_despesas.csv")
 
     logger.info(f"Arquivo ZIP criado em: {zip_file}")
 
+def executar_validacao():
+    if not existe_intermediario(INPUT_FILE):
+        logger.error(f"Arquivo {INPUT_FILE} não encontrado!")
+        return
+
+    logger.info("Iniciando validação de dados (Tópico 2.1)...")
+    validos = validar_despesas(ler_intermediario(INPUT_FILE))
+
+    caminho = salvar_intermediario(validos, OUTPUT_FILE)
+    logger.info(f"Arquivo validado salvo em: {caminho}")
+
+    gerar_zip(validos)
+
 if __name__ == "__main__":
     executar_validacao()
\ No newline at end of file
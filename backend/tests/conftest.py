@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Os scripts do pipeline se importam como módulos soltos (executados de dentro de backend/scripts)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts"))
+# A API é importada como pacote (backend.app...), a partir da raiz do repositório
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: testes de integração que precisam de um PostgreSQL (DB_HOST, DB_PORT...)")
@@ -0,0 +1,109 @@
+import pandas as pd
+import pytest
+
+import aggregator
+
+
+@pytest.fixture
+def pasta_trabalho(tmp_path, monkeypatch):
+    # O estado incremental é gravado em caminhos relativos (data/processed)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def despesas():
+    return pd.DataFrame({
+        'RazaoSocial': ['OPERADORA A', 'OPERADORA A', 'OPERADORA B', 'OPERADORA A', 'OPERADORA B'],
+        'UF': ['SP', 'SP', 'AM', 'SP', 'AM'],
+        'Ano': [2025, 2025, 2025, 2025, 2025],
+        'Trimestre': [1, 2, 1, 3, 3],
+        'ValorDespesas': [100.0, 250.0, 80.0, 175.5, 60.0],
+    })
+
+
+def linhas_ordenadas(agg_df):
+    return agg_df.sort_values(['RazaoSocial', 'UF']).reset_index(drop=True)
+
+
+def test_incremental_igual_ao_calculo_completo(pasta_trabalho):
+    df = despesas()
+    aggregator.agregar_incremental(df.iloc[:3])
+    incremental = aggregator.agregar_incremental(df)
+    completo = aggregator.agregar_despesas(df)
+    pd.testing.assert_frame_equal(linhas_ordenadas(incremental), linhas_ordenadas(completo))
+
+
+def test_valor_corrigido_sem_mudar_linhas_recalcula(pasta_trabalho):
+    df = despesas()
+    aggregator.agregar_incremental(df)
+
+    corrigido = df.copy()
+    corrigido.loc[0, 'ValorDespesas'] = 1000.0
+    agg_df = linhas_ordenadas(aggregator.agregar_incremental(corrigido))
+
+    pd.testing.assert_frame_equal(agg_df, linhas_ordenadas(aggregator.agregar_despesas(corrigido)))
+    assert agg_df.loc[agg_df['RazaoSocial'] == 'OPERADORA A', 'TotalDespesas'].item() == pytest.approx(1425.5)
+
+
+def test_uf_alterada_no_cadastro_recalcula(pasta_trabalho):
+    df = despesas()
+    aggregator.agregar_incremental(df)
+
+    alterado = df.assign(UF=df['UF'].where(df['RazaoSocial'] != 'OPERADORA B', 'XX'))
+    agg_df = aggregator.agregar_incremental(alterado)
+
+    assert set(agg_df.loc[agg_df['RazaoSocial'] == 'OPERADORA B', 'UF']) == {'XX'}
+    assert 'AM' not in set(agg_df['UF'])
+
+
+def test_sem_alteracao_reaproveita_estado(pasta_trabalho, monkeypatch):
+    df = despesas()
+    esperado = aggregator.agregar_incremental(df)
+
+    def falhar(*args, **kwargs):
+        raise AssertionError("nenhum trimestre deveria ser recalculado")
+
+    monkeypatch.setattr(aggregator, 'estatisticas_em_paralelo', falhar)
+    pd.testing.assert_frame_equal(aggregator.agregar_incremental(df.sample(frac=1, random_state=1)), esperado)
+
+
+def test_impressoes_externas_reagregam_so_o_trimestre_alterado(pasta_trabalho, monkeypatch):
+    df = despesas()
+    impressoes = {'2025-1': 'a', '2025-2': 'b', '2025-3': 'c'}
+    aggregator.agregar_incremental(df, impressoes=impressoes)
+
+    def falhar(*args, **kwargs):
+        raise AssertionError("as linhas não deveriam ser impressas quando as impressões vêm de fora")
+
+    monkeypatch.setattr(aggregator, 'impressoes_trimestres', falhar)
+    calcular = aggregator.estatisticas_em_paralelo
+    agregados = []
+
+    def registrar(parte, *args, **kwargs):
+        agregados.append(sorted(set(aggregator.codigo_periodo(parte))))
+        return calcular(parte, *args, **kwargs)
+
+    monkeypatch.setattr(aggregator, 'estatisticas_em_paralelo', registrar)
+    corrigido = df.copy()
+    corrigido.loc[1, 'ValorDespesas'] = 900.0
+    agg_df = aggregator.agregar_incremental(corrigido, impressoes={**impressoes, '2025-2': 'b2'})
+
+    assert agregados == [[20252]]
+    pd.testing.assert_frame_equal(linhas_ordenadas(agg_df), linhas_ordenadas(aggregator.agregar_despesas(corrigido)))
+
+
+def test_trimestre_sem_impressao_externa_sempre_reagrega(pasta_trabalho, monkeypatch):
+    df = despesas()
+    aggregator.agregar_incremental(df, impressoes={'2025-1': 'a', '2025-3': 'c'})
+
+    calcular = aggregator.estatisticas_em_paralelo
+    agregados = []
+
+    def registrar(parte, *args, **kwargs):
+        agregados.append(sorted(set(aggregator.codigo_periodo(parte))))
+        return calcular(parte, *args, **kwargs)
+
+    monkeypatch.setattr(aggregator, 'estatisticas_em_paralelo', registrar)
+    aggregator.agregar_incremental(df, impressoes={'2025-1': 'a', '2025-3': 'c'})
+
+    assert agregados == [[20252]]
@@ -0,0 +1,67 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+import pytest
+
+from backend.app import cache_respostas
+
+
+@pytest.fixture
+def cache_limpo():
+    cache_respostas.limpar_cache()
+    cache_respostas._estado.update(versao=None, consultada_em=0.0)
+    yield
+    cache_respostas.limpar_cache()
+    cache_respostas._estado.update(versao=None, consultada_em=0.0)
+
+
+def criar_app(versoes, ao_responder=lambda: None):
+    # versoes: lista mutável com a versão corrente da carga; ao_responder simula uma carga durante a rota
+    app = FastAPI()
+
+    async def consultar_versao():
+        return versoes[0]
+
+    @app.middleware("http")
+    async def cache(request: Request, call_next):
+        return await cache_respostas.responder_com_cache(request, call_next, consultar_versao)
+
+    @app.get("/api/estatisticas")
+    async def estatisticas():
+        resposta = {'versao_dos_dados': versoes[0]}
+        ao_responder()
+        return resposta
+
+    return app
+
+
+def test_resposta_repetida_vem_do_cache_com_etag(cache_limpo):
+    client = TestClient(criar_app([1]))
+    primeira = client.get("/api/estatisticas")
+    segunda = client.get("/api/estatisticas", headers={'If-None-Match': primeira.headers['etag']})
+
+    assert primeira.headers['etag'].startswith('"v1-')
+    assert segunda.status_code == 304
+    assert cache_respostas.metricas_cache()['acertos'] == 1
+
+
+def test_corpo_de_versao_anterior_nao_entra_no_cache(cache_limpo, monkeypatch):
+    monkeypatch.setattr(cache_respostas, 'API_CACHE_VERSAO_INTERVALO', 0)
+    versoes = [1]
+
+    def nova_carga():
+        # A carga termina e outra requisição já observou a versão nova antes desta terminar
+        if versoes[0] == 1:
+            versoes[0] = 2
+            cache_respostas._estado['versao'] = 2
+            cache_respostas.limpar_cache()
+
+    client = TestClient(criar_app(versoes, nova_carga))
+    antiga = client.get("/api/estatisticas")
+
+    assert antiga.json() == {'versao_dos_dados': 1}
+    assert 'etag' not in antiga.headers
+    assert cache_respostas.metricas_cache()['itens'] == 0
+
+    nova = client.get("/api/estatisticas")
+    assert nova.json() == {'versao_dos_dados': 2}
+    assert nova.headers['etag'].startswith('"v2-')
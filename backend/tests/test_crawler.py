@@ -0,0 +1,86 @@
+import os
+import io
+import zipfile
+import functools
+import threading
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+import crawler_ans
+
+TRIMESTRES = ['1T2025', '2T2025', '3T2025']
+
+
+def criar_zip(caminho, nome):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr(f"{nome}.csv", f'"DATA";"REG_ANS";"DESCRICAO";"VL_SALDO_FINAL"\n"2025-01-01";"1";"{nome}";"1,00"\n')
+    with open(caminho, 'wb') as f:
+        f.write(buffer.getvalue())
+
+
+class Handler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor_ans(tmp_path):
+    # Árvore falsa de demonstracoes_contabeis/, servida pelo http.server (listagens de diretório + ZIPs)
+    raiz = tmp_path / "ans" / "demonstracoes_contabeis"
+    ano = raiz / "2025"
+    # Subpasta: o crawler só considera anos que tenham subpastas de trimestre
+    (ano / "documentos").mkdir(parents=True)
+    (raiz / "2024").mkdir()
+    for nome in TRIMESTRES:
+        criar_zip(ano / f"{nome}.zip", nome)
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0),
+                                   functools.partial(Handler, directory=str(tmp_path / "ans")))
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{servidor.server_address[1]}/demonstracoes_contabeis/"
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def test_baixa_zips_sem_extrair(servidor_ans, tmp_path):
+    destino = tmp_path / "raw"
+    crawler_ans.download_and_extract(servidor_ans, str(destino), workers=2, extrair=False)
+
+    zips = sorted(p for p in os.listdir(destino) if p.endswith('.zip'))
+    assert zips == [f"{nome}.zip" for nome in TRIMESTRES]
+    for nome in TRIMESTRES:
+        with zipfile.ZipFile(destino / f"{nome}.zip") as zf:
+            assert zf.namelist() == [f"{nome}.csv"]
+
+
+def test_baixa_e_extrai(servidor_ans, tmp_path):
+    destino = tmp_path / "raw"
+    crawler_ans.download_and_extract(servidor_ans, str(destino), workers=2, extrair=True)
+
+    for nome in TRIMESTRES:
+        # ZIP removido após a extração
+        assert not (destino / f"{nome}.zip").exists()
+        assert (destino / nome / f"{nome}.csv").read_text().endswith(f'"{nome}";"1,00"\n')
+
+
+def test_segunda_execucao_nao_baixa_de_novo(servidor_ans, tmp_path, monkeypatch):
+    destino = tmp_path / "raw"
+    crawler_ans.download_and_extract(servidor_ans, str(destino), workers=2, extrair=False)
+
+    # O http.server responde 304 a If-Modified-Since: nenhum ZIP é transferido novamente
+    alterados = []
+    original = crawler_ans.baixar_condicional
+
+    def registrar(*args, **kwargs):
+        alterado = original(*args, **kwargs)
+        alterados.append(alterado)
+        return alterado
+
+    monkeypatch.setattr(crawler_ans, 'baixar_condicional', registrar)
+    crawler_ans.download_and_extract(servidor_ans, str(destino), workers=2, extrair=False)
+    assert alterados == [False] * len(TRIMESTRES)
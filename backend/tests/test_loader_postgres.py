@@ -0,0 +1,244 @@
+import os
+import uuid
+import collections
+
+import pandas as pd
+import pytest
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+import loader
+
+# Integração com PostgreSQL: usa as mesmas variáveis do loader (DB_HOST, DB_PORT, DB_USER, DB_PASSWORD).
+# Cada teste cria um banco próprio e descartável; sem servidor acessível, os testes são ignorados.
+pytestmark = pytest.mark.postgres
+
+SCHEMA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "database", "schema.sql")
+
+# Tabela de despesas como era antes do particionamento (para o teste da migração do schema.sql)
+SCHEMA_LEGADO = """
+CREATE TABLE operadoras_ativas (
+    registro_ans VARCHAR(20) PRIMARY KEY, cnpj VARCHAR(14) UNIQUE, razao_social VARCHAR(255) NOT NULL,
+    modalidade VARCHAR(100), uf CHAR(2), data_registro_ans DATE, data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE despesas_consolidadas (
+    id SERIAL PRIMARY KEY, cnpj VARCHAR(14), razao_social VARCHAR(255), trimestre INTEGER, ano INTEGER,
+    valor_despesa DECIMAL(18, 2), registro_ans VARCHAR(20), modalidade VARCHAR(100), uf CHAR(2),
+    data_carga TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX idx_dc_cnpj ON despesas_consolidadas(cnpj);
+"""
+
+
+def conectar(banco, **kwargs):
+    return psycopg2.connect(**dict(loader.DB_CONFIG, database=banco, connect_timeout=3), **kwargs)
+
+
+def script_schema(cur):
+    with open(SCHEMA, 'r', encoding='utf-8') as f:
+        sql = f.read()
+    cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm';")
+    if cur.fetchone() is None:
+        # Servidor sem o contrib pg_trgm: os índices de busca textual não participam destes testes
+        sql = '\n'.join(linha for linha in sql.splitlines() if 'trgm' not in linha)
+    return sql
+
+
+@pytest.fixture
+def banco(monkeypatch):
+    try:
+        admin = conectar('postgres')
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL indisponível: {e}")
+    admin.autocommit = True
+    nome = f"ans_teste_{uuid.uuid4().hex[:8]}"
+    with admin.cursor() as cur:
+        cur.execute(f"CREATE DATABASE {nome} ENCODING 'UTF8' TEMPLATE template0;")
+    monkeypatch.setitem(loader.DB_CONFIG, 'database', nome)
+    try:
+        yield nome
+    finally:
+        with admin.cursor() as cur:
+            cur.execute(f"DROP DATABASE IF EXISTS {nome} WITH (FORCE);")
+        admin.close()
+
+
+def aplicar_schema(banco):
+    conn = conectar(banco)
+    with conn, conn.cursor() as cur:
+        cur.execute(script_schema(cur))
+    conn.close()
+
+
+def consultar(banco, sql, params=None):
+    conn = conectar(banco)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            return cur.fetchall()
+    finally:
+        conn.close()
+
+
+def despesas(trimestres=((2025, 1), (2025, 2)), operadoras=('1', '2', '3')):
+    linhas = [
+        {'RegistroANS': reg, 'CNPJ': f"{int(reg):014d}", 'RazaoSocial': f"OPERADORA {reg}", 'Modalidade': 'Autogestão',
+         'UF': 'SP', 'Ano': ano, 'Trimestre': tri, 'ValorDespesas': 100.0 * int(reg) + tri + i}
+        for ano, tri in trimestres for reg in operadoras for i in range(2)
+    ]
+    return pd.DataFrame(linhas)
+
+
+def agregadas(df):
+    agg = df.groupby(['RazaoSocial', 'UF'])['ValorDespesas'].agg(['sum', 'mean', 'std']).fillna(0).reset_index()
+    return agg.set_axis(['RazaoSocial', 'UF', 'TotalDespesas', 'MediaTrimestral', 'DesvioPadrao'], axis=1)
+
+
+def carregar(df, modo):
+    loader.load_data(df, agregadas(df), metodo='copy', modo=modo)
+
+
+def linhas_por_particao(banco):
+    return dict(consultar(banco, "SELECT tableoid::regclass::text, count(*) FROM despesas_consolidadas GROUP BY 1;"))
+
+
+def fatias(banco):
+    return {(r, a, t): (h, n) for r, a, t, h, n in
+            consultar(banco, "SELECT registro_ans, ano, trimestre, hash, linhas FROM despesas_fatias;")}
+
+
+def linhas_da_fatia(banco, registro, ano, trimestre):
+    return consultar(banco, "SELECT id, valor_despesa FROM despesas_consolidadas "
+                            "WHERE registro_ans = %s AND ano = %s AND trimestre = %s ORDER BY id;",
+                     (registro, ano, trimestre))
+
+
+@pytest.mark.parametrize('modo', ['completa', 'incremental'])
+def test_carga_repetida_mantem_contagens(banco, modo):
+    aplicar_schema(banco)
+    df = despesas()
+    carregar(df, modo)
+    esperado = {'despesas_consolidadas_2025_t1': 6, 'despesas_consolidadas_2025_t2': 6}
+    assert linhas_por_particao(banco) == esperado
+
+    carregar(df, modo)
+    assert linhas_por_particao(banco) == esperado
+    assert len(fatias(banco)) == 6
+    assert consultar(banco, "SELECT count(*) FROM despesas_agregadas;") == [(3,)]
+    # Nenhuma tabela de carga (_nova/_antiga) sobra depois das trocas
+    assert consultar(banco, "SELECT count(*) FROM pg_class WHERE relname ~ '_(nova|antiga)$';") == [(0,)]
+
+
+def test_carga_completa_substitui_e_remove_trimestres(banco):
+    aplicar_schema(banco)
+    carregar(despesas(((2025, 1), (2025, 2))), 'completa')
+    carregar(despesas(((2025, 2), (2025, 3))), 'completa')
+    assert linhas_por_particao(banco) == {'despesas_consolidadas_2025_t2': 6, 'despesas_consolidadas_2025_t3': 6}
+    assert {(a, t) for _, a, t in fatias(banco)} == {(2025, 2), (2025, 3)}
+
+
+def test_attach_dispensa_varredura(banco, monkeypatch):
+    # O CHECK das tabelas _nova deve provar o limite da partição: o ATTACH não varre a tabela
+    aplicar_schema(banco)
+    conexoes = []
+    conectar_original = loader.psycopg2.connect
+
+    def conectar_com_debug(**config):
+        conn = conectar_original(**config, options='-c client_min_messages=debug1')
+        conn.notices = collections.deque(maxlen=10_000)
+        conexoes.append(conn)
+        return conn
+
+    monkeypatch.setattr(loader.psycopg2, 'connect', conectar_com_debug)
+    carregar(despesas(), 'completa')
+    avisos = ''.join(conexoes[0].notices)
+    assert avisos.count('is implied by existing constraints') >= 2
+    assert 'is being scanned' not in avisos
+
+
+def test_falha_na_publicacao_preserva_dados_anteriores(banco, monkeypatch):
+    aplicar_schema(banco)
+    carregar(despesas(), 'completa')
+    antes = consultar(banco, "SELECT id, registro_ans, ano, trimestre, valor_despesa FROM despesas_consolidadas ORDER BY id;")
+    fatias_antes = fatias(banco)
+
+    # Falha depois de DETACH/DROP/ATTACH das partições: tudo é desfeito na mesma transação
+    def falhar(cur, tabela):
+        raise RuntimeError("falha simulada na troca")
+
+    monkeypatch.setattr(loader, 'trocar_tabela', falhar)
+    alterado = despesas(((2025, 1), (2025, 2), (2025, 3)), operadoras=('1', '4'))
+    with pytest.raises(RuntimeError):
+        carregar(alterado, 'completa')
+
+    assert consultar(banco, "SELECT id, registro_ans, ano, trimestre, valor_despesa FROM despesas_consolidadas "
+                            "ORDER BY id;") == antes
+    assert fatias(banco) == fatias_antes
+    assert set(linhas_por_particao(banco)) == {'despesas_consolidadas_2025_t1', 'despesas_consolidadas_2025_t2'}
+
+
+def test_carga_incremental_altera_apenas_a_fatia_modificada(banco):
+    aplicar_schema(banco)
+    df = despesas()
+    carregar(df, 'incremental')
+    fatias_antes = fatias(banco)
+    linhas_antes = {f: linhas_da_fatia(banco, *f) for f in fatias_antes}
+
+    # Operadora 2 corrige um valor no 2º trimestre; operadora 3 some do 1º trimestre
+    alterado = df.copy()
+    alterado.loc[(alterado['RegistroANS'] == '2') & (alterado['Trimestre'] == 2), 'ValorDespesas'] += 0.5
+    alterado = alterado[~((alterado['RegistroANS'] == '3') & (alterado['Trimestre'] == 1))]
+    carregar(alterado, 'incremental')
+
+    fatias_depois = fatias(banco)
+    modificada, removida = ('2', 2025, 2), ('3', 2025, 1)
+    assert removida not in fatias_depois
+    assert linhas_da_fatia(banco, *removida) == []
+    assert fatias_depois[modificada][0] != fatias_antes[modificada][0]
+    assert fatias_depois[modificada][1] == fatias_antes[modificada][1]
+
+    novas = linhas_da_fatia(banco, *modificada)
+    assert [float(v) for _, v in novas] == [float(v) + 0.5 for _, v in linhas_antes[modificada]]
+    # Linhas reinseridas (ids novos) apenas na fatia alterada
+    assert {i for i, _ in novas}.isdisjoint(i for i, _ in linhas_antes[modificada])
+    for fatia in set(fatias_antes) - {modificada, removida}:
+        assert fatias_depois[fatia] == fatias_antes[fatia]
+        assert linhas_da_fatia(banco, *fatia) == linhas_antes[fatia]
+
+
+def test_carga_incremental_anexa_trimestre_novo(banco):
+    aplicar_schema(banco)
+    carregar(despesas(), 'incremental')
+    ids_antes = consultar(banco, "SELECT id FROM despesas_consolidadas ORDER BY id;")
+
+    carregar(despesas(((2025, 1), (2025, 2), (2025, 3))), 'incremental')
+    assert linhas_por_particao(banco)['despesas_consolidadas_2025_t3'] == 6
+    # Trimestres já carregados e inalterados não são tocados
+    assert consultar(banco, "SELECT id FROM despesas_consolidadas WHERE trimestre < 3 ORDER BY id;") == ids_antes
+
+
+def test_migracao_da_tabela_nao_particionada(banco):
+    conn = conectar(banco)
+    with conn, conn.cursor() as cur:
+        cur.execute(SCHEMA_LEGADO)
+        cur.execute("INSERT INTO despesas_consolidadas (cnpj, razao_social, trimestre, ano, valor_despesa, registro_ans) "
+                    "VALUES ('1', 'A', 1, 2025, 10, '1'), ('2', 'B', 2, 2025, 20, '2'), ('3', 'C', NULL, 2025, 5, '3');")
+    conn.close()
+
+    # Banco antigo sem migração: o loader recusa a carga com uma mensagem clara
+    with pytest.raises(RuntimeError, match="não é uma tabela particionada"):
+        carregar(despesas(), 'incremental')
+
+    aplicar_schema(banco)
+    assert linhas_por_particao(banco) == {'despesas_consolidadas_2025_t1': 1, 'despesas_consolidadas_2025_t2': 1}
+    assert consultar(banco, "SELECT count(*) FROM despesas_consolidadas_sem_periodo;") == [(1,)]
+    assert consultar(banco, "SELECT to_regclass('despesas_consolidadas_legado');") == [(None,)]
+
+    # Idempotente: reaplicar o schema não muda nada
+    aplicar_schema(banco)
+    assert linhas_por_particao(banco) == {'despesas_consolidadas_2025_t1': 1, 'despesas_consolidadas_2025_t2': 1}
+
+    carregar(despesas(), 'completa')
+    assert linhas_por_particao(banco) == {'despesas_consolidadas_2025_t1': 6, 'despesas_consolidadas_2025_t2': 6}
+    # A sequência do id continua depois dos ids migrados
+    assert consultar(banco, "SELECT min(id) > 2 FROM despesas_consolidadas;") == [(True,)]
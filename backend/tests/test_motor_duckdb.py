@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("duckdb")
+
+import processor
+import enricher
+import aggregator
+from storage import aplicar_esquema
+from gerar_dados_sinteticos import gerar_dados
+
+MODULOS = [processor, enricher, aggregator]
+
+
+@pytest.fixture(scope="module")
+def dados_sinteticos(tmp_path_factory):
+    # Cobre os formatos de valor difíceis (milhar, vírgula, ponto, vazio, negativo, inválido) e registros
+    # sem correspondência no cadastro
+    pasta = tmp_path_factory.mktemp("sintetico")
+    gerar_dados(str(pasta), linhas=30_000, trimestres=3, operadoras=200, seed=7)
+    return pasta
+
+
+def executar(pasta, motor, monkeypatch):
+    # processor -> enricher -> aggregator, como no run_pipeline, com o motor escolhido
+    monkeypatch.chdir(pasta)
+    for modulo in MODULOS:
+        monkeypatch.setattr(modulo, 'MOTOR_EXECUCAO', motor)
+    consolidado = aplicar_esquema(processor.consolidar_despesas(workers=1))
+    enriquecido = aplicar_esquema(enricher.enriquecer(consolidado, enricher.preparar_cadastro()))
+    agregado = aggregator.agregar_despesas(enriquecido, partes=1)
+    return consolidado, enriquecido, agregado
+
+
+@pytest.fixture(scope="module")
+def resultados(dados_sinteticos):
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        pandas = executar(dados_sinteticos, 'pandas', monkeypatch)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        duckdb = executar(dados_sinteticos, 'duckdb', monkeypatch)
+    return pandas, duckdb
+
+
+def normalizar(df, chaves):
+    return df.sort_values(chaves).reset_index(drop=True)
+
+
+def test_processor_equivalente(resultados):
+    (pandas, _, _), (duckdb, _, _) = resultados
+    assert len(pandas) > 0
+    chaves = ['CNPJ', 'RazaoSocial', 'Ano', 'Trimestre']
+    # Somas em ordem diferente: iguais até o último dígito (ulp) e idênticas em centavos, como gravadas no banco
+    pd.testing.assert_frame_equal(normalizar(duckdb, chaves), normalizar(pandas, chaves), check_exact=False, rtol=1e-12)
+    np.testing.assert_array_equal(normalizar(duckdb, chaves)['ValorDespesas'].round(2),
+                                  normalizar(pandas, chaves)['ValorDespesas'].round(2))
+
+
+def test_enricher_equivalente(resultados):
+    (_, pandas, _), (_, duckdb, _) = resultados
+    chaves = ['RegistroANS', 'RazaoSocial', 'Ano', 'Trimestre']
+    assert (pandas['UF'] == 'NI').any()
+    pd.testing.assert_frame_equal(normalizar(duckdb, chaves), normalizar(pandas, chaves), check_exact=False, rtol=1e-12)
+
+
+def test_aggregator_equivalente(resultados):
+    (_, _, pandas), (_, _, duckdb) = resultados
+    chaves = ['RazaoSocial', 'UF']
+    pd.testing.assert_frame_equal(normalizar(duckdb, chaves), normalizar(pandas, chaves), check_exact=False, rtol=1e-9)
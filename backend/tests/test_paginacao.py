@@ -0,0 +1,39 @@
+import pytest
+
+from backend.app import cache_respostas, paginacao
+
+
+@pytest.fixture
+def versao(monkeypatch):
+    # Versão da carga como a middleware de cache a deixaria após a última consulta
+    monkeypatch.setitem(cache_respostas._estado, 'versao', 1)
+    monkeypatch.setattr(paginacao, '_contagens', {})
+    return cache_respostas._estado
+
+
+FILTRO = ("WHERE razao_social ILIKE %s OR cnpj LIKE %s", ['%saude%', '%saude%'])
+
+
+def test_contagem_reaproveitada_na_mesma_carga(versao):
+    paginacao.guardar_contagem(paginacao.chave_contagem(*FILTRO), 42)
+    assert paginacao.contagem_em_cache(paginacao.chave_contagem(*FILTRO)) == 42
+
+
+def test_nova_carga_nao_reaproveita_contagem(versao):
+    paginacao.guardar_contagem(paginacao.chave_contagem(*FILTRO), 42)
+    versao['versao'] = 2
+    assert paginacao.contagem_em_cache(paginacao.chave_contagem(*FILTRO)) is None
+
+
+def test_contagem_feita_durante_a_troca_de_carga_nao_e_guardada(versao):
+    chave = paginacao.chave_contagem(*FILTRO)
+    versao['versao'] = 2
+    paginacao.guardar_contagem(chave, 42)
+    assert paginacao._contagens == {}
+
+
+def test_sem_versao_conhecida_nao_usa_cache(versao):
+    versao['versao'] = None
+    chave = paginacao.chave_contagem(*FILTRO)
+    paginacao.guardar_contagem(chave, 42)
+    assert chave is None and paginacao.contagem_em_cache(chave) is None
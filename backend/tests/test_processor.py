@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from processor import limpar_valor, converter_valores
+
+# Valores difíceis de VL_SALDO_FINAL: separadores mistos, aspas, espaços, vazios, notações aceitas pelo
+# float() do Python (expoente, inf, nan, '_') e textos inválidos. converter_valores deve devolver
+# exatamente o mesmo que limpar_valor aplicado elemento a elemento.
+CORPUS = [
+    '1234,56', '1.234,56', '1.234.567,89', '1234.56', '1,234.56', '1,234', '1.234', '1.2.3', '1,2,3',
+    '0', '0,00', '-0', '-0,0', '-1.234,56', '+12,5', '-,5', ',5', '5,', '.5', '5.',
+    '"1.234,56"', '""', '"', '  12,5  ', '\t7,25\n', ' ', '', 'nan', 'NaN', 'NAN', 'None', 'inf', '-inf',
+    'Infinity', '1e3', '1E-2', '1,5e3', '1.000,5e2', '1_000', '1_000,5', '0x10', '١٢٣', 'N/D', '-', 'abc',
+    '12 345,67', '1.234,56-', '99999999999999999999,99', '0,1', '0,2', '0,30000000000000004',
+    None, np.nan, 1234.5, 0, -7,
+]
+
+
+def comparar(serie):
+    esperado = np.array([limpar_valor(v) for v in serie], dtype='float64')
+    obtido = converter_valores(serie).to_numpy(dtype='float64')
+    # Igualdade exata, inclusive NaN na mesma posição e sinal de zero (-0.0)
+    np.testing.assert_array_equal(obtido, esperado)
+    np.testing.assert_array_equal(np.signbit(obtido), np.signbit(esperado))
+
+
+def test_corpus_identico_a_limpar_valor():
+    comparar(pd.Series(CORPUS, dtype=object))
+
+
+def test_corpus_apenas_texto():
+    comparar(pd.Series([v for v in CORPUS if isinstance(v, str)], dtype=object))
+
+
+def test_lote_so_com_numeros_validos():
+    # Caminho rápido (sem valores rejeitados no lote)
+    comparar(pd.Series(['1234,56', '1.234,56', '0', '', '-3,5', '"10,00"'], dtype=object))
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'int64'])
+def test_coluna_numerica(dtype):
+    comparar(pd.Series([1, 2, 3], dtype=dtype))
+
+
+def test_coluna_string_do_pandas():
+    comparar(pd.Series(['1.234,56', None, 'N/D', '7,5'], dtype='string'))
+
+
+def test_preserva_indice():
+    serie = pd.Series(['1,5', 'x', '2'], index=[10, 20, 30], dtype=object)
+    assert list(converter_valores(serie).index) == [10, 20, 30]
+
+
+def test_impressoes_fontes_mudam_apenas_no_trimestre_alterado(tmp_path):
+    import zipfile
+    from processor import listar_fontes, impressoes_fontes
+
+    def gravar(nome, conteudo):
+        with zipfile.ZipFile(tmp_path / f"{nome}.zip", 'w') as zf:
+            zf.writestr(f"{nome}.csv", conteudo)
+
+    gravar("1T2025", "DATA;REG_ANS\n2025-01-01;1\n")
+    gravar("2T2025", "DATA;REG_ANS\n2025-04-01;1\n")
+    antes = impressoes_fontes(listar_fontes(str(tmp_path)))
+
+    gravar("2T2025", "DATA;REG_ANS\n2025-04-01;2\n")
+    depois = impressoes_fontes(listar_fontes(str(tmp_path)))
+
+    assert set(antes) == {'2025-1', '2025-2'}
+    assert depois['2025-1'] == antes['2025-1']
+    assert depois['2025-2'] != antes['2025-2']
+
+
+def test_paralelo_com_spawn_igual_ao_sequencial(tmp_path, monkeypatch):
+    from processor import listar_fontes, consolidar_despesas, processar_em_paralelo
+
+    linhas = ["DATA;REG_ANS;CD_CONTA_CONTABIL;DESCRICAO;VL_SALDO_INICIAL;VL_SALDO_FINAL"]
+    for trimestre in range(1, 4):
+        for reg in range(20):
+            linhas.append(f"2025-01-01;{reg};41;EVENTOS/ SINISTROS CONHECIDOS;0;{reg * trimestre},50")
+        (tmp_path / f"{trimestre}T2025.csv").write_text("\n".join(linhas) + "\n", encoding='latin-1')
+        linhas = linhas[:1]
+
+    monkeypatch.setattr("processor.PROCESSOR_CONTEXTO", "spawn")
+    monkeypatch.setattr("processor.listar_fontes", lambda: listar_fontes(str(tmp_path)))
+    sequencial = consolidar_despesas(workers=1)
+    paralelo = processar_em_paralelo(listar_fontes(str(tmp_path)), 2)
+
+    def ordenar(df):
+        return df.sort_values(['Ano', 'Trimestre', 'CNPJ']).reset_index(drop=True)
+
+    assert len(sequencial) == 60
+    pd.testing.assert_frame_equal(ordenar(paralelo), ordenar(sequencial))
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from validator import validar_cnpj, validar_identificador, validar_identificadores
+from gerar_dados_sinteticos import gerar_cnpjs
+
+# Identificadores difíceis: CNPJs válidos e com dígito verificador errado, com e sem máscara, sequências
+# repetidas, tamanhos errados, Registros ANS, vazios, NaN/None, números (int e float) e dígitos não-ASCII.
+# validar_identificadores deve devolver exatamente o mesmo que a versão escalar, elemento a elemento.
+VALIDOS = list(gerar_cnpjs(np.random.default_rng(3), 20)) + ['11222333000181', '00000000000191']
+CORPUS = VALIDOS + [
+    '11222333000182', '11222333000191', '00000000000190',
+    '11.222.333/0001-81', '11.222.333/0001-82', ' 11222333000181 ', '11 222 333 0001 81', 'CNPJ: 11222333000181',
+    '00000000000000', '11111111111111', '99999999999999', '00.000.000/0000-00',
+    '1122233300018', '112223330001811', '1234567', '1234567890123', '123456789012345',
+    '1', '123456', '000001', '12-3456', 'ANS 123456', '',  ' ', '---', 'abc', 'nan', 'None',
+    '١١٢٢٢٣٣٣٠٠٠١٨١', '١٢٣', '١١١١١١١١١١١١١١', '１１２２２３３３０００１８１', '12٣4',
+    None, np.nan, 123456, 11222333000181, 112223330001810, 0, -123, 123456.0, 1.5, 11222333000181.0,
+]
+
+
+def comparar(valores, indice=None):
+    serie = pd.Series(valores, index=indice, dtype=object)
+    esperado = [validar_identificador(v) for v in serie]
+    obtido = validar_identificadores(serie)
+    assert obtido.tolist() == esperado
+    assert obtido.dtype == bool
+    assert obtido.index.equals(serie.index)
+
+
+def test_corpus_identico_a_versao_escalar():
+    comparar(CORPUS)
+
+
+def test_cnpjs_de_14_digitos_identicos_a_validar_cnpj():
+    # Sem máscara, a regra de 14 dígitos é exatamente validar_cnpj
+    cnpjs = [v for v in CORPUS if isinstance(v, str) and len(v) == 14 and v.isdigit()]
+    assert validar_identificadores(pd.Series(cnpjs)).tolist() == [validar_cnpj(v) for v in cnpjs]
+    assert all(validar_identificadores(pd.Series(VALIDOS)))
+
+
+def test_lote_apenas_ascii():
+    comparar([v for v in CORPUS if not (isinstance(v, str) and not v.isascii())])
+
+
+def test_lote_apenas_nao_ascii():
+    comparar([v for v in CORPUS if isinstance(v, str) and not v.isascii()])
+
+
+def test_indice_nao_sequencial():
+    comparar(CORPUS, indice=range(1000, 1000 + 2 * len(CORPUS), 2))
+
+
+def test_colunas_numericas():
+    for serie in (pd.Series([123456, 11222333000181, 7], dtype='int64'),
+                  pd.Series([123456.0, np.nan, 11222333000181.0])):
+        assert validar_identificadores(serie).tolist() == [validar_identificador(v) for v in serie]
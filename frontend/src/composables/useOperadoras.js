@@ -9,6 +9,10 @@ export function useOperadoras() {
   const loading = ref(false)
   const error = ref(null)
   const selectedOperadora = ref(null)
+  const sugestoes = ref([])
+  let sugestaoEmAndamento = null
+  // Detalhes das operadoras da página atual, buscados de uma vez ao listar (por CNPJ)
+  let detalhesPagina = new Map()
 
   // Computed
   const totalPages = computed(() => Math.ceil(metadata.value.total / metadata.value.limit))
@@ -18,11 +22,14 @@ export function useOperadoras() {
     loading.value = true
     error.value = null
     try {
-      const res = await axios.get('http://127.0.0.1:8000/api/operadoras', {
-        params: { page, limit: 10, search }
+      const res = await axios.get('/api/operadoras', {
+        // contagem 'cache': o total de cada busca é reaproveitado pela API, evitando um COUNT a cada tecla
+        params: { page, limit: 10, search, contagem: 'cache' }
       })
       operadoras.value = res.data.data
       metadata.value = res.data.metadata
+      // Em segundo plano: "Ver Detalhes" da página abre sem nova requisição
+      fetchDetalhesLote(operadoras.value.map(op => op.cnpj).filter(Boolean))
     } catch (err) {
       error.value = "Erro ao buscar dados"
       console.error(err)
@@ -31,10 +38,39 @@ export function useOperadoras() {
     }
   }
 
+  // Autocompletar: chamado a cada tecla; a requisição anterior ainda pendente é cancelada
+  const fetchSugestoes = async (q) => {
+    if (sugestaoEmAndamento) sugestaoEmAndamento.abort()
+    if (!q || q.trim().length < 2) {
+      sugestoes.value = []
+      return
+    }
+    sugestaoEmAndamento = new AbortController()
+    try {
+      const res = await axios.get('/api/operadoras/suggest', {
+        params: { q, limit: 8 },
+        signal: sugestaoEmAndamento.signal
+      })
+      sugestoes.value = res.data
+    } catch (err) {
+      if (!axios.isCancel(err)) console.error(err)
+    }
+  }
+
+  // Fecha a lista de sugestões; uma resposta ainda pendente é cancelada para não reabri-la
+  const limparSugestoes = () => {
+    if (sugestaoEmAndamento) sugestaoEmAndamento.abort()
+    sugestoes.value = []
+  }
+
   const fetchDetalhes = async (cnpj) => {
+    if (detalhesPagina.has(cnpj)) {
+      selectedOperadora.value = detalhesPagina.get(cnpj)
+      return true
+    }
     loading.value = true
     try {
-      const res = await axios.get(`http://127.0.0.1:8000/api/operadoras/${cnpj}/detalhes`)
+      const res = await axios.get(`/api/operadoras/${cnpj}/detalhes`)
       selectedOperadora.value = res.data
       return true // Indica sucesso
     } catch (err) {
@@ -45,6 +81,28 @@ export function useOperadoras() {
     }
   }
 
+  // Detalhes de várias operadoras (CNPJs ou Registros ANS) em uma única requisição; guardados para fetchDetalhes.
+  // Não altera 'loading': roda em segundo plano, e uma falha apenas faz fetchDetalhes buscar a operadora sozinha
+  const fetchDetalhesLote = async (chaves) => {
+    const lote = new Map()
+    detalhesPagina = lote
+    if (!chaves.length) return { data: [], nao_encontradas: [] }
+    try {
+      // GET com as chaves ordenadas: a mesma página gera a mesma URL e é servida pelos caches da API e do nginx
+      const params = new URLSearchParams()
+      chaves.slice().sort().forEach(chave => params.append('chaves', chave))
+      const res = await axios.get('/api/operadoras/detalhes', { params })
+      // Resposta de uma página anterior que chegou atrasada não substitui a atual
+      if (detalhesPagina === lote) {
+        res.data.data.forEach(item => lote.set(item.info.cnpj, item))
+      }
+      return res.data
+    } catch (err) {
+      console.error(err)
+      return { data: [], nao_encontradas: chaves }
+    }
+  }
+
   return {
     operadoras,
     metadata,
@@ -52,7 +110,11 @@ export function useOperadoras() {
     error,
     totalPages,
     selectedOperadora,
+    sugestoes,
     fetchOperadoras,
-    fetchDetalhes
+    fetchSugestoes,
+    limparSugestoes,
+    fetchDetalhes,
+    fetchDetalhesLote
   }
 }
\ No newline at end of file
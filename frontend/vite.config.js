@@ -1,7 +1,17 @@
-import { defineConfig } from 'vite'
+import { defineConfig, loadEnv } from 'vite'
 import vue from '@vitejs/plugin-vue'
 
 // https://vite.dev/config/
-export default defineConfig({
-  plugins: [vue()],
+export default defineConfig(({ mode }) => {
+  const env = loadEnv(mode, process.cwd())
+  return {
+    plugins: [vue()],
+    server: {
+      // O frontend chama a API por caminho relativo (/api), como no container, onde o nginx faz o proxy e o cache.
+      // Em desenvolvimento o Vite encaminha /api para VITE_API_URL.
+      proxy: {
+        '/api': env.VITE_API_URL || 'http://127.0.0.1:8000'
+      }
+    }
+  }
 })